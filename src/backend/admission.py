@@ -0,0 +1,181 @@
+"""
+Admission control for agent runs.
+
+At most CHAT_MAX_CONCURRENT_RUNS agent runs execute at once; the others
+wait in a bounded queue. Waiting runs are admitted round-robin across
+clients, so one client sending a burst cannot starve everybody else, and
+each waiting run is told its queue position. When CHAT_ADMISSION_QUEUE_MAX
+runs are already waiting, new chats are refused right away with a
+Retry-After estimate instead of piling up.
+
+CRUD endpoints never pass through here, so they keep their latency while
+the agent is saturated.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Optional
+
+from . import metrics
+from .config import settings
+
+# Initial guess for the Retry-After estimate, before any run has finished
+_DEFAULT_RUN_SECONDS = 10.0
+_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """The wait queue is full; retry_after is a whole number of seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"agent queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    __slots__ = ("client", "granted", "position", "changed", "queued")
+
+    def __init__(self, client: str):
+        self.client = client
+        self.granted = False
+        self.queued = False
+        self.position = 0
+        self.changed: Optional[asyncio.Event] = None
+
+
+class AdmissionController:
+    def __init__(self):
+        self.running = 0
+        self.reserved = 0  # tickets handed out and not yet admitted (queued or about to be)
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._avg_run_seconds = _DEFAULT_RUN_SECONDS
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def retry_after(self) -> int:
+        """Seconds until a queue place is likely to free up."""
+        limit = max(1, settings.CHAT_MAX_CONCURRENT_RUNS)
+        waves = (self.reserved + limit) / limit
+        return max(1, math.ceil(waves * self._avg_run_seconds))
+
+    def reserve(self, client: str) -> Ticket:
+        """
+        Claims a place synchronously when the request arrives, so the 429
+        decision is made before any response is sent.
+        """
+        free_slots = max(0, settings.CHAT_MAX_CONCURRENT_RUNS - self.running)
+        if self.reserved - free_slots >= settings.CHAT_ADMISSION_QUEUE_MAX:
+            raise AdmissionRejected(self.retry_after())
+        self.reserved += 1
+        return Ticket(client)
+
+    def cancel(self, ticket: Ticket):
+        """For a ticket that will never be admitted (its run ended first)."""
+        if ticket.granted:
+            return
+        if ticket.queued:
+            queue = self._queues.get(ticket.client)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.client]
+            ticket.queued = False
+            self._renumber()
+        self.reserved -= 1
+        ticket.granted = True  # makes a second cancel() a no-op
+
+    def _grant(self, ticket: Ticket):
+        ticket.granted = True
+        ticket.queued = False
+        self.reserved -= 1
+        self.running += 1
+        if ticket.changed is not None:
+            ticket.changed.set()
+
+    def _next_ticket(self) -> Optional[Ticket]:
+        """Round-robin: the first client's oldest ticket, then that client moves to the back."""
+        if not self._queues:
+            return None
+        client, queue = next(iter(self._queues.items()))
+        ticket = queue.popleft()
+        if queue:
+            self._queues.move_to_end(client)
+        else:
+            del self._queues[client]
+        return ticket
+
+    def _renumber(self):
+        """Positions follow the order tickets will be served in; waiters are woken when theirs changes."""
+        position = 0
+        queues = [deque(q) for q in self._queues.values()]
+        while any(queues):
+            for q in queues:
+                if q:
+                    position += 1
+                    ticket = q.popleft()
+                    if ticket.position != position:
+                        ticket.position = position
+                        if ticket.changed is not None:
+                            ticket.changed.set()
+
+    def _dispatch(self):
+        while self.running < settings.CHAT_MAX_CONCURRENT_RUNS:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            self._grant(ticket)
+        self._renumber()
+
+    def _finished(self, seconds: Optional[float]):
+        self.running -= 1
+        if seconds is not None:
+            self._avg_run_seconds += _EWMA_ALPHA * (seconds - self._avg_run_seconds)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admitted(self, ticket: Ticket, on_position: Optional[Callable[[int], Awaitable[None]]] = None):
+        """
+        Waits until the ticket is admitted, awaiting on_position(n) whenever its
+        1-based queue position changes, then holds a run slot for the block.
+        """
+        ticket.changed = asyncio.Event()
+        if self.running < settings.CHAT_MAX_CONCURRENT_RUNS and not self._queues:
+            self._grant(ticket)
+        else:
+            ticket.queued = True
+            self._queues.setdefault(ticket.client, deque()).append(ticket)
+            self._renumber()
+
+        reported = 0
+        try:
+            while not ticket.granted:
+                # Cleared before reporting, so a change during on_position() is not lost
+                ticket.changed.clear()
+                if on_position is not None and ticket.position != reported:
+                    reported = ticket.position
+                    await on_position(reported)
+                if not ticket.granted:
+                    await ticket.changed.wait()
+        except BaseException:
+            # Cancelled while waiting (a slot granted in the same tick is handed back below)
+            if not ticket.granted:
+                self.cancel(ticket)
+                raise
+            self._finished(None)
+            raise
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._finished(time.monotonic() - started)
+
+
+controller = AdmissionController()
+
+if settings.METRICS_ENABLED:
+    metrics.register_admission_gauges(lambda: controller.running, lambda: controller.waiting)
@@ -1,13 +1,21 @@
 import os
+import time
+import asyncio
+import logging
+from datetime import datetime
 from typing import TypedDict, List, Annotated
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph.message import add_messages
 from .config import settings
+from .history import compact_history, get_compaction_totals
+from .prompts import build_prompt_messages, fixed_prompt_tokens, tool_schemas
+from . import fast_path, metrics, profiler, tool_cache
+from .llm_backends import build_chat_model
+from .stream_encoder import StreamEncoder, encode_line, with_flush_ticks
 
 # Import ALL tools
 from .tools import (
@@ -31,6 +39,7 @@ from .tools import (
     # Intelligent Scheduling Tools
     find_common_available_time_tool,
     suggest_optimal_time_tool,
+    plan_weekly_timetable_tool,
     # Teaching Analysis Tools
     get_teaching_summary_tool,
     get_student_progress_report_tool,
@@ -73,6 +82,7 @@ tools = [
     # Intelligent Scheduling Tools
     find_common_available_time_tool,
     suggest_optimal_time_tool,
+    plan_weekly_timetable_tool,
     # Teaching Analysis Tools
     get_teaching_summary_tool,
     get_student_progress_report_tool,
@@ -87,18 +97,14 @@ tools = [
     batch_remove_courses_tool,
     query_courses_tool
 ]
+TOOLS_BY_NAME = {t.name: t for t in tools}
 
 # -- LLM Setup --
-llm = ChatOpenAI(
-    model=settings.SILICON_FLOW_MODEL_NAME,
-    openai_api_key=settings.SILICON_FLOW_API_KEY,
-    openai_api_base=str(settings.SILICON_FLOW_BASE_URL),
-    temperature=0,
-    streaming=True
-)
+# The backend (real / record / replay / scripted) is selected by settings.LLM_BACKEND
+llm = build_chat_model()
 
-# Bind tools to LLM
-llm_with_tools = llm.bind_tools(tools)
+# Bind tools to LLM (schemas are converted once and reused for every call)
+llm_with_tools = llm.bind_tools(tool_schemas(tools))
 
 # -- Graph State --
 class AgentState(TypedDict):
@@ -106,101 +112,22 @@ class AgentState(TypedDict):
 
 # -- Nodes --
 
-def agent_node(state: AgentState):
+async def agent_node(state: AgentState):
     """
     Invokes the model to generate a response or tool call.
+    Async so that cancelling the run also aborts an in-flight model request.
     """
     messages = state['messages']
 
-    # Re-assuring system prompt logic for state persistence:
-    # If we find existing SystemMessage in history, we update it (to keep time fresh) or just use it.
-    # For now, let's regenerate it and prepend if missing, or update if present?
-    # Simpler approach: Create a fresh list for the LLM call that definitely has the SystemPrompt.
-
-    from datetime import datetime
-    now = datetime.now()
-    weekdays = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
-    weekday = weekdays[now.weekday()]
-    current_date = now.strftime("%Y年%m月%d日") + " " + weekday + " " + now.strftime("%H:%M")
-
-    system_content = f"""
-你是一个智能课程管理助手，专为郑婷婷老师服务。
-现在是：{current_date}
-
-## 交流风格
-- 语气温柔、可靠、清晰；必要时可用可爱颜文字缓和语气（例如：(´▽｀)、(>_<)、(｡•̀ᴗ•́)）。
-- 不要使用 emoji 表情符号。如果工具返回了 emoji，请在回复中改写为不含 emoji 的文本。
-
-## 总体原则（避免缺参数/误操作）
-- 工具调用前先做信息校验：缺什么就问什么，不要猜。
-- 允许多轮追问：每轮只问最关键的缺口；用户答完仍缺则继续问。
-- 涉及删除/批量修改/批量删除：先查询并说明“范围 + 数量 + 影响”，再让用户确认后才执行。
-- 原样录入关键信息（人名、价格、日期时间），除非用户明确要求调整。
-
-## 工具使用与所需信息（必须遵守）
-
-### A. 学生档案
-- 查询学生：get_student_by_name_tool(name)
-- 创建学生：create_student_tool(name, grade?, phone?, parent_contact?, progress?, notes?)
-  - 必填：name
-  - 可选：grade/phone/parent_contact/progress/notes
-  - 如果用户没给可选项，可以先创建；但当后续操作需要联系方式/年级时要向用户补问确认。
-
-### B. 添加单节课程（add_course_tool）
-必填信息：
-- 课程名称：title
-- 学生姓名：student_name（必须存在学生档案；不确定先查）
-- 开始时间：start_time（ISO，例如：2026-01-27T10:00:00）
-- 结束时间：end_time（ISO）
-- 价格：price（数字）
-可选信息：location、description
-
-流程：
-1) student_name 未给：先问学生是谁。
-2) 用 get_student_by_name_tool 确认学生存在；不存在则先询问是否创建学生档案，并收集至少“学生姓名”（必要时再问年级等）。
-3) 时间信息不完整（缺日期/开始/结束/时长）：先问清楚再调用工具；不要自行脑补。
-4) 执行前可复述一次关键信息请求确认（尤其是新建课程）。
-
-### C. 添加周期课程（add_recurring_course_tool）
-当用户表达“每周固定”“从A到B每周X”“连续多次”等，优先使用此工具。
-必填信息：
-- title、student_name
-- start_date（YYYY-MM-DD）、end_date（YYYY-MM-DD）
-- weekdays（例如：周一,周三 或 1,3）
-- start_time（HH:MM）、end_time（HH:MM）
-- price（数字）
-可选信息：grade、location、description
-
-流程：
-1) 任一必填缺失：先提问补齐。
-2) 执行前必须先复述计划并请求确认，例如：
-   “我将为{{student_name}}在{{start_date}}到{{end_date}}每周{{weekdays}}的{{start_time}}-{{end_time}}安排{{title}}，单价{{price}}，可以吗？(´▽｀)”
-3) 用户确认后再调用工具。
-
-### D. 修改/删除课程
-- 不要凭空猜 course_id。
-- 先用 query_courses_tool 查询候选课程列表，并向用户确认要操作哪一节/哪些节。
-- 批量修改使用 batch_modify_courses_tool；批量删除使用 batch_remove_courses_tool。
-- 当用户说“删除全部/全部取消”：必须二次确认（数量、范围、不可恢复提醒）后才执行。
-
-## 输出要求
-- 每次回复先给出 1-2 句简短计划（说明你接下来要问什么或要做什么），然后再提问或调用工具。
-- 需要用户补充信息时，用清单式提问，尽量少问且明确格式。
-"""
-
-    # We want to maintain history but ensure SystemPrompt is current.
-    # Strategy: Filter out old SystemMessages and prepend new one for this invocation.
-
-    # Correct approach for this 'agent_node':
-    # 1. Get history.
-    # 2. Construct messages for LLM: [New System Message] + [History w/o System Messages]
-    # 3. Invoke LLM.
-    # 4. Return ONLY the new response.
-
+    # Prompt layout: [static prefix] + [compacted history] + [date/time suffix].
+    # The prefix is byte-identical across calls so provider-side prompt caching applies;
+    # SystemMessages are never stored in the thread history.
     filtered_messages = [m for m in messages if not isinstance(m, SystemMessage)]
-    prompt_messages = [SystemMessage(content=system_content)] + filtered_messages
+    now = datetime.now()
+    history, _ = compact_history(filtered_messages, reserved_tokens=fixed_prompt_tokens(tools, now))
+    prompt_messages = build_prompt_messages(history, now)
 
-    response = llm_with_tools.invoke(prompt_messages)
+    response = await llm_with_tools.ainvoke(prompt_messages)
     return {"messages": [response]}
 
 def should_continue(state: AgentState):
@@ -214,11 +141,16 @@ def should_continue(state: AgentState):
         return "tools"
     return END
 
+async def profiled_tool_call(request, execute):
+    """Runs each tool call in its own SQL profile scope (slow-query / N+1 attribution)."""
+    with profiler.profile_scope(f"tool {request.tool_call['name']}"):
+        return await execute(request)
+
 # -- Graph Construction --
 workflow = StateGraph(AgentState)
 
 workflow.add_node("agent", agent_node)
-workflow.add_node("tools", ToolNode(tools))
+workflow.add_node("tools", ToolNode(tools, awrap_tool_call=profiled_tool_call))
 
 workflow.set_entry_point("agent")
 
@@ -261,6 +193,7 @@ TOOL_DISPLAY_MAP = {
     # Intelligent Scheduling Tools
     "find_common_available_time_tool": "查找空闲时间",
     "suggest_optimal_time_tool": "分析最佳上课时间",
+    "plan_weekly_timetable_tool": "规划周课表",
     # Teaching Analysis Tools
     "get_teaching_summary_tool": "生成教学汇总",
     "get_student_progress_report_tool": "生成学习进度报告",
@@ -276,81 +209,219 @@ TOOL_DISPLAY_MAP = {
     "query_courses_tool": "按条件查询课程"
 }
 
+logger = logging.getLogger(__name__)
+
+# -- LLM timing instrumentation --
+_llm_timings = {"calls": 0, "ttft_total_s": 0.0, "ttft_max_s": 0.0}
+
+
+if settings.METRICS_ENABLED:
+    metrics.register_compaction_metrics(get_compaction_totals)
+
+
+def _record_ttft(seconds: float):
+    metrics.LLM_TTFT_SECONDS.observe(seconds)
+    _llm_timings["calls"] += 1
+    _llm_timings["ttft_total_s"] += seconds
+    _llm_timings["ttft_max_s"] = max(_llm_timings["ttft_max_s"], seconds)
+    logger.info("LLM time-to-first-token: %.3fs", seconds)
+
+
+def _record_tool_metrics(display_name: str, seconds: float, output) -> None:
+    metrics.TOOL_SECONDS.observe(seconds, tool=display_name)
+    # Tools report failures as tool_error() results rather than raising
+    if tool_cache.is_tool_error(output):
+        metrics.TOOL_ERRORS.inc(tool=display_name)
+
+
+def get_llm_timings() -> dict:
+    """Cumulative time-to-first-token stats for this process."""
+    stats = dict(_llm_timings)
+    stats["ttft_avg_s"] = stats["ttft_total_s"] / stats["calls"] if stats["calls"] else 0.0
+    return stats
+
+
+async def _run_fast_path(match: "fast_path.FastPathMatch", user_input: str, config: dict):
+    """
+    Answers a recognized read-only request by calling its tool directly.
+    Emits the same NDJSON events as the agent and records the exchange in the
+    thread so follow-up questions keep their context.
+    """
+    tool = TOOLS_BY_NAME[match.tool_name]
+    display_name = TOOL_DISPLAY_MAP.get(match.tool_name, match.tool_name)
+
+    cached = tool_cache.is_cached(match.tool_name, match.args)
+    start_event = {"type": "tool_start", "name": display_name}
+    end_event = {"type": "tool_end", "name": display_name}
+    if cached:
+        start_event["cached"] = end_event["cached"] = True
+
+    yield encode_line(start_event)
+    t0 = time.perf_counter()
+    with profiler.profile_scope(f"tool {match.tool_name}"):
+        result = await asyncio.to_thread(tool.invoke, match.args)
+    _record_tool_metrics(display_name, time.perf_counter() - t0, result)
+    yield encode_line(end_event)
+    yield encode_line({"type": "token", "content": result})
+
+    await graph.aupdate_state(
+        config,
+        {"messages": [HumanMessage(content=user_input), AIMessage(content=result)]},
+        as_node="agent",
+    )
+    logger.info(
+        "Fast path answered intent=%s (confidence %.2f) in %.1fms",
+        match.intent, match.confidence, (time.perf_counter() - t0) * 1000,
+    )
+
+
+# Events run_agent_stream reacts to; everything else is skipped after one lookup
+_STREAM_EVENTS = frozenset({
+    "on_chat_model_start", "on_chat_model_end", "on_chat_model_stream", "on_llm_stream",
+    "on_llm_new_token", "on_chain_stream", "on_tool_start", "on_tool_end", "on_tool_error",
+})
+
+
+def _extract_messages(obj):
+    msgs = []
+    if obj is None:
+        return msgs
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k == "messages" and isinstance(v, list):
+                msgs.extend(v)
+            else:
+                msgs.extend(_extract_messages(v))
+    elif isinstance(obj, list):
+        for it in obj:
+            msgs.extend(_extract_messages(it))
+    return msgs
+
+
+def _chunk_text(chunk):
+    """(content, reasoning) of a streamed model chunk, across provider formats."""
+    if isinstance(chunk, str):
+        return chunk, None
+    if chunk is None:
+        return None, None
+    content = getattr(chunk, "content", None)
+    reasoning = None
+
+    # Check for SiliconFlow/DeepSeek style reasoning content
+    # Usually in additional_kwargs.reasoning_content or similar fields
+    kwargs = getattr(chunk, "additional_kwargs", None)
+    if kwargs:
+        delta = kwargs.get("delta")
+        reasoning = kwargs.get("reasoning_content")
+        if not reasoning and isinstance(delta, dict):
+            reasoning = delta.get("reasoning_content")
+
+        if not content:
+            if isinstance(kwargs.get("content"), str):
+                content = kwargs.get("content")
+            elif isinstance(delta, dict):
+                if isinstance(delta.get("content"), str):
+                    content = delta.get("content")
+                elif isinstance(delta.get("text"), str):
+                    content = delta.get("text")
+    return content, reasoning
+
+
+INTERRUPTED_TOOL_RESULT = "⚠️ 操作已取消（连接断开），未保存任何修改"
+
+
+async def _repair_interrupted_thread(config: dict):
+    """
+    A run cancelled between the model's tool call and the tool result leaves
+    an AIMessage whose tool_calls have no ToolMessage, which the provider
+    rejects on the next turn. Answer those calls as cancelled.
+    """
+    snapshot = await graph.aget_state(config)
+    messages = (snapshot.values or {}).get("messages") or []
+    if not messages or not isinstance(messages[-1], AIMessage) or not messages[-1].tool_calls:
+        return
+    results = [
+        ToolMessage(content=INTERRUPTED_TOOL_RESULT, tool_call_id=call["id"], name=call["name"])
+        for call in messages[-1].tool_calls
+    ]
+    await graph.aupdate_state(config, {"messages": results}, as_node="tools")
+    logger.info("Thread %s: closed %d interrupted tool call(s)", config["configurable"]["thread_id"], len(results))
+
+
 async def run_agent_stream(user_input: str, thread_id: str = "default"):
     """
     Runs the agent and yields streaming tokens (text).
+    Token/thinking deltas are coalesced into frames by StreamEncoder.
     """
     config = {"configurable": {"thread_id": thread_id}}
+    await _repair_interrupted_thread(config)
+
+    # Common read-only questions skip the LLM entirely
+    match = fast_path.route(user_input)
+    if match is not None and match.tool_name in TOOLS_BY_NAME:
+        async for line in _run_fast_path(match, user_input, config):
+            yield line
+        return
 
     inputs = {
         "messages": [HumanMessage(content=user_input)]
     }
 
-    import json
+    encoder = StreamEncoder()
     seen_message_ids = set()
     last_emitted = None
     emission_mode = None
+    model_started = {}
+    model_calls = {}
+    tool_started = {}
+    cached_runs = set()
 
-    def _extract_messages(obj):
-        msgs = []
-        if obj is None:
-            return msgs
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                if k == "messages" and isinstance(v, list):
-                    msgs.extend(v)
-                else:
-                    msgs.extend(_extract_messages(v))
-        elif isinstance(obj, list):
-            for it in obj:
-                msgs.extend(_extract_messages(it))
-        return msgs
     # Use astream_events version 2 for reliable event monitoring
-    async for event in graph.astream_events(inputs, config=config, version="v2"):
+    events = graph.astream_events(inputs, config=config, version="v2")
+    async for event in with_flush_ticks(events, encoder):
+        # Flush deadline passed while the graph was idle
+        if event is None:
+            out = encoder.flush()
+            if out:
+                yield out
+            continue
+
         kind = event["event"]
+        if kind not in _STREAM_EVENTS:
+            continue
 
         # We are looking for streaming tokens coming from the model node.
         # Different LangChain/LangGraph versions may emit different event names.
-        if kind in ("on_chat_model_stream", "on_llm_stream"):
+        if kind == "on_chat_model_stream" or kind == "on_llm_stream":
+            # Time-to-first-token per model call
+            if model_started:
+                t0 = model_started.pop(event.get("run_id"), None)
+                if t0 is not None:
+                    _record_ttft(time.perf_counter() - t0)
+
             if emission_mode not in (None, "chat_model_stream"):
                 continue
             emission_mode = "chat_model_stream"
-            chunk = event.get("data", {}).get("chunk")
-            content = None
-            reasoning = None
-
-            if isinstance(chunk, str):
-                content = chunk
-            elif chunk is not None and hasattr(chunk, "content"):
-                content = chunk.content
-            
-            # Check for SiliconFlow/DeepSeek style reasoning content
-            # Usually in additional_kwargs.reasoning_content or similar fields
-            if chunk is not None and hasattr(chunk, "additional_kwargs"):
-                reasoning = chunk.additional_kwargs.get("reasoning_content")
-                if not reasoning:
-                    delta = chunk.additional_kwargs.get("delta")
-                    if isinstance(delta, dict):
-                        reasoning = delta.get("reasoning_content")
-
-                if not content:
-                    if isinstance(chunk.additional_kwargs.get("content"), str):
-                        content = chunk.additional_kwargs.get("content")
-                    else:
-                        delta = chunk.additional_kwargs.get("delta")
-                        if isinstance(delta, dict):
-                            if isinstance(delta.get("content"), str):
-                                content = delta.get("content")
-                            elif isinstance(delta.get("text"), str):
-                                content = delta.get("text")
-            
+            content, reasoning = _chunk_text(event.get("data", {}).get("chunk"))
+
             # If we found reasoning content, emit it as a thinking type
+            out = ""
             if reasoning:
-                yield json.dumps({"type": "thinking", "content": reasoning}, ensure_ascii=False) + "\n"
-
+                out += encoder.delta("thinking", reasoning)
             # Emit standard content if present
             if content:
-                yield json.dumps({"type": "token", "content": content}, ensure_ascii=False) + "\n"
+                out += encoder.delta("token", content)
+            if out:
+                yield out
+
+        elif kind == "on_chat_model_start":
+            model_started[event.get("run_id")] = model_calls[event.get("run_id")] = time.perf_counter()
+
+        elif kind == "on_chat_model_end":
+            t0 = model_calls.pop(event.get("run_id"), None)
+            if t0 is not None:
+                metrics.LLM_GENERATION_SECONDS.observe(time.perf_counter() - t0)
+            model_started.pop(event.get("run_id"), None)
 
         elif kind == "on_llm_new_token":
             if emission_mode not in (None, "llm_new_token"):
@@ -358,7 +429,9 @@ async def run_agent_stream(user_input: str, thread_id: str = "default"):
             emission_mode = "llm_new_token"
             token = event.get("data", {}).get("token")
             if token:
-                yield json.dumps({"type": "token", "content": token}, ensure_ascii=False) + "\n"
+                out = encoder.delta("token", token)
+                if out:
+                    yield out
 
         elif kind == "on_chain_stream":
             if emission_mode not in (None, "chain_stream"):
@@ -374,16 +447,39 @@ async def run_agent_stream(user_input: str, thread_id: str = "default"):
                     last_emitted = content
                     if msg_id:
                         seen_message_ids.add(msg_id)
-                    yield json.dumps({"type": "token", "content": content}, ensure_ascii=False) + "\n"
+                    yield encoder.event({"type": "token", "content": content})
 
         # Capture when a tool starts to notify the user
         elif kind == "on_tool_start":
             tool_name = event["name"]
             display_name = TOOL_DISPLAY_MAP.get(tool_name, tool_name)
-            yield json.dumps({"type": "tool_start", "name": display_name}, ensure_ascii=False) + "\n"
+            payload = {"type": "tool_start", "name": display_name}
+            tool_started[event.get("run_id")] = time.perf_counter()
+            if tool_cache.is_cached(tool_name, event.get("data", {}).get("input")):
+                cached_runs.add(event.get("run_id"))
+                payload["cached"] = True
+            yield encoder.event(payload)
 
         # Capture when a tool ends to mark it as complete
         elif kind == "on_tool_end":
             tool_name = event["name"]
             display_name = TOOL_DISPLAY_MAP.get(tool_name, tool_name)
-            yield json.dumps({"type": "tool_end", "name": display_name}, ensure_ascii=False) + "\n"
+            payload = {"type": "tool_end", "name": display_name}
+            t0 = tool_started.pop(event.get("run_id"), None)
+            if t0 is not None:
+                _record_tool_metrics(display_name, time.perf_counter() - t0, event.get("data", {}).get("output"))
+            if event.get("run_id") in cached_runs:
+                cached_runs.discard(event.get("run_id"))
+                payload["cached"] = True
+            yield encoder.event(payload)
+
+        elif kind == "on_tool_error":
+            t0 = tool_started.pop(event.get("run_id"), None)
+            display_name = TOOL_DISPLAY_MAP.get(event["name"], event["name"])
+            if t0 is not None:
+                metrics.TOOL_SECONDS.observe(time.perf_counter() - t0, tool=display_name)
+            metrics.TOOL_ERRORS.inc(tool=display_name)
+
+    out = encoder.flush()
+    if out:
+        yield out
@@ -1,7 +1,55 @@
 import asyncio
 import json
+import logging
+import threading
+import time
 from typing import AsyncGenerator
-from .ai_graph import run_agent_stream
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# The agent stack (langchain, langgraph, model client, 27 tools, compiled graph) is
+# imported on first use instead of at server start, so CRUD routes are served at once.
+_agent = None
+_agent_lock = threading.Lock()
+
+
+class AgentDisabled(RuntimeError):
+    pass
+
+
+def agent_loaded() -> bool:
+    return _agent is not None
+
+
+def _load_agent():
+    global _agent
+    if not settings.AGENT_ENABLED:
+        raise AgentDisabled("AI 助手未启用（AGENT_ENABLED=false）")
+    with _agent_lock:
+        if _agent is None:
+            t0 = time.perf_counter()
+            from . import ai_graph
+            _agent = ai_graph
+            logger.info("Agent loaded in %.2fs", time.perf_counter() - t0)
+    return _agent
+
+
+async def ensure_agent():
+    """Loads the agent in a worker thread so the event loop keeps serving while it imports."""
+    if _agent is not None:
+        return _agent
+    return await asyncio.to_thread(_load_agent)
+
+
+async def warmup():
+    """Startup hook: loads the agent in the background (errors are logged; the first chat retries)."""
+    try:
+        await ensure_agent()
+    except Exception:
+        logger.exception("Agent warmup failed")
+
 
 async def process_chat_stream(message: str, thread_id: str = "default") -> AsyncGenerator[str, None]:
     """
@@ -9,8 +57,9 @@ async def process_chat_stream(message: str, thread_id: str = "default") -> Async
     All output is JSON-formatted for SSE compatibility.
     """
     try:
+        agent = await ensure_agent()
         # thread_id is now passed from the frontend
-        async for text_chunk in run_agent_stream(message, thread_id):
+        async for text_chunk in agent.run_agent_stream(message, thread_id):
             if text_chunk:
                 yield text_chunk
 
@@ -0,0 +1,235 @@
+"""
+Occupancy and income analytics over the course history.
+
+All course intervals are loaded once into compact NumPy arrays (start and
+end as minutes since the epoch, price, student id), sorted by start, and
+kept until the global data version from `service` changes or they are
+older than ANALYTICS_CACHE_TTL_S. A heatmap query then only slices the
+arrays with searchsorted and fills every weekday x slot cell with
+vectorized prefix sums (searchsorted, cumsum, bincount), so utilization
+and peak-hour questions over years of history take milliseconds instead
+of a Python loop over every course.
+
+The data version only counts writes made by this process; the TTL bounds
+how long writes made by other workers go unseen.
+"""
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+
+from . import service
+from .config import settings
+
+WEEKDAY_NAMES = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+SLOT_MINUTES = (15, 30, 60, 120)
+MAX_DAYS = 3660
+MINUTES_PER_DAY = 24 * 60
+# 1970-01-01 was a Thursday
+_EPOCH_WEEKDAY = 3
+
+
+class CourseArrays:
+    def __init__(self, version: int, start, end, price, student_id):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.start = start              # int64 minutes since the epoch, sorted
+        self.end = end                  # int64 minutes since the epoch
+        self.price = price              # float64, NULL -> 0
+        self.student_id = student_id    # int64, NULL -> -1
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+
+_arrays: Optional[CourseArrays] = None
+_arrays_lock = threading.Lock()
+
+
+def _minutes(values) -> np.ndarray:
+    return np.array(values, dtype="datetime64[m]").astype(np.int64)
+
+
+def _load() -> CourseArrays:
+    version = service.get_data_version()
+    with service.get_db_cursor() as cursor:
+        cursor.execute("SELECT start, end, price, student_id FROM courses ORDER BY start")
+        rows = cursor.fetchall()
+    return CourseArrays(
+        version,
+        _minutes([r["start"] for r in rows]).reshape(-1),
+        _minutes([r["end"] for r in rows]).reshape(-1),
+        np.array([float(r["price"] or 0) for r in rows], dtype=np.float64),
+        np.array([r["student_id"] if r["student_id"] is not None else -1 for r in rows], dtype=np.int64),
+    )
+
+
+def _fresh(arrays: Optional[CourseArrays]) -> bool:
+    return (
+        arrays is not None
+        and arrays.version == service.get_data_version()
+        and time.monotonic() - arrays.loaded_at < settings.ANALYTICS_CACHE_TTL_S
+    )
+
+
+def course_arrays() -> CourseArrays:
+    """The cached arrays, reloaded after a write in this process or once they are older than the TTL."""
+    global _arrays
+    arrays = _arrays
+    if _fresh(arrays):
+        return arrays
+    with _arrays_lock:
+        if not _fresh(_arrays):
+            _arrays = _load()
+        return _arrays
+
+
+def _day_minute(day: date) -> int:
+    return int(np.datetime64(day, "m").astype(np.int64))
+
+
+def _ramp(points: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """sum(max(0, p - v) for v in values) for every p in points."""
+    values = np.sort(values)
+    prefix = np.concatenate(([0], np.cumsum(values)))
+    below = np.searchsorted(values, points, side="right")
+    return below * points - prefix[below]
+
+
+def _covered(starts: np.ndarray, ends: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Minutes of the intervals [starts, ends) that lie before each point; diff gives minutes per slot."""
+    return _ramp(points, starts) - _ramp(points, ends)
+
+
+def _merge(starts: np.ndarray, ends: np.ndarray) -> tuple:
+    """Sorted-by-start intervals -> their union as disjoint intervals."""
+    if not len(starts):
+        return starts, ends
+    reach = np.maximum.accumulate(ends)
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = starts[1:] > reach[:-1]
+    heads = np.flatnonzero(first)
+    return starts[heads], np.maximum.reduceat(ends, heads)
+
+
+def heatmap(
+    start: date,
+    end: date,
+    slot_minutes: int = 30,
+    student_id: Optional[int] = None,
+) -> dict:
+    """
+    Weekday x time-of-day matrices for the days [start, end):
+
+    - lessons: lessons starting in the cell
+    - income: price of the lessons starting in the cell
+    - minutes: lesson minutes in the cell (two parallel lessons count twice)
+    - utilization: share of the cell's time with at least one lesson, over every such day in the range
+    """
+    if slot_minutes not in SLOT_MINUTES:
+        raise ValueError(f"slot_minutes must be one of {SLOT_MINUTES}")
+    days = (end - start).days
+    if days <= 0:
+        raise ValueError("end must be after start")
+    if days > MAX_DAYS:
+        raise ValueError(f"range must not exceed {MAX_DAYS} days")
+
+    arrays = course_arrays()
+    slots = MINUTES_PER_DAY // slot_minutes
+    t0, t1 = _day_minute(start), _day_minute(end)
+    span = t1 - t0
+
+    # Lessons started at most max_lesson_span() before the range can still run into it
+    lookback = int(service.max_lesson_span().total_seconds()) // 60
+    lo = np.searchsorted(arrays.start, t0 - lookback, side="left")
+    hi = np.searchsorted(arrays.start, t1, side="left")
+    s, e = arrays.start[lo:hi] - t0, arrays.end[lo:hi] - t0
+    price = arrays.price[lo:hi]
+    if student_id is not None:
+        keep = arrays.student_id[lo:hi] == student_id
+        s, e, price = s[keep], e[keep], price[keep]
+
+    # Lesson minutes and busy minutes (union of the lessons) per slot of every day in the range
+    boundaries = np.arange(0, span + 1, slot_minutes, dtype=np.int64)
+    per_day_minutes = np.diff(_covered(s, e, boundaries)).reshape(days, slots)
+    merged_s, merged_e = _merge(s, e)
+    per_day_busy = np.diff(_covered(merged_s, merged_e, boundaries)).reshape(days, slots)
+
+    day_weekday = (np.arange(days) + (t0 // MINUTES_PER_DAY + _EPOCH_WEEKDAY)) % 7
+    minutes = np.zeros((7, slots), dtype=np.int64)
+    busy = np.zeros((7, slots), dtype=np.int64)
+    np.add.at(minutes, day_weekday, per_day_minutes)
+    np.add.at(busy, day_weekday, per_day_busy)
+    day_counts = np.bincount(day_weekday, minlength=7)
+    capacity = (day_counts * slot_minutes)[:, None]
+    utilization = np.divide(busy, capacity, out=np.zeros((7, slots)), where=capacity > 0)
+
+    # Lessons and income by the cell their start falls in
+    starting = (s >= 0) & (s < span)
+    cell = (((s[starting] // MINUTES_PER_DAY) + t0 // MINUTES_PER_DAY + _EPOCH_WEEKDAY) % 7) * slots \
+        + (s[starting] % MINUTES_PER_DAY) // slot_minutes
+    lessons = np.bincount(cell, minlength=7 * slots).reshape(7, slots)
+    income = np.bincount(cell, weights=price[starting], minlength=7 * slots).reshape(7, slots)
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "slot_minutes": slot_minutes,
+        "student_id": student_id,
+        "weekdays": WEEKDAY_NAMES,
+        "slots": [f"{m // 60:02d}:{m % 60:02d}" for m in range(0, MINUTES_PER_DAY, slot_minutes)],
+        "day_counts": day_counts.tolist(),
+        "lessons": lessons.tolist(),
+        "income": np.round(income, 2).tolist(),
+        "minutes": minutes.tolist(),
+        "utilization": np.round(utilization, 4).tolist(),
+        "totals": {
+            "lessons": int(lessons.sum()),
+            "income": round(float(income.sum()), 2),
+            "lesson_minutes": int(minutes.sum()),
+            "utilization": round(float(busy.sum() / (days * MINUTES_PER_DAY)), 4),
+        },
+        "peaks": peaks(lessons, utilization, slot_minutes),
+    }
+
+
+def peaks(lessons: np.ndarray, utilization: np.ndarray, slot_minutes: int, limit: int = 5) -> list:
+    """Busiest cells by lessons started, then utilization."""
+    order = np.lexsort((-utilization.ravel(), -lessons.ravel()))[:limit]
+    slots = lessons.shape[1]
+    result = []
+    for index in order:
+        weekday, slot = divmod(int(index), slots)
+        if lessons[weekday, slot] == 0:
+            break
+        minute = slot * slot_minutes
+        result.append({
+            "weekday": weekday,
+            "slot": f"{minute // 60:02d}:{minute % 60:02d}",
+            "lessons": int(lessons[weekday, slot]),
+            "utilization": round(float(utilization[weekday, slot]), 4),
+        })
+    return result
+
+
+def history_range(student_id: Optional[int] = None) -> Optional[tuple]:
+    """(first day, day after the last lesson) of the whole history, or of one student's lessons."""
+    arrays = course_arrays()
+    starts = arrays.start if student_id is None else arrays.start[arrays.student_id == student_id]
+    if not len(starts):
+        return None
+    first = np.datetime64(int(starts.min()), "m").astype("datetime64[D]").item()
+    last = np.datetime64(int(starts.max()), "m").astype("datetime64[D]").item()
+    return first, last + timedelta(days=1)
+
+
+def parse_range(start: Optional[str], end: Optional[str], default_days: int = 365) -> tuple:
+    """ISO dates from the query string; defaults to the last `default_days` days up to today."""
+    try:
+        end_day = date.fromisoformat(end[:10]) if end else date.today() + timedelta(days=1)
+        start_day = date.fromisoformat(start[:10]) if start else end_day - timedelta(days=default_days)
+    except ValueError as e:
+        raise ValueError("dates must be ISO formatted, e.g. 2026-01-01") from e
+    return start_day, end_day
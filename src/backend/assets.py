@@ -0,0 +1,202 @@
+"""
+Static asset pipeline.
+
+Build (from src/):
+
+    python -m backend.assets vendor   # download pinned third-party bundles into frontend/vendor/
+    python -m backend.assets build    # frontend/ -> dist/
+
+The build copies style.css, script.js and frontend/vendor/*.js to
+dist/assets/<name>.<content hash>.<ext>, rewrites index.html to point at
+them (vendor bundles are inserted at the `<!-- vendor -->` marker, so the
+page never requests a bundle that was not vendored), and writes .gz (and .br when the optional `brotli` package is
+installed) next to every file. main.py serves dist/ when it exists:
+
+- hashed files under /assets/ get `Cache-Control: public, max-age=31536000, immutable`;
+- everything else (index.html) gets `no-cache`, so a deploy is picked up at once;
+- a precompressed sibling is served when the client accepts its encoding.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import urllib.request
+from typing import Dict, Optional
+
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.datastructures import Headers
+
+from .compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+FRONTEND_DIR = "frontend"
+ASSETS_PREFIX = "assets/"
+HASHED_SOURCES = ("style.css", "script.js")
+PRECOMPRESS_EXTENSIONS = (".html", ".css", ".js", ".json", ".svg")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Pinned third-party bundles; the CDN chain in script.js uses the same versions and is only a fallback
+FULLCALENDAR_VERSION = "6.1.10"
+MARKED_VERSION = "13.0.2"
+VENDOR = {
+    "marked.min.js": f"https://cdn.jsdelivr.net/npm/marked@{MARKED_VERSION}/marked.min.js",
+    "fullcalendar.global.min.js": f"https://cdn.jsdelivr.net/npm/fullcalendar@{FULLCALENDAR_VERSION}/index.global.min.js",
+}
+VENDOR_MARKER = re.compile(r"[ \t]*<!-- vendor\b.*?-->\n?")
+
+
+# ==================== Build ====================
+
+def _hashed_name(name: str, content: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+
+
+def _precompress(path: str) -> Dict[str, int]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    sizes = {"raw": len(raw)}
+    variants = {".gz": gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(raw, quality=11)
+    for suffix, data in variants.items():
+        # Tiny files can grow when compressed
+        if len(data) < len(raw):
+            with open(path + suffix, "wb") as f:
+                f.write(data)
+            sizes[suffix[1:]] = len(data)
+    return sizes
+
+
+def build(frontend_dir: str = FRONTEND_DIR, dist_dir: Optional[str] = None) -> dict:
+    """Builds dist/ from frontend/ and returns the manifest (logical path -> hashed path, sizes)."""
+    from .config import settings
+
+    dist_dir = dist_dir or settings.FRONTEND_DIST_DIR
+    if os.path.abspath(dist_dir) == os.path.abspath(frontend_dir):
+        raise ValueError("dist directory must differ from the source directory")
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(os.path.join(dist_dir, ASSETS_PREFIX))
+
+    sources = list(HASHED_SOURCES)
+    vendor_dir = os.path.join(frontend_dir, "vendor")
+    # Load order follows VENDOR; other files in vendor/ come after it
+    vendored = [n for n in VENDOR if os.path.isfile(os.path.join(vendor_dir, n))]
+    if os.path.isdir(vendor_dir):
+        vendored += [n for n in sorted(os.listdir(vendor_dir)) if n.endswith(".js") and n not in VENDOR]
+    sources += [f"vendor/{n}" for n in vendored]
+
+    mapping: Dict[str, str] = {}
+    for logical in sources:
+        with open(os.path.join(frontend_dir, logical), "rb") as f:
+            content = f.read()
+        hashed = ASSETS_PREFIX + _hashed_name(os.path.basename(logical), content)
+        with open(os.path.join(dist_dir, hashed), "wb") as f:
+            f.write(content)
+        mapping[logical] = hashed
+
+    with open(os.path.join(frontend_dir, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+
+    def replace(match):
+        target = mapping.get(match.group(2))
+        return f'{match.group(1)}="/{target}"' if target else match.group(0)
+
+    # href="style.css?v=..." -> "/assets/<hashed>"
+    html = re.sub(r'(href|src)="([^"?#:]+)(?:\?[^"]*)?"', replace, html)
+    tags = "".join(f'    <script src="/{mapping[f"vendor/{n}"]}"></script>\n' for n in vendored)
+    html = VENDOR_MARKER.sub(lambda m: tags, html, count=1)
+    with open(os.path.join(dist_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+    manifest = {"assets": mapping, "sizes": {}}
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            if name.endswith(PRECOMPRESS_EXTENSIONS):
+                path = os.path.join(root, name)
+                manifest["sizes"][os.path.relpath(path, dist_dir)] = _precompress(path)
+    with open(os.path.join(dist_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def vendor(frontend_dir: str = FRONTEND_DIR) -> Dict[str, int]:
+    """Downloads the pinned VENDOR bundles into frontend/vendor/ (run once, then commit the files)."""
+    target = os.path.join(frontend_dir, "vendor")
+    os.makedirs(target, exist_ok=True)
+    sizes = {}
+    for name, url in VENDOR.items():
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            data = resp.read()
+        with open(os.path.join(target, name), "wb") as f:
+            f.write(data)
+        sizes[name] = len(data)
+    return sizes
+
+
+# ==================== Serving ====================
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz siblings and sets Cache-Control by path."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/") if self.directory else ""
+        cache_control = IMMUTABLE if relative.startswith(ASSETS_PREFIX) else REVALIDATE
+        headers = {"Cache-Control": cache_control}
+
+        path = str(full_path)
+        if status_code == 200 and path.endswith(PRECOMPRESS_EXTENSIONS):
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if encoding in accepted and os.path.isfile(path + suffix):
+                    path += suffix
+                    stat_result = os.stat(path)
+                    headers["Content-Encoding"] = encoding
+                    break
+            headers["Vary"] = "Accept-Encoding"
+
+        # Content-Type from the original name, not the .br/.gz sibling
+        media_type, _ = mimetypes.guess_type(str(full_path))
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result,
+                                headers=headers, media_type=media_type)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Static asset pipeline")
+    parser.add_argument("command", choices=("build", "vendor"))
+    parser.add_argument("--dist", help="output directory (default FRONTEND_DIST_DIR)")
+    args = parser.parse_args(argv)
+
+    if args.command == "vendor":
+        for name, size in vendor().items():
+            print(f"frontend/vendor/{name}: {size} bytes")
+        return
+
+    manifest = build(dist_dir=args.dist)
+    for path, sizes in sorted(manifest["sizes"].items()):
+        variants = ", ".join(f"{k} {v}" for k, v in sizes.items() if k != "raw")
+        print(f"{path}: {sizes['raw']} bytes ({variants or 'not compressed'})")
+    if not any(p.startswith("vendor/") for p in manifest["assets"]):
+        print("note: frontend/vendor/ is empty; run `python -m backend.assets vendor` to stop depending on CDNs",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Chat runs: background agent execution with a replay buffer.
+
+Each chat request starts a run: the agent executes in a background task
+and every NDJSON event it produces is appended to the run's buffer under a
+sequential id. Subscribers read the buffer from any position, so an SSE
+client that lost its connection reconnects with Last-Event-ID and continues
+where it stopped instead of re-running the model and tools. Finished runs
+are kept for CHAT_RUN_TTL_S seconds.
+
+When the last subscriber disconnects, the run is cancelled: immediately
+for NDJSON (it cannot resume), after CHAT_CANCEL_GRACE_S for SSE (the
+client may come back). A conversation thread runs one run at a time, and
+all runs together go through the admission controller (admission.py).
+
+Event ids are "<run_id>:<seq>", so Last-Event-ID alone identifies the run.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from . import admission, jobs, run_control
+from .ai_service import process_chat_stream
+from .config import settings
+from .stream_encoder import encode_line
+
+logger = logging.getLogger(__name__)
+
+def _line(payload: dict) -> str:
+    return encode_line(payload).rstrip("\n")
+
+
+DONE_LINE = _line({"type": "done"})
+
+
+class ChatRun:
+    def __init__(self, thread_id: str, ticket: admission.Ticket):
+        self.run_id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self.ticket = ticket
+        self.events: List[str] = []
+        self.done = False
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_token = run_control.CancelToken()
+        self.subscribers = 0
+        self._reserved = True
+        self._cancel_timer: Optional[asyncio.TimerHandle] = None
+        self._closer: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def _append(self, line: str):
+        async with self._changed:
+            self.events.append(line)
+            self._changed.notify_all()
+
+    async def _finish(self):
+        async with self._changed:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._changed.notify_all()
+
+    async def _report_position(self, position: int):
+        await self._append(_line({"type": "queued", "position": position}))
+
+    async def execute(self, message: str):
+        marker = run_control.install_token(self.cancel_token)
+        submitted_jobs = jobs.collect_submitted()
+        try:
+            if run_control.thread_locks.waiting(self.thread_id) > 1 or run_control.thread_locks.held(self.thread_id):
+                await self._append(_line({"type": "queued"}))
+            # From here hold() owns the reservation and releases it if the wait is cancelled
+            self._reserved = False
+            async with run_control.thread_locks.hold(self.thread_id):
+                async with admission.controller.admitted(self.ticket, self._report_position):
+                    async for chunk in process_chat_stream(message, self.thread_id):
+                        # Encoder frames may hold several NDJSON lines; each becomes one event
+                        for line in chunk.split("\n"):
+                            if line.strip():
+                                await self._append(line)
+            # Background jobs started by tools report progress here, after the thread and slot are released
+            async for event in jobs.follow(submitted_jobs):
+                await self._append(_line(event))
+        except asyncio.CancelledError:
+            logger.info("Chat run %s on thread %s cancelled (%s)", self.run_id, self.thread_id,
+                        self.cancel_token.reason or "cancelled")
+            await self._append(_line({"type": "cancelled"}))
+        finally:
+            run_control.reset_token(marker)
+            await self._append(DONE_LINE)
+            await self._finish()
+
+    def cancel(self, reason: str):
+        if self.done:
+            return
+        self.cancel_token.cancel(reason)
+        if self.task is not None:
+            self.task.cancel()
+
+    def attach(self):
+        self.subscribers += 1
+        if self._cancel_timer is not None:
+            self._cancel_timer.cancel()
+            self._cancel_timer = None
+
+    def detach(self, grace_s: float):
+        self.subscribers -= 1
+        if self.subscribers > 0 or self.done:
+            return
+        if grace_s <= 0:
+            self.cancel("client disconnected")
+        elif self._cancel_timer is None:
+            self._cancel_timer = asyncio.get_running_loop().call_later(
+                grace_s, self.cancel, "client did not reconnect"
+            )
+
+    def _on_task_done(self, task: asyncio.Task):
+        # Cancelled before execute() reached the thread lock
+        if self._reserved:
+            self._reserved = False
+            run_control.thread_locks.cancel_reservation(self.thread_id)
+        admission.controller.cancel(self.ticket)
+        if self._cancel_timer is not None:
+            self._cancel_timer.cancel()
+            self._cancel_timer = None
+        # Cancelled before execute() started, or again while it was finishing: its finally did not close the run
+        if not self.done:
+            self._closer = asyncio.get_running_loop().create_task(self._close_abandoned())
+
+    async def _close_abandoned(self):
+        async with self._changed:
+            if self.done:
+                return
+            if not self.events or self.events[-1] != DONE_LINE:
+                self.events.append(_line({"type": "cancelled"}))
+                self.events.append(DONE_LINE)
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._changed.notify_all()
+
+    async def wait_for_events(self, count: int, timeout: Optional[float]) -> bool:
+        """Waits until more than `count` events exist or the run ended; False on timeout."""
+        async with self._changed:
+            if len(self.events) > count or self.done:
+                return True
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    def expired(self, now: float) -> bool:
+        return self.done and self.finished_at is not None and now - self.finished_at > settings.CHAT_RUN_TTL_S
+
+
+_runs: Dict[str, ChatRun] = {}
+
+
+def _sweep():
+    now = time.monotonic()
+    for run_id in [rid for rid, run in _runs.items() if run.expired(now)]:
+        del _runs[run_id]
+
+
+def start_run(message: str, thread_id: str, client: str = "") -> ChatRun:
+    """
+    Raises run_control.ThreadBusy when the thread cannot take another run and
+    admission.AdmissionRejected when the agent queue is full.
+    """
+    _sweep()
+    run_control.thread_locks.reserve(thread_id)
+    try:
+        ticket = admission.controller.reserve(client or thread_id)
+    except admission.AdmissionRejected:
+        run_control.thread_locks.cancel_reservation(thread_id)
+        raise
+    run = ChatRun(thread_id, ticket)
+    _runs[run.run_id] = run
+    run.task = asyncio.create_task(run.execute(message))
+    run.task.add_done_callback(run._on_task_done)
+    return run
+
+
+def get_run(run_id: str) -> Optional[ChatRun]:
+    _sweep()
+    return _runs.get(run_id)
+
+
+def parse_event_id(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """"<run_id>:<seq>" -> (run_id, seq); (None, -1) when absent or malformed."""
+    if not value:
+        return None, -1
+    run_id, _, seq = value.strip().rpartition(":")
+    try:
+        return run_id or None, int(seq)
+    except ValueError:
+        return None, -1
+
+
+async def _watch_disconnect(request, on_disconnect):
+    """Waits for http.disconnect on the request and reports it once."""
+    try:
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                on_disconnect()
+                return
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        on_disconnect()
+
+
+async def _follow(run: ChatRun, last_seq: int, request, grace_s: float,
+                  heartbeat_s: Optional[float]) -> AsyncIterator[Optional[int]]:
+    """
+    Yields buffered event positions after `last_seq` and then live ones,
+    or None when `heartbeat_s` passes without events. Holds a subscription
+    on the run; it is released on disconnect or when the consumer stops.
+    """
+    run.attach()
+    detached = False
+
+    def release():
+        nonlocal detached
+        if not detached:
+            detached = True
+            run.detach(grace_s)
+
+    watcher = asyncio.create_task(_watch_disconnect(request, release)) if request is not None else None
+    try:
+        position = last_seq + 1
+        while True:
+            # Read the flag before draining: "done" is set only after the last append
+            finished = run.done
+            while position < len(run.events):
+                yield position
+                position += 1
+            if finished:
+                return
+            if not await run.wait_for_events(position, heartbeat_s):
+                yield None
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        release()
+
+
+async def sse_stream(run: ChatRun, last_seq: int = -1, request=None) -> AsyncIterator[str]:
+    """SSE framing of a run, with heartbeat comments while the run is quiet."""
+    yield f"retry: {settings.CHAT_SSE_RETRY_MS}\n\n"
+    if last_seq < 0:
+        yield f"data: {_line({'type': 'run', 'run_id': run.run_id})}\n\n"
+    async for seq in _follow(run, last_seq, request, settings.CHAT_CANCEL_GRACE_S, settings.CHAT_SSE_HEARTBEAT_S):
+        if seq is None:
+            yield ": ping\n\n"
+        else:
+            yield f"id: {run.run_id}:{seq}\ndata: {run.events[seq]}\n\n"
+
+
+async def ndjson_stream(run: ChatRun, request=None) -> AsyncIterator[str]:
+    """Legacy NDJSON framing: no ids or control events, cancelled as soon as the client leaves."""
+    async for seq in _follow(run, -1, request, 0, None):
+        line = run.events[seq]
+        if line != DONE_LINE:
+            yield line + "\n"
@@ -0,0 +1,147 @@
+"""
+Negotiated compression for dynamic responses.
+
+JSON responses above COMPRESS_MIN_BYTES are gzip-compressed (or brotli
+when the optional `brotli` package is installed and the client prefers it)
+according to Accept-Encoding. Streaming NDJSON is compressed too, with a
+sync flush after every chunk so each line still reaches the client as soon
+as it is produced. SSE streams are left alone: intermediaries and
+EventSource polyfills handle compressed event streams poorly, and
+their frames are small already.
+
+Responses that already carry Content-Encoding (precompressed static files)
+and non-200 responses are passed through unchanged.
+"""
+import zlib
+from typing import Optional
+
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/javascript",
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript", "image/svg+xml",
+)
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Encodings an Accept-Encoding header allows (q=0 excludes one)."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.strip()
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        if name.strip() and q > 0:
+            accepted.add(name.strip())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """br (when brotli is installed) or gzip, for compressing on the fly."""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=settings.COMPRESS_BROTLI_QUALITY)
+        else:
+            # wbits=31: gzip container
+            self._gz = zlib.compressobj(settings.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compresses data and flushes, so the client can decode everything sent so far."""
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.COMPRESS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether the response streams
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = [(k.lower(), v) for k, v in start_message.get("headers", [])]
+                content_type = next((v for k, v in headers if k == b"content-type"), b"").decode("latin-1")
+                eligible = (
+                    start_message["status"] == 200
+                    and not any(k == b"content-encoding" for k, _ in headers)
+                    and content_type.split(";")[0].strip() in COMPRESSIBLE_TYPES
+                    and (more_body or len(body) >= settings.COMPRESS_MIN_BYTES)
+                )
+                if not eligible:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                headers = [(k, v) for k, v in headers if k != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                headers.append((b"vary", b"Accept-Encoding"))
+                if not more_body:
+                    body = compressor.finish(body)
+                    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+                    await send({**start_message, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start_message, "headers": headers})
+
+            if more_body:
+                data = compressor.chunk(body) if body else b""
+                if data:
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_wrapper)
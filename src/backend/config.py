@@ -11,6 +11,15 @@ class Settings(BaseModel):
     SILICON_FLOW_API_KEY: str = os.getenv("SILICON_FLOW_API_KEY", "")
     SILICON_FLOW_BASE_URL: str = os.getenv("SILICON_FLOW_BASE_URL", "https://api.siliconflow.cn/v1")
     SILICON_FLOW_MODEL_NAME: str = os.getenv("SILICON_FLOW_MODEL_NAME", "zai-org/GLM-4.6")
+
+    # Model backend: openai | record | replay | scripted
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "openai")
+    LLM_RECORD_PATH: str = os.getenv("LLM_RECORD_PATH", "llm_recordings.jsonl")
+    LLM_REPLAY_PATH: str = os.getenv("LLM_REPLAY_PATH", "llm_recordings.jsonl")
+    LLM_REPLAY_DELAY_MS: float = float(os.getenv("LLM_REPLAY_DELAY_MS", 0))
+    LLM_SCRIPT_PATH: str = os.getenv("LLM_SCRIPT_PATH", "")
+    LLM_SCRIPT_CHUNK_CHARS: int = int(os.getenv("LLM_SCRIPT_CHUNK_CHARS", 4))
+    LLM_SCRIPT_DELAY_MS: float = float(os.getenv("LLM_SCRIPT_DELAY_MS", 0))
     
     # Database
     DB_HOST: str = os.getenv("DB_HOST", "127.0.0.1")
@@ -19,5 +28,89 @@ class Settings(BaseModel):
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
     DB_NAME: str = os.getenv("DB_NAME", "course_scheduling")
     DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    # Create missing tables, columns and indexes at startup (schema.ensure_schema)
+    DB_AUTO_MIGRATE: bool = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+    # Agent prompt
+    AGENT_PROMPT_TOKEN_BUDGET: int = int(os.getenv("AGENT_PROMPT_TOKEN_BUDGET", 12000))
+    AGENT_HISTORY_KEEP_TURNS: int = int(os.getenv("AGENT_HISTORY_KEEP_TURNS", 4))
+    AGENT_STALE_TOOL_MAX_CHARS: int = int(os.getenv("AGENT_STALE_TOOL_MAX_CHARS", 600))
+
+    # Fast path (answers common read-only questions without the LLM)
+    FAST_PATH_ENABLED: bool = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+    FAST_PATH_MIN_CONFIDENCE: float = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", 0.85))
+
+    # Read-only tool result cache
+    TOOL_CACHE_ENABLED: bool = os.getenv("TOOL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    TOOL_CACHE_SIZE: int = int(os.getenv("TOOL_CACHE_SIZE", 256))
+    # Cached results also expire after this many seconds, so writes made by other workers are picked up
+    TOOL_CACHE_TTL_S: float = float(os.getenv("TOOL_CACHE_TTL_S", 60))
+
+    # Tool output limits
+    TOOL_OUTPUT_MAX_CHARS: int = int(os.getenv("TOOL_OUTPUT_MAX_CHARS", 4000))
+    TOOL_PAGE_SIZE: int = int(os.getenv("TOOL_PAGE_SIZE", 20))
+    TOOL_PAGE_SIZE_MAX: int = int(os.getenv("TOOL_PAGE_SIZE_MAX", 100))
+
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+    # SQL profiler: slow-query log, EXPLAIN capture, N+1 warnings, Server-Timing header
+    SQL_PROFILER_ENABLED: bool = os.getenv("SQL_PROFILER_ENABLED", "true").lower() in ("1", "true", "yes")
+    SQL_SLOW_QUERY_MS: float = float(os.getenv("SQL_SLOW_QUERY_MS", 200))
+    SQL_EXPLAIN_SLOW: bool = os.getenv("SQL_EXPLAIN_SLOW", "true").lower() in ("1", "true", "yes")
+    SQL_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 10))
+
+    # Chat stream: token/thinking deltas are merged into frames flushed by age or size (0 = one line per delta)
+    STREAM_FLUSH_MS: float = float(os.getenv("STREAM_FLUSH_MS", 30))
+    STREAM_FLUSH_CHARS: int = int(os.getenv("STREAM_FLUSH_CHARS", 256))
+
+    # Resumable SSE chat runs
+    CHAT_RUN_TTL_S: float = float(os.getenv("CHAT_RUN_TTL_S", 300))
+    CHAT_SSE_HEARTBEAT_S: float = float(os.getenv("CHAT_SSE_HEARTBEAT_S", 15))
+    CHAT_SSE_RETRY_MS: int = int(os.getenv("CHAT_SSE_RETRY_MS", 2000))
+
+    # Abandoned runs: SSE runs are cancelled this long after the last client left (NDJSON immediately)
+    CHAT_CANCEL_GRACE_S: float = float(os.getenv("CHAT_CANCEL_GRACE_S", 30))
+    # One run per conversation thread: "queue" waits (at most CHAT_THREAD_QUEUE_MAX waiting), "reject" returns 409
+    CHAT_THREAD_POLICY: str = os.getenv("CHAT_THREAD_POLICY", "queue").lower()
+    CHAT_THREAD_QUEUE_MAX: int = int(os.getenv("CHAT_THREAD_QUEUE_MAX", 2))
+
+    # Admission control: concurrent agent runs, and runs allowed to wait before new chats get 429
+    CHAT_MAX_CONCURRENT_RUNS: int = int(os.getenv("CHAT_MAX_CONCURRENT_RUNS", 4))
+    CHAT_ADMISSION_QUEUE_MAX: int = int(os.getenv("CHAT_ADMISSION_QUEUE_MAX", 16))
+
+    # Background jobs: worker threads, rows per committed chunk, and the size above which bulk tools go to a job
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", 2))
+    JOB_CHUNK_SIZE: int = int(os.getenv("JOB_CHUNK_SIZE", 200))
+    JOB_INLINE_MAX_ROWS: int = int(os.getenv("JOB_INLINE_MAX_ROWS", 500))
+    # Workers refresh their unfinished jobs this often; unfinished jobs without a heartbeat for JOB_STALE_S are failed
+    JOB_HEARTBEAT_S: float = float(os.getenv("JOB_HEARTBEAT_S", 15))
+    JOB_STALE_S: float = float(os.getenv("JOB_STALE_S", 120))
+
+    # Agent stack: false = CRUD-only deployment (chat returns 503); warmup loads it in the background at startup
+    AGENT_ENABLED: bool = os.getenv("AGENT_ENABLED", "true").lower() in ("1", "true", "yes")
+    AGENT_WARMUP: bool = os.getenv("AGENT_WARMUP", "true").lower() in ("1", "true", "yes")
+
+    # Longest allowed lesson, enforced on every course write; bounds the index range conflict checks scan and lock
+    COURSE_MAX_HOURS: int = int(os.getenv("COURSE_MAX_HOURS", 24))
+
+    # Default search time limit of the weekly timetable optimizer (seconds)
+    TIMETABLE_TIME_LIMIT_S: float = float(os.getenv("TIMETABLE_TIME_LIMIT_S", 5))
+
+    # Heatmap arrays are reloaded after a write in this process, or at the latest after this many seconds
+    # (writes made by other workers)
+    ANALYTICS_CACHE_TTL_S: float = float(os.getenv("ANALYTICS_CACHE_TTL_S", 60))
+
+    # Streaming exports: rows fetched from the server-side cursor and sent per chunk
+    EXPORT_BATCH_ROWS: int = int(os.getenv("EXPORT_BATCH_ROWS", 1000))
+
+    # Static assets: built by `python -m backend.assets build`; served instead of frontend/ when present
+    FRONTEND_DIST_DIR: str = os.getenv("FRONTEND_DIST_DIR", "dist")
+
+    # Negotiated gzip/brotli for JSON and NDJSON responses (SSE is never compressed)
+    COMPRESS_ENABLED: bool = os.getenv("COMPRESS_ENABLED", "true").lower() in ("1", "true", "yes")
+    COMPRESS_MIN_BYTES: int = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+    COMPRESS_GZIP_LEVEL: int = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY: int = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
 
 settings = Settings()
@@ -0,0 +1,188 @@
+"""
+Streaming exports of courses, students and per-period financial summaries.
+
+    GET /api/export/courses?format=csv&date_range=2024-01-01,2026-12-31
+    GET /api/export/students?format=xlsx
+    GET /api/export/finances?format=jsonl&period=month
+
+Rows are read with a server-side cursor in batches of EXPORT_BATCH_ROWS
+(see service.export_*) and every batch is encoded and sent as one chunk,
+so memory stays flat however many years are exported and the header goes
+out before the query has finished.
+
+Formats:
+
+- csv: UTF-8 with a BOM so Excel detects the encoding;
+- jsonl: one JSON object per line;
+- xlsx: a minimal single-sheet workbook written through a streaming zip
+  (inline strings, no shared-string table), so it needs no extra
+  dependency and streams like the other two.
+"""
+import csv
+import io
+import json
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from . import service
+from .config import settings
+
+Batches = Iterable[List[dict]]
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+# ==================== Encoders ====================
+
+def _csv(columns: Sequence[str], batches: Batches, sheet: str) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(columns)
+    yield buf.getvalue().encode("utf-8")
+    for rows in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([_plain(row[c]) for c in columns] for row in rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _jsonl(columns: Sequence[str], batches: Batches, sheet: str) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps({c: _plain(row[c]) for c in columns}, ensure_ascii=False) + "\n" for row in rows
+        ).encode("utf-8")
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable target for ZipFile; the bytes written so far are taken out after every batch."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        f'<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+# Characters XML 1.0 does not allow, even escaped
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _cell(value) -> str:
+    value = _plain(value)
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_INVALID_XML.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(values) -> str:
+    return "<row>" + "".join(_cell(v) for v in values) + "</row>"
+
+
+def _xlsx(columns: Sequence[str], batches: Batches, sheet: str) -> Iterator[bytes]:
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in _XLSX_PARTS.items():
+            archive.writestr(name, _XML_HEADER + xml)
+        archive.writestr("xl/workbook.xml", (
+            f'{_XML_HEADER}<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>'
+            f'<sheet name="{escape(sheet[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as part:
+            part.write(f'{_XML_HEADER}<worksheet xmlns="{_MAIN_NS}"><sheetData>{_row(columns)}'.encode("utf-8"))
+            yield sink.take()
+            for rows in batches:
+                part.write("".join(_row(row[c] for c in columns) for row in rows).encode("utf-8"))
+                yield sink.take()
+            part.write(b"</sheetData></worksheet>")
+    yield sink.take()
+
+
+FORMATS: Dict[str, Tuple[str, Callable[..., Iterator[bytes]]]] = {
+    "csv": ("text/csv; charset=utf-8", _csv),
+    "jsonl": ("application/x-ndjson", _jsonl),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _xlsx),
+}
+
+# ==================== Datasets ====================
+
+DATASETS: Dict[str, Callable[..., tuple]] = {
+    "courses": service.export_courses,
+    "students": service.export_students,
+    "finances": service.export_finances,
+}
+
+
+def open_export(dataset: str, fmt: str, **filters) -> Tuple[str, str, Iterator[bytes]]:
+    """
+    Validates the request and returns (media type, file name, body chunks).
+    Invalid datasets, formats or filters raise ValueError here, before any byte is sent;
+    the database is only queried once the body is iterated.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"unknown dataset {dataset!r}, expected one of {sorted(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {sorted(FORMATS)}")
+    columns, batches = DATASETS[dataset](**filters, batch_size=settings.EXPORT_BATCH_ROWS)
+    media_type, encode = FORMATS[fmt]
+    filename = f"{dataset}-{date.today():%Y%m%d}.{fmt}"
+    return media_type, filename, _stream(encode(columns, batches, dataset), batches)
+
+
+def _stream(chunks: Iterator[bytes], batches) -> Iterator[bytes]:
+    try:
+        yield from chunks
+    finally:
+        # A client that disconnects mid-export closes the cursor's connection at once
+        batches.close()
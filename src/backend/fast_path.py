@@ -0,0 +1,142 @@
+"""
+Deterministic fast path for common read-only questions.
+
+Requests such as "今天有什么课" or "本周概览" map one-to-one onto a single
+read tool. A rule-based classifier recognizes them before the graph runs,
+so they are answered by calling the tool directly instead of paying for
+one or two LLM round trips. Anything ambiguous falls back to the agent.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from .config import settings
+
+# Messages that ask for a change must always go through the agent
+_MUTATION_PATTERN = re.compile(r"添加|新增|加一?节|删除|删掉|取消|修改|改到|改成|调整|移动|创建|录入|批量")
+
+# Longer messages usually carry extra constraints the rules cannot honor
+_MAX_MESSAGE_CHARS = 30
+
+
+@dataclass
+class FastPathMatch:
+    intent: str
+    tool_name: str
+    args: dict = field(default_factory=dict)
+    confidence: float = 0.0
+
+
+@dataclass
+class _Rule:
+    intent: str
+    tool_name: str
+    pattern: re.Pattern
+    confidence: float
+    build_args: Callable[[re.Match], dict] = lambda m: {}
+
+
+def _int_group(m: re.Match, default: int) -> int:
+    value = m.groupdict().get("n")
+    return int(value) if value else default
+
+
+_RULES: List[_Rule] = [
+    _Rule(
+        intent="daily_schedule",
+        tool_name="get_daily_schedule_tool",
+        pattern=re.compile(r"^(今天|今日)(有)?(什么|哪些|啥)?(课|课程|课表|安排)(吗|呢|么)?$|^(今天|今日)(的)?(课程|课表|安排)$"),
+        confidence=0.95,
+    ),
+    _Rule(
+        intent="daily_schedule",
+        tool_name="get_daily_schedule_tool",
+        pattern=re.compile(r"^明天(有)?(什么|哪些|啥)?(课|课程|课表|安排)(吗|呢|么)?$|^明天(的)?(课程|课表|安排)$"),
+        confidence=0.9,
+        build_args=lambda m: {"date": (datetime.now() + timedelta(days=1)).date().isoformat()},
+    ),
+    _Rule(
+        intent="daily_schedule",
+        tool_name="get_daily_schedule_tool",
+        pattern=re.compile(r"^(?P<date>\d{4}-\d{2}-\d{2})(有)?(什么|哪些|啥)?(的)?(课|课程|课表|安排)(吗|呢|么)?$"),
+        confidence=0.9,
+        build_args=lambda m: {"date": m.group("date")},
+    ),
+    _Rule(
+        intent="weekly_overview",
+        tool_name="get_weekly_overview_tool",
+        pattern=re.compile(r"^(本周|这周|这个星期|本星期)(的)?(课程|课)?(概览|概况|总览|安排)$|^(本周|这周)(有)?(什么|哪些|啥)(课|课程)(吗|呢)?$"),
+        confidence=0.9,
+    ),
+    _Rule(
+        intent="upcoming_lessons",
+        tool_name="get_upcoming_lessons_tool",
+        pattern=re.compile(r"^(未来|接下来)(?P<n>\d{1,3})(个)?小时(内)?(有)?(什么|哪些|的)?(课|课程|安排)(吗|呢)?$"),
+        confidence=0.9,
+        build_args=lambda m: {"hours": _int_group(m, 24)},
+    ),
+    _Rule(
+        intent="upcoming_lessons",
+        tool_name="get_upcoming_lessons_tool",
+        # "最近" can also mean the recent past, so only forward-looking words are accepted
+        pattern=re.compile(r"^(接下来|马上)(有)?(什么|哪些|啥)(课|课程)(吗|呢)?$"),
+        confidence=0.85,
+        build_args=lambda m: {"hours": 24},
+    ),
+    _Rule(
+        intent="absent_students",
+        tool_name="get_absent_students_tool",
+        pattern=re.compile(r"^(谁|哪些学生|哪些人|哪个学生)(很久|好久|长期|一直)(都)?(没|没有|未)(来)?上课(了)?(吗|呢)?$|^长期未上课(的)?学生$"),
+        confidence=0.85,
+        build_args=lambda m: {"days": 30},
+    ),
+    _Rule(
+        intent="absent_students",
+        tool_name="get_absent_students_tool",
+        pattern=re.compile(r"^(谁|哪些学生|哪些人)(超过)?(?P<n>\d{1,3})天(以上)?(都)?(没|没有|未)(来)?上课(了)?(吗|呢)?$"),
+        confidence=0.9,
+        build_args=lambda m: {"days": _int_group(m, 30)},
+    ),
+]
+
+_STRIP_PATTERN = re.compile(r"[\s，。！？!?,.~～、…]+")
+
+
+def _normalize(message: str) -> str:
+    text = _STRIP_PATTERN.sub("", message or "")
+    for prefix in ("请问", "帮我看看", "帮我看一下", "帮我查一下", "帮我查查", "看看", "查一下", "查查", "我想知道"):
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+    return text
+
+
+def classify(message: str) -> Optional[FastPathMatch]:
+    """Returns the best matching intent, or None. Confidence is not filtered here."""
+    if not message or len(message) > _MAX_MESSAGE_CHARS or _MUTATION_PATTERN.search(message):
+        return None
+
+    text = _normalize(message)
+    best: Optional[FastPathMatch] = None
+    for rule in _RULES:
+        m = rule.pattern.search(text)
+        if not m:
+            continue
+        if best is None or rule.confidence > best.confidence:
+            best = FastPathMatch(
+                intent=rule.intent,
+                tool_name=rule.tool_name,
+                args=rule.build_args(m),
+                confidence=rule.confidence,
+            )
+    return best
+
+
+def route(message: str) -> Optional[FastPathMatch]:
+    """The match to answer directly, or None to fall back to the agent."""
+    if not settings.FAST_PATH_ENABLED:
+        return None
+    match = classify(message)
+    if match is None or match.confidence < settings.FAST_PATH_MIN_CONFIDENCE:
+        return None
+    return match
@@ -0,0 +1,189 @@
+"""
+Conversation history compaction for the agent prompt.
+
+The checkpointer keeps every message of a thread, including large tool
+outputs (e.g. a full course table). Before each model call we build a
+compacted view of that history that fits a token budget:
+
+1. The most recent turns are kept verbatim.
+2. Tool outputs in older turns are truncated to a short head.
+3. If still over budget, the oldest turns are dropped whole, so that an
+   AIMessage with tool_calls is never separated from its ToolMessages.
+4. As a last resort, tool outputs in the kept recent turns are truncated
+   too (the current turn's last), dropping recent turns only if needed.
+
+The stored state is never modified; only the prompt sent to the model is.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import List, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message overhead (role, separators) in tokens
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@dataclass
+class CompactionStats:
+    tokens_before: int = 0
+    tokens_after: int = 0
+    dropped_turns: int = 0
+    truncated_tool_messages: int = 0
+
+
+# Cumulative counters across all compactions in this process
+_totals_lock = threading.Lock()
+_totals = {
+    "calls": 0,
+    "tokens_before": 0,
+    "tokens_after": 0,
+    "dropped_turns": 0,
+    "truncated_tool_messages": 0,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate without a tokenizer.
+    CJK characters are roughly one token each; other text is ~4 chars/token.
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if ord(ch) > 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _content_text(msg: BaseMessage) -> str:
+    content = msg.content
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, str):
+                parts.append(part)
+            elif isinstance(part, dict) and isinstance(part.get("text"), str):
+                parts.append(part["text"])
+        return "".join(parts)
+    return str(content)
+
+
+def message_tokens(msg: BaseMessage) -> int:
+    tokens = estimate_tokens(_content_text(msg)) + _MESSAGE_OVERHEAD_TOKENS
+    for call in getattr(msg, "tool_calls", None) or []:
+        tokens += estimate_tokens(call.get("name", "")) + estimate_tokens(str(call.get("args", "")))
+    return tokens
+
+
+def count_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def _split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage."""
+    turns: List[List[BaseMessage]] = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage) or not turns:
+            turns.append([msg])
+        else:
+            turns[-1].append(msg)
+    return turns
+
+
+def _truncate_tool_message(msg: ToolMessage, max_chars: int) -> ToolMessage:
+    text = _content_text(msg)
+    if len(text) <= max_chars:
+        return msg
+    omitted = len(text) - max_chars
+    truncated = f"{text[:max_chars]}\n…[历史工具输出已截断，省略 {omitted} 字符；如需完整数据请重新调用工具]"
+    return msg.model_copy(update={"content": truncated})
+
+
+def _truncate_turns(turns: List[List[BaseMessage]], max_chars: int, stats: CompactionStats) -> None:
+    for turn in turns:
+        for i, msg in enumerate(turn):
+            if isinstance(msg, ToolMessage):
+                new_msg = _truncate_tool_message(msg, max_chars)
+                if new_msg is not msg:
+                    turn[i] = new_msg
+                    stats.truncated_tool_messages += 1
+
+
+def _flatten(turns: List[List[BaseMessage]]) -> List[BaseMessage]:
+    return [m for turn in turns for m in turn]
+
+
+def compact_history(
+    messages: Sequence[BaseMessage],
+    budget: int = None,
+    keep_turns: int = None,
+    tool_max_chars: int = None,
+    reserved_tokens: int = 0,
+) -> tuple[List[BaseMessage], CompactionStats]:
+    """
+    Returns (compacted_messages, stats).
+    `reserved_tokens` accounts for parts of the prompt outside `messages`
+    (the system prompt), so the whole prompt stays within `budget`.
+    """
+    budget = settings.AGENT_PROMPT_TOKEN_BUDGET if budget is None else budget
+    keep_turns = settings.AGENT_HISTORY_KEEP_TURNS if keep_turns is None else keep_turns
+    tool_max_chars = settings.AGENT_STALE_TOOL_MAX_CHARS if tool_max_chars is None else tool_max_chars
+
+    stats = CompactionStats()
+    stats.tokens_before = count_tokens(messages) + reserved_tokens
+    limit = max(0, budget - reserved_tokens)
+
+    turns = _split_turns(messages)
+    keep_turns = max(1, keep_turns)
+    old_turns = turns[:-keep_turns]
+    recent_turns = turns[-keep_turns:]
+
+    # 1) Stale tool outputs are truncated unconditionally
+    _truncate_turns(old_turns, tool_max_chars, stats)
+
+    # 2) Drop oldest turns while over budget
+    while old_turns and count_tokens(_flatten(old_turns + recent_turns)) > limit:
+        old_turns.pop(0)
+        stats.dropped_turns += 1
+
+    # 3) Still over budget: truncate tool outputs of the recent (but not current) turns,
+    #    then drop them, and only then touch the current turn's tool outputs
+    if count_tokens(_flatten(recent_turns)) > limit:
+        _truncate_turns(recent_turns[:-1], tool_max_chars, stats)
+
+    while len(recent_turns) > 1 and count_tokens(_flatten(recent_turns)) > limit:
+        recent_turns.pop(0)
+        stats.dropped_turns += 1
+
+    if count_tokens(_flatten(recent_turns)) > limit:
+        _truncate_turns(recent_turns, tool_max_chars, stats)
+
+    compacted = _flatten(old_turns + recent_turns)
+    stats.tokens_after = count_tokens(compacted) + reserved_tokens
+
+    with _totals_lock:
+        _totals["calls"] += 1
+        _totals["tokens_before"] += stats.tokens_before
+        _totals["tokens_after"] += stats.tokens_after
+        _totals["dropped_turns"] += stats.dropped_turns
+        _totals["truncated_tool_messages"] += stats.truncated_tool_messages
+
+    if stats.tokens_after < stats.tokens_before:
+        logger.info(
+            "History compacted: %d -> %d tokens (dropped %d turns, truncated %d tool outputs)",
+            stats.tokens_before, stats.tokens_after, stats.dropped_turns, stats.truncated_tool_messages,
+        )
+
+    return compacted, stats
+
+
+def get_compaction_totals() -> dict:
+    """Cumulative compaction metrics for this process."""
+    with _totals_lock:
+        return dict(_totals)
@@ -0,0 +1,364 @@
+"""
+Background jobs for long bulk operations.
+
+Large recurring imports and batch edits/deletes run on a small worker pool
+(JOB_WORKERS threads) instead of inside the agent's tool step, so they hold
+neither the chat stream nor a DB connection for their whole duration. Each
+job works in chunks of JOB_CHUNK_SIZE rows with one transaction per chunk
+and is persisted in the jobs table (status, progress, result).
+
+Cancellation takes effect between chunks: chunks already committed stay,
+the job ends as "cancelled" with its progress so far.
+
+Jobs submitted during a chat run are reported on that run's stream as
+{"type": "job", ...} events until they finish (see follow()).
+
+Every job row records the worker process that owns it, and that process
+refreshes heartbeat_at every JOB_HEARTBEAT_S while the job is unfinished.
+A queued or running job whose heartbeat is older than JOB_STALE_S belonged
+to a worker that died and is marked failed by whichever worker notices
+first, so several uvicorn workers and rolling restarts never fail each
+other's live jobs.
+"""
+import asyncio
+import contextvars
+import inspect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from . import schema, service
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Finished jobs kept in memory for status polling; older ones are read from the table
+_KEEP_FINISHED = 200
+_FOLLOW_INTERVAL_S = 0.5
+
+# Owner id of the jobs submitted by this process
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class InvalidJob(ValueError):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, params: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.progress = 0
+        self.total = 0
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, done: int, total: int):
+        """Progress callback for the chunked service functions; stops the job between chunks."""
+        self.progress, self.total = done, total
+        _save(self)
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at.isoformat(timespec="seconds"),
+            "started_at": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "finished_at": self.finished_at.isoformat(timespec="seconds") if self.finished_at else None,
+        }
+
+
+# ==================== Job kinds ====================
+# Each kind is a chunked bulk operation in service.py (accepts chunk_size and on_progress)
+
+_KINDS: Dict[str, Callable[..., dict]] = {
+    "recurring_courses": service.bulk_create_recurring_courses,
+    "batch_modify_courses": service.bulk_update_courses_filtered,
+    "batch_remove_courses": service.bulk_delete_courses_filtered,
+}
+_RESERVED_PARAMS = ("chunk_size", "on_progress")
+
+
+def kinds() -> List[str]:
+    return sorted(_KINDS)
+
+
+def _validate(kind: str, params: dict):
+    if kind not in _KINDS:
+        raise InvalidJob(f"unknown job kind {kind!r}, expected one of {kinds()}")
+    if any(name in params for name in _RESERVED_PARAMS):
+        raise InvalidJob(f"params may not set {_RESERVED_PARAMS}")
+    try:
+        inspect.signature(_KINDS[kind]).bind(**params)
+    except TypeError as e:
+        raise InvalidJob(f"invalid params for {kind}: {e}") from e
+
+
+# ==================== Persistence ====================
+
+_table_ready = False
+_table_lock = threading.Lock()
+_last_recovery = 0.0
+
+
+def _ensure_table():
+    """Creates the jobs table (and its owner/heartbeat columns) on first use, then fails stale jobs."""
+    global _table_ready
+    if not _table_ready:
+        with _table_lock:
+            if not _table_ready:
+                with service.get_db_cursor() as cursor:
+                    cursor.execute(schema.JOBS_TABLE)
+                    schema.ensure_columns(cursor, "jobs")
+                _table_ready = True
+    _recover_stale()
+
+
+def _recover_stale():
+    """Marks unfinished jobs of workers that stopped sending heartbeats as failed; at most once per heartbeat."""
+    global _last_recovery
+    now = time.monotonic()
+    if now - _last_recovery < settings.JOB_HEARTBEAT_S:
+        return
+    _last_recovery = now
+    cutoff = datetime.now() - timedelta(seconds=settings.JOB_STALE_S)
+    try:
+        with service.get_db_cursor() as cursor:
+            # Rows from before the owner column have no heartbeat; their creation time stands in for it.
+            # This process's own jobs are alive by definition, even if a DB outage delayed their heartbeat.
+            cursor.execute(
+                """
+                UPDATE jobs SET status = %s, error = %s, finished_at = %s
+                WHERE status IN (%s, %s) AND COALESCE(heartbeat_at, created_at) < %s
+                  AND (owner IS NULL OR owner <> %s)
+                """,
+                (FAILED, "服务重启，任务中断", datetime.now(), QUEUED, RUNNING, cutoff, WORKER_ID),
+            )
+            if cursor.rowcount:
+                logger.warning("Marked %d job(s) without heartbeat as failed", cursor.rowcount)
+    except Exception:
+        logger.exception("Failed to recover stale jobs")
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(settings.JOB_HEARTBEAT_S)
+        with _jobs_lock:
+            live = [j.id for j in _jobs.values() if j.status not in FINAL_STATUSES]
+        if live:
+            try:
+                with service.get_db_cursor() as cursor:
+                    cursor.execute(
+                        f"UPDATE jobs SET heartbeat_at = %s WHERE id IN ({', '.join(['%s'] * len(live))})",
+                        (datetime.now(), *live),
+                    )
+            except Exception:
+                logger.exception("Failed to refresh job heartbeats")
+        _recover_stale()
+
+
+def _insert(job: Job):
+    with service.get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO jobs (id, kind, status, params, progress, total, created_at, owner, heartbeat_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (job.id, job.kind, job.status, json.dumps(job.params, ensure_ascii=False),
+             job.progress, job.total, job.created_at, WORKER_ID, job.created_at),
+        )
+
+
+def _save(job: Job):
+    try:
+        with service.get_db_cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE jobs
+                SET status = %s, progress = %s, total = %s, result = %s, error = %s,
+                    started_at = %s, finished_at = %s, heartbeat_at = %s
+                WHERE id = %s
+                """,
+                (job.status, job.progress, job.total,
+                 json.dumps(job.result, ensure_ascii=False) if job.result is not None else None,
+                 job.error, job.started_at, job.finished_at, datetime.now(), job.id),
+            )
+    except Exception:
+        # Progress persistence must not fail the job itself; the in-memory state stays authoritative
+        logger.exception("Failed to persist job %s", job.id)
+
+
+def _from_row(row: dict) -> dict:
+    def iso(value):
+        return value.isoformat(timespec="seconds") if value else None
+
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": row["progress"],
+        "total": row["total"],
+        "result": json.loads(row["result"]) if row.get("result") else None,
+        "error": row.get("error"),
+        "created_at": iso(row.get("created_at")),
+        "started_at": iso(row.get("started_at")),
+        "finished_at": iso(row.get("finished_at")),
+    }
+
+
+# ==================== Execution ====================
+
+_jobs: Dict[str, Job] = {}
+_jobs_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Job ids submitted during the current chat run (see collect_submitted)
+_submitted: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("submitted_jobs", default=None)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, settings.JOB_WORKERS), thread_name_prefix="job")
+            threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True).start()
+        return _executor
+
+
+def _prune():
+    finished = [j for j in _jobs.values() if j.status in FINAL_STATUSES]
+    for job in sorted(finished, key=lambda j: j.finished_at)[:-_KEEP_FINISHED]:
+        _jobs.pop(job.id, None)
+
+
+def _run(job: Job):
+    if job.cancel_requested:
+        status = CANCELLED
+    else:
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        _save(job)
+        try:
+            job.result = _KINDS[job.kind](**job.params, chunk_size=settings.JOB_CHUNK_SIZE, on_progress=job.report)
+            job.progress = job.total = max(job.total, job.progress)
+            status = SUCCEEDED
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            job.error = str(e)
+            status = FAILED
+    # finished_at first: readers treat a final status as complete
+    job.finished_at = datetime.now()
+    job.status = status
+    _save(job)
+    with _jobs_lock:
+        _prune()
+
+
+def submit(kind: str, params: dict) -> Job:
+    """Persists and queues a job. Raises InvalidJob for unknown kinds or params the operation does not accept."""
+    _validate(kind, params)
+    _ensure_table()
+    job = Job(kind, params)
+    _insert(job)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    # executor.submit does not copy contextvars, so a chat run's cancel token never reaches the job
+    _get_executor().submit(_run, job)
+    collected = _submitted.get()
+    if collected is not None:
+        collected.append(job.id)
+    return job
+
+
+def get(job_id: str) -> Optional[dict]:
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.snapshot()
+    _ensure_table()
+    with service.get_db_cursor() as cursor:
+        cursor.execute("SELECT * FROM jobs WHERE id = %s", (job_id,))
+        row = cursor.fetchone()
+    return _from_row(row) if row else None
+
+
+def list_recent(limit: int = 20) -> List[dict]:
+    _ensure_table()
+    with service.get_db_cursor() as cursor:
+        cursor.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT %s", (int(limit),))
+        rows = cursor.fetchall()
+    # Live jobs report their in-memory progress, which is ahead of the table between chunks
+    return [_jobs[row["id"]].snapshot() if row["id"] in _jobs else _from_row(row) for row in rows]
+
+
+def cancel(job_id: str) -> Optional[dict]:
+    """Requests cancellation; returns the job snapshot, or None if this process does not run the job."""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    if job.status not in FINAL_STATUSES:
+        job._cancel.set()
+    return job.snapshot()
+
+
+# ==================== Chat stream integration ====================
+
+def collect_submitted() -> list:
+    """Records job ids submitted in the current context (a chat run and the tools it runs)."""
+    collected: list = []
+    _submitted.set(collected)
+    return collected
+
+
+def event(job: Job) -> dict:
+    return {"type": "job", "id": job.id, "kind": job.kind, "status": job.status,
+            "progress": job.progress, "total": job.total, "result": job.result, "error": job.error}
+
+
+async def follow(job_ids: List[str]):
+    """Yields a job event whenever one of the jobs changes, until all of them have finished."""
+    last: Dict[str, tuple] = {}
+    pending = [j for j in (_jobs.get(job_id) for job_id in job_ids) if j is not None]
+    while pending:
+        for job in list(pending):
+            state = (job.status, job.progress, job.total)
+            if last.get(job.id) != state:
+                last[job.id] = state
+                yield event(job)
+            if job.status in FINAL_STATUSES:
+                pending.remove(job)
+        if pending:
+            await asyncio.sleep(_FOLLOW_INTERVAL_S)
@@ -0,0 +1,298 @@
+"""
+Pluggable chat model backends for the agent graph.
+
+LLM_BACKEND selects the model the graph is built with:
+
+- "openai"   : the real SiliconFlow model (default)
+- "record"   : the real model, with every streamed call appended to LLM_RECORD_PATH
+- "replay"   : re-emits recorded calls from LLM_REPLAY_PATH, no network
+- "scripted" : synthetic responses from LLM_SCRIPT_PATH (or a built-in script)
+
+The offline backends make the rest of the pipeline (run_agent_stream,
+tools, DB layer) measurable and reproducible without provider latency.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from .config import settings
+
+
+def _bind_openai_tools(model: BaseChatModel, tools: Sequence, **kwargs):
+    formatted = [t if isinstance(t, dict) else convert_to_openai_tool(t) for t in tools]
+    return model.bind(tools=formatted, **kwargs)
+
+
+def _chunk_to_record(chunk: ChatGenerationChunk, offset_s: float) -> dict:
+    msg = chunk.message
+    return {
+        "t": round(offset_s, 4),
+        "content": msg.content if isinstance(msg.content, str) else "",
+        "additional_kwargs": msg.additional_kwargs or {},
+        "tool_call_chunks": [dict(tc) for tc in (getattr(msg, "tool_call_chunks", None) or [])],
+    }
+
+
+def _record_to_chunk(record: dict) -> ChatGenerationChunk:
+    return ChatGenerationChunk(
+        message=AIMessageChunk(
+            content=record.get("content") or "",
+            additional_kwargs=record.get("additional_kwargs") or {},
+            tool_call_chunks=record.get("tool_call_chunks") or [],
+        )
+    )
+
+
+# ==================== Recorder ====================
+
+class RecordingChatModel(BaseChatModel):
+    """Delegates to a real model and appends each streamed call to a JSONL file."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    path: str
+    streaming: bool = True
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def bind_tools(self, tools: Sequence, **kwargs):
+        return _bind_openai_tools(self, tools, **kwargs)
+
+    def _write(self, chunks: List[dict], messages: List[BaseMessage]):
+        last_human = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        line = json.dumps(
+            {"recorded_at": time.time(), "last_human": last_human, "chunks": chunks},
+            ensure_ascii=False,
+            default=str,
+        )
+        with self._lock:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        t0 = time.perf_counter()
+        recorded = []
+        for chunk in self.inner._stream(messages, stop=stop, **kwargs):
+            recorded.append(_chunk_to_record(chunk, time.perf_counter() - t0))
+            yield chunk
+        self._write(recorded, messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        t0 = time.perf_counter()
+        recorded = []
+        async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+            recorded.append(_chunk_to_record(chunk, time.perf_counter() - t0))
+            yield chunk
+        await asyncio.to_thread(self._write, recorded, messages)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+
+# ==================== Replay ====================
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Re-emits recorded calls in order (cycling when exhausted).
+    delay_ms >= 0 sleeps that long between chunks; delay_ms < 0 reproduces the recorded timing.
+    """
+
+    path: str
+    delay_ms: float = 0.0
+    streaming: bool = True
+
+    _calls: List[List[dict]] = PrivateAttr(default_factory=list)
+    _cursor: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            self._calls = [json.loads(line)["chunks"] for line in f if line.strip()]
+        if not self._calls:
+            raise ValueError(f"No recorded calls in {self.path}")
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Sequence, **kwargs):
+        return _bind_openai_tools(self, tools, **kwargs)
+
+    def _next_call(self) -> List[dict]:
+        with self._lock:
+            call = self._calls[self._cursor % len(self._calls)]
+            self._cursor += 1
+            return call
+
+    def _delays(self, call: List[dict]) -> Iterator[float]:
+        prev = 0.0
+        for record in call:
+            if self.delay_ms >= 0:
+                yield self.delay_ms / 1000.0
+            else:
+                t = float(record.get("t") or 0.0)
+                yield max(0.0, t - prev)
+                prev = t
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        call = self._next_call()
+        for record, delay in zip(call, self._delays(call)):
+            if delay:
+                time.sleep(delay)
+            yield _record_to_chunk(record)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        call = self._next_call()
+        for record, delay in zip(call, self._delays(call)):
+            if delay:
+                await asyncio.sleep(delay)
+            yield _record_to_chunk(record)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+
+# ==================== Scripted ====================
+
+# Default scenario: look up today's schedule, then answer.
+DEFAULT_SCRIPT = [
+    {"after_tool": False, "tool_calls": [{"name": "get_daily_schedule_tool", "args": {}}]},
+    {"after_tool": True, "content": "好的，以上就是今天的课程安排啦 (´▽｀)"},
+]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Synthetic responses chosen statelessly from the conversation, so it is safe under concurrency.
+
+    Each script turn may contain:
+      - "match": regex searched in the last human message
+      - "after_tool": true = only right after a tool result, false = only right after a human message
+      - "reasoning": text emitted as reasoning_content
+      - "content": text streamed in chunks of `chunk_chars`
+      - "tool_calls": [{"name": ..., "args": {...}}]
+    The first turn whose conditions match is used.
+    """
+
+    script: List[dict] = Field(default_factory=lambda: list(DEFAULT_SCRIPT))
+    chunk_chars: int = 4
+    delay_ms: float = 0.0
+    streaming: bool = True
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Sequence, **kwargs):
+        return _bind_openai_tools(self, tools, **kwargs)
+
+    def _select_turn(self, messages: List[BaseMessage]) -> dict:
+        conversation = [m for m in messages if not isinstance(m, SystemMessage)]
+        after_tool = bool(conversation) and isinstance(conversation[-1], ToolMessage)
+        last_human = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        if not isinstance(last_human, str):
+            last_human = str(last_human)
+        for turn in self.script:
+            if "after_tool" in turn and bool(turn["after_tool"]) != after_tool:
+                continue
+            if turn.get("match") and not re.search(turn["match"], last_human):
+                continue
+            return turn
+        return {"content": f"收到：{last_human}"}
+
+    def _records(self, messages: List[BaseMessage]) -> Iterator[dict]:
+        turn = self._select_turn(messages)
+        size = max(1, self.chunk_chars)
+        reasoning = turn.get("reasoning") or ""
+        for i in range(0, len(reasoning), size):
+            yield {"content": "", "additional_kwargs": {"reasoning_content": reasoning[i:i + size]}}
+        content = turn.get("content") or ""
+        for i in range(0, len(content), size):
+            yield {"content": content[i:i + size]}
+        tool_call_chunks = [
+            {
+                "name": call["name"],
+                "args": json.dumps(call.get("args") or {}, ensure_ascii=False),
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "index": index,
+            }
+            for index, call in enumerate(turn.get("tool_calls") or [])
+        ]
+        if tool_call_chunks:
+            yield {"content": "", "tool_call_chunks": tool_call_chunks}
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for record in self._records(messages):
+            if self.delay_ms:
+                time.sleep(self.delay_ms / 1000.0)
+            yield _record_to_chunk(record)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        for record in self._records(messages):
+            if self.delay_ms:
+                await asyncio.sleep(self.delay_ms / 1000.0)
+            yield _record_to_chunk(record)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+
+# ==================== Factory ====================
+
+def _openai_model() -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=settings.SILICON_FLOW_MODEL_NAME,
+        openai_api_key=settings.SILICON_FLOW_API_KEY,
+        openai_api_base=str(settings.SILICON_FLOW_BASE_URL),
+        temperature=0,
+        streaming=True
+    )
+
+
+def build_chat_model(backend: Optional[str] = None) -> BaseChatModel:
+    backend = (backend or settings.LLM_BACKEND or "openai").lower()
+    if backend == "openai":
+        return _openai_model()
+    if backend == "record":
+        return RecordingChatModel(inner=_openai_model(), path=settings.LLM_RECORD_PATH)
+    if backend == "replay":
+        return ReplayChatModel(path=settings.LLM_REPLAY_PATH, delay_ms=settings.LLM_REPLAY_DELAY_MS)
+    if backend == "scripted":
+        script = DEFAULT_SCRIPT
+        if settings.LLM_SCRIPT_PATH:
+            with open(settings.LLM_SCRIPT_PATH, encoding="utf-8") as f:
+                script = json.load(f)
+        return ScriptedChatModel(
+            script=script,
+            chunk_chars=settings.LLM_SCRIPT_CHUNK_CHARS,
+            delay_ms=settings.LLM_SCRIPT_DELAY_MS,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {backend}")
@@ -1,13 +1,54 @@
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.responses import StreamingResponse
-from fastapi.staticfiles import StaticFiles
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Body, Header, Request
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from .models import Course, CourseCreate, CourseUpdate, Student, StudentCreate, StudentUpdate, ChatRequest
+from typing import List, Optional
+from .models import (
+    Course, CourseCreate, CourseMoveBatch, CourseUpdate, Resource, ResourceCreate, Student, StudentCreate, StudentUpdate, StudentRoster, ChatRequest, JobCreate,
+    TimetablePlan, TimetableResult,
+)
 from . import service
+from . import admission
+from . import assets
 from . import ai_service
+from . import chat_runs
+from . import compression
+from . import exports
+from . import jobs
+from . import metrics
+from . import profiler
+from . import run_control
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DB_AUTO_MIGRATE:
+        try:
+            await asyncio.to_thread(service.ensure_schema_ready)
+        except Exception:
+            # Serve anyway: routes that do not touch the new columns keep working
+            logger.exception("Schema migration failed")
+    try:
+        # Lessons longer than COURSE_MAX_HOURS from before the limit widen the conflict look-back
+        await asyncio.to_thread(service.check_course_durations)
+    except Exception:
+        logger.exception("Course duration check failed")
+    # The agent loads in a worker thread while CRUD routes are already being served
+    warmup = None
+    if settings.AGENT_ENABLED and settings.AGENT_WARMUP:
+        warmup = asyncio.create_task(ai_service.warmup())
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+
 
-app = FastAPI(title="Hello Kitty Tutoring Schedule")
+app = FastAPI(title="Hello Kitty Tutoring Schedule", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,20 +57,48 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiler.ServerTimingMiddleware)
 
 # ==================== Course Routes ====================
 
 @app.get("/api/courses", response_model=List[Course])
-def list_courses():
+def list_courses(start: Optional[str] = None, end: Optional[str] = None):
+    # FullCalendar sends the visible range; without it every course is returned
+    if start and end:
+        try:
+            return service.get_courses_in_range(start, end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     return service.get_all_courses()
 
 @app.post("/api/courses", response_model=Course)
-def create_course(course: CourseCreate):
-    return service.create_course(course)
+def create_course(course: CourseCreate, check_conflicts: bool = False):
+    if not check_conflicts:
+        try:
+            return service.create_course(course)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    # Conflict check and insert in one transaction; 409 carries the overlapping courses
+    try:
+        return service.create_course_checked(course)
+    except service.ScheduleConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "conflicts": e.conflicts})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/courses/moves")
+def move_courses(batch: CourseMoveBatch):
+    # One transaction for a batch of drag/resize moves; per-item results, failed items keep their old time
+    return {"results": service.move_courses(batch.moves, allow_conflicts=batch.allow_conflicts)}
 
 @app.put("/api/courses/{course_id}", response_model=Course)
 def update_course(course_id: str, course: CourseUpdate):
-    updated = service.update_course(course_id, course)
+    try:
+        updated = service.update_course(course_id, course)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not updated:
         raise HTTPException(status_code=404, detail="Course not found")
     return updated
@@ -41,6 +110,48 @@ def delete_course(course_id: str):
         raise HTTPException(status_code=404, detail="Course not found")
     return {"status": "success"}
 
+# ==================== Calendar Routes ====================
+
+@app.get("/api/calendar/summary")
+def calendar_summary(start: str, end: str, titles: int = 3):
+    try:
+        return service.get_calendar_summary(start, end, titles_per_day=min(max(titles, 0), 10))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ==================== Analytics Routes ====================
+
+@app.get("/api/analytics/heatmap")
+def analytics_heatmap(start: Optional[str] = None, end: Optional[str] = None, slot_minutes: int = 30,
+                      student_id: Optional[int] = None):
+    # NumPy is loaded on the first heatmap request, not at server start
+    from . import analytics
+
+    try:
+        start_day, end_day = analytics.parse_range(start, end)
+        return analytics.heatmap(start_day, end_day, slot_minutes=slot_minutes, student_id=student_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ==================== Export Routes ====================
+
+@app.get("/api/export/{dataset}")
+def export_data(dataset: str, format: str = "csv", title: str = "", student: str = "",
+                date_range: Optional[str] = None, weekday: Optional[str] = None,
+                name: str = "", grade: str = "", period: str = "month"):
+    if dataset == "students":
+        filters = {"name_pattern": name, "grade": grade}
+    else:
+        filters = {"title_pattern": title, "student_name": student, "date_range": date_range, "weekday": weekday}
+        if dataset == "finances":
+            filters["period"] = period
+    try:
+        media_type, filename, body = exports.open_export(dataset, format, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 # ==================== Student Routes ====================
 
 @app.get("/api/students", response_model=List[Student])
@@ -51,6 +162,17 @@ def list_students():
 def create_student(student: StudentCreate):
     return service.create_student(student)
 
+# Declared before /api/students/{student_id} so "roster" is not parsed as an id
+@app.get("/api/students/roster", response_model=StudentRoster)
+def student_roster(sort: str = "name", order: str = "asc", limit: int = 50, offset: int = 0,
+                   name: str = "", grade: str = ""):
+    limit, offset = min(max(limit, 1), 200), max(offset, 0)
+    try:
+        items, total = service.get_student_roster(sort, order, limit, offset, name_pattern=name, grade=grade)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "total": total, "limit": limit, "offset": offset}
+
 @app.get("/api/students/{student_id}", response_model=Student)
 def get_student(student_id: int):
     student = service.get_student(student_id)
@@ -72,18 +194,129 @@ def delete_student(student_id: int):
         raise HTTPException(status_code=404, detail="Student not found")
     return {"status": "success"}
 
+# ==================== Resource Routes ====================
+
+@app.get("/api/resources", response_model=List[Resource])
+def list_resources(kind: Optional[str] = None):
+    try:
+        return service.list_resources(kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/resources", response_model=Resource)
+def create_resource(resource: ResourceCreate):
+    try:
+        return service.create_resource(resource)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/resources/{resource_id}")
+def delete_resource(resource_id: int):
+    if not service.delete_resource(resource_id):
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return {"status": "success"}
+
+# ==================== Timetable Routes ====================
+
+@app.post("/api/timetable/plan", response_model=TimetableResult)
+def plan_timetable(plan: TimetablePlan):
+    try:
+        return service.plan_weekly_timetable(plan)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ==================== Background Job Routes ====================
+
+@app.post("/api/jobs", status_code=202)
+def submit_job(job: JobCreate):
+    try:
+        return jobs.submit(job.kind, job.params).snapshot()
+    except jobs.InvalidJob as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/jobs")
+def list_jobs(limit: int = 20):
+    return jobs.list_recent(min(max(limit, 1), 100))
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or not running in this process")
+    if job["status"] in jobs.FINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return job
+
 # ==================== AI Chat Endpoint ====================
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
 @app.post("/api/ai/chat")
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, http_request: Request):
+    if not settings.AGENT_ENABLED:
+        raise HTTPException(status_code=503, detail="AI 助手未启用")
+    # Both transports run the agent in the background; it is cancelled when the client goes away
+    try:
+        client = http_request.client.host if http_request.client else ""
+        run = chat_runs.start_run(request.message, request.thread_id, client)
+    except run_control.ThreadBusy:
+        raise HTTPException(status_code=409, detail="该会话正在处理上一条消息，请稍后再试")
+    except admission.AdmissionRejected as e:
+        metrics.AGENT_RUNS_REJECTED.inc()
+        raise HTTPException(
+            status_code=429,
+            detail="AI 助手繁忙，请稍后再试",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    # SSE: can be resumed with Last-Event-ID within CHAT_CANCEL_GRACE_S
+    if "text/event-stream" in http_request.headers.get("accept", ""):
+        return StreamingResponse(
+            chat_runs.sse_stream(run, request=http_request),
+            media_type="text/event-stream",
+            headers={**SSE_HEADERS, "X-Run-Id": run.run_id},
+        )
+
+    # Legacy NDJSON stream
     return StreamingResponse(
-        ai_service.process_chat_stream(request.message, request.thread_id),
+        chat_runs.ndjson_stream(run, http_request),
         media_type="application/json"
     )
 
+@app.get("/api/ai/chat/stream/{run_id}")
+async def resume_chat(run_id: str, http_request: Request, last_event_id: Optional[str] = Header(None)):
+    run = chat_runs.get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found or expired")
+    event_run_id, last_seq = chat_runs.parse_event_id(last_event_id)
+    if event_run_id not in (None, run_id):
+        raise HTTPException(status_code=400, detail="Last-Event-ID belongs to another run")
+    return StreamingResponse(
+        chat_runs.sse_stream(run, last_seq, request=http_request),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Run-Id": run.run_id},
+    )
+
+# ==================== Metrics ====================
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 
-# Mount static files (Frontend)
-app.mount("/", StaticFiles(directory="frontend", html=True), name="static")
+# Mount static files (Frontend): the built dist/ (hashed, precompressed) when present, else the sources
+static_dir = settings.FRONTEND_DIST_DIR if os.path.isfile(os.path.join(settings.FRONTEND_DIST_DIR, "index.html")) else "frontend"
+app.mount("/", assets.PrecompressedStaticFiles(directory=static_dir, html=True), name="static")
 
 if __name__ == "__main__":
     import uvicorn
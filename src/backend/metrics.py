@@ -0,0 +1,340 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+A deliberately small registry (counters, gauges, histograms with labels) so
+/metrics needs no extra dependency. Instruments are module-level and safe to
+update from the event loop and from worker threads.
+
+Exposed families:
+- http_request_duration_seconds{method,route,status}
+- db_query_duration_seconds{operation}
+- db_pool_idle_connections / db_pool_in_use_connections
+- db_pool_acquire_seconds, db_pool_connections_created_total{reason}
+- llm_time_to_first_token_seconds, llm_generation_seconds
+- agent_tool_duration_seconds{tool}, agent_tool_errors_total{tool}
+- agent_history_tokens_total{stage}, agent_history_compactions_total
+- agent_runs_running / agent_runs_waiting, agent_runs_rejected_total
+"""
+import abc
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _init_unlabeled(self, value):
+        # Unlabeled families are exported from the start, not only after the first update
+        if not self.labelnames:
+            self._children[()] = value
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Exposition lines of the family: header() followed by its samples."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._init_unlabeled(0.0)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._children.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._init_unlabeled(0.0)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    render = Counter.render
+
+
+class Collected(_Metric):
+    """A family whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        try:
+            samples = sorted(self._collect().items())
+        except Exception:
+            return []
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in samples
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * n_buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._init_unlabeled(_HistogramChild(len(self.buckets)))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = _HistogramChild(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    child.counts[i] += 1
+                    break
+            child.sum += value
+            child.count += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(c.counts), c.sum, c.count) for key, c in sorted(self._children.items())]
+        lines = self.header()
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ==================== Instruments ====================
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the last response byte, by route template.",
+    ("method", "route", "status"),
+))
+
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "db_query_duration_seconds",
+    "Latency of SQL statements executed through get_db_cursor.",
+    ("operation",),
+    buckets=DB_BUCKETS,
+))
+
+DB_POOL_ACQUIRE_SECONDS = REGISTRY.register(Histogram(
+    "db_pool_acquire_seconds",
+    "Time to obtain a usable connection (pool hit, ping, or new connection).",
+    buckets=DB_BUCKETS,
+))
+
+DB_POOL_CREATED = REGISTRY.register(Counter(
+    "db_pool_connections_created_total",
+    "Connections opened because the pool was empty or a pooled connection was dead.",
+    ("reason",),
+))
+
+DB_POOL_IN_USE = REGISTRY.register(Gauge(
+    "db_pool_in_use_connections",
+    "Connections currently checked out; above the pool size, callers run on overflow connections.",
+))
+
+LLM_TTFT_SECONDS = REGISTRY.register(Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from model call start to the first streamed chunk.",
+    buckets=LLM_BUCKETS,
+))
+
+LLM_GENERATION_SECONDS = REGISTRY.register(Histogram(
+    "llm_generation_seconds",
+    "Total duration of a model call.",
+    buckets=LLM_BUCKETS,
+))
+
+TOOL_SECONDS = REGISTRY.register(Histogram(
+    "agent_tool_duration_seconds",
+    "Tool execution time, by display name.",
+    ("tool",),
+))
+
+TOOL_ERRORS = REGISTRY.register(Counter(
+    "agent_tool_errors_total",
+    "Tool calls that raised or returned an error message, by display name.",
+    ("tool",),
+))
+
+AGENT_RUNS_REJECTED = REGISTRY.register(Counter(
+    "agent_runs_rejected_total",
+    "Chat requests refused with 429 because the agent queue was full.",
+))
+
+
+def register_pool_gauge(idle: Callable[[], int]):
+    REGISTRY.register(Collected(
+        "db_pool_idle_connections",
+        "Connections currently waiting in the pool.",
+        "gauge", (), lambda: {(): idle()},
+    ))
+
+
+def register_compaction_metrics(totals: Callable[[], dict]):
+    """Exposes history compaction totals (estimated tokens before/after, passes)."""
+    REGISTRY.register(Collected(
+        "agent_history_tokens_total",
+        "Estimated prompt history tokens before and after compaction.",
+        "counter", ("stage",),
+        lambda: {("before",): totals()["tokens_before"], ("after",): totals()["tokens_after"]},
+    ))
+    REGISTRY.register(Collected(
+        "agent_history_compactions_total",
+        "History compaction passes.",
+        "counter", (), lambda: {(): totals()["calls"]},
+    ))
+
+
+def register_admission_gauges(running: Callable[[], int], waiting: Callable[[], int]):
+    REGISTRY.register(Collected(
+        "agent_runs_running", "Agent runs currently executing.", "gauge", (), lambda: {(): running()},
+    ))
+    REGISTRY.register(Collected(
+        "agent_runs_waiting", "Agent runs waiting for admission.", "gauge", (), lambda: {(): waiting()},
+    ))
+
+
+# ==================== HTTP middleware ====================
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency by route template
+    (e.g. /api/courses/{course_id}), measured until the last body chunk so
+    streaming chat responses count their full duration.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) if route is not None else None
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - t0,
+                method=scope.get("method", ""),
+                route=path if path and path != "/" else "static",
+                status=str(status["code"]),
+            )
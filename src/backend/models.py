@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional
-from datetime import datetime
+from typing import List, Literal, Optional
+from datetime import date, datetime, time
 import uuid
 
 # ==================== Chat Models ====================
@@ -9,6 +9,12 @@ class ChatRequest(BaseModel):
     message: str = Field(..., description="User message")
     thread_id: Optional[str] = Field("default", description="Session ID for conversation history")
 
+# ==================== Job Models ====================
+
+class JobCreate(BaseModel):
+    kind: str = Field(..., description="Job kind: recurring_courses / batch_modify_courses / batch_remove_courses")
+    params: dict = Field(default_factory=dict, description="Arguments of the matching bulk operation")
+
 # ==================== Student Models ====================
 
 class StudentBase(BaseModel):
@@ -36,6 +42,31 @@ class Student(StudentBase):
     class Config:
         json_encoders = {}
 
+class StudentRosterEntry(Student):
+    total_lessons: int = Field(0, description="All lessons of the student")
+    upcoming_lessons: int = Field(0, description="Lessons starting from now on")
+    next_lesson: Optional[datetime] = Field(None, description="Start of the next lesson")
+    last_lesson: Optional[datetime] = Field(None, description="Start of the most recent past lesson")
+    total_income: float = Field(0, description="Lifetime income")
+    month_income: float = Field(0, description="Income from lessons in the current month")
+
+class StudentRoster(BaseModel):
+    items: List[StudentRosterEntry]
+    total: int = Field(..., description="Students matching the filters")
+    limit: int
+    offset: int
+
+
+# ==================== Resource Models ====================
+
+class ResourceCreate(BaseModel):
+    kind: Literal["teacher", "room"] = Field(..., description="Resource kind")
+    name: str = Field(..., description="Teacher or room name, unique per kind")
+    notes: Optional[str] = Field(None, description="Additional notes")
+
+class Resource(ResourceCreate):
+    id: int = Field(..., description="Resource ID")
+
 
 # ==================== Course Models ====================
 
@@ -44,6 +75,8 @@ class CourseBase(BaseModel):
     start: datetime = Field(..., description="Start time of the course")
     end: datetime = Field(..., description="End time of the course")
     student_id: int = Field(..., description="Foreign key to Student")
+    teacher_id: Optional[int] = Field(None, description="Teacher resource; unset = the default teacher")
+    room_id: Optional[int] = Field(None, description="Room resource; unset = no room booked")
     price: float = Field(..., ge=0, description="Price of the session")
     color: str = Field("#F5A3C8", description="Color code for the course card")
     description: Optional[str] = Field(None, description="Additional notes")
@@ -57,11 +90,22 @@ class CourseUpdate(BaseModel):
     start: Optional[datetime] = None
     end: Optional[datetime] = None
     student_id: Optional[int] = None
+    teacher_id: Optional[int] = None
+    room_id: Optional[int] = None
     price: Optional[float] = None
     color: Optional[str] = None
     description: Optional[str] = None
     location: Optional[str] = None
 
+class CourseMove(BaseModel):
+    id: str = Field(..., description="Course ID")
+    start: datetime = Field(..., description="New start time")
+    end: datetime = Field(..., description="New end time")
+
+class CourseMoveBatch(BaseModel):
+    moves: List[CourseMove] = Field(..., min_length=1, max_length=200, description="Moved or resized courses")
+    allow_conflicts: bool = Field(False, description="Apply moves that overlap other courses instead of rejecting them")
+
 class Course(CourseBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
 
@@ -71,3 +115,48 @@ class Course(CourseBase):
 
     class Config:
         json_encoders = {}
+
+# ==================== Timetable Models ====================
+
+class AvailabilityWindow(BaseModel):
+    weekday: int = Field(..., ge=0, le=6, description="0 = Monday ... 6 = Sunday")
+    start: time = Field(..., description="Window start, e.g. 16:00")
+    end: time = Field(..., description="Window end, e.g. 20:00")
+    preference: float = Field(1.0, ge=0, description="Higher values are preferred")
+
+class TimetableStudent(BaseModel):
+    student_id: int = Field(..., description="Student ID")
+    lessons_per_week: int = Field(1, ge=1, le=7, description="At most one lesson per day")
+    duration_minutes: int = Field(60, ge=15, le=480, description="Lesson length")
+    availability: List[AvailabilityWindow] = Field(..., min_length=1, description="Weekly windows the student can attend")
+
+class TimetablePlan(BaseModel):
+    students: List[TimetableStudent] = Field(..., min_length=1, max_length=500)
+    working_hours: List[AvailabilityWindow] = Field(default_factory=list, description="Teacher's working hours; empty = every day 08:00-22:00")
+    teacher_id: Optional[int] = Field(None, description="Teacher whose existing lessons block time; None = default teacher")
+    week_start: Optional[date] = Field(None, description="Monday of the week whose existing lessons block time; default next Monday")
+    slot_minutes: Literal[5, 10, 15, 20, 30, 60] = Field(15, description="Start time granularity")
+    time_limit_s: Optional[float] = Field(None, gt=0, le=60, description="Search time limit; default TIMETABLE_TIME_LIMIT_S")
+
+class TimetableSlot(BaseModel):
+    student_id: int
+    student_name: Optional[str] = None
+    weekday: int
+    start: time
+    end: time = Field(..., description="00:00 means the end of the day (24:00), as in AvailabilityWindow")
+    preference: float
+
+class TimetableUnplaced(BaseModel):
+    student_id: int
+    student_name: Optional[str] = None
+    missing: int = Field(..., description="Lessons per week that could not be placed")
+
+class TimetableResult(BaseModel):
+    week_start: date
+    slots: List[TimetableSlot]
+    unplaced: List[TimetableUnplaced]
+    score: float = Field(..., description="Summed preference of the placed lessons")
+    best_possible: float = Field(..., description="Score with every lesson at its best start, ignoring the other students")
+    optimal: bool
+    iterations: int
+    elapsed_ms: float
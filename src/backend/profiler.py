@@ -0,0 +1,164 @@
+"""
+SQL profiler scoped to the current HTTP request or tool call.
+
+Every statement run through get_db_cursor is normalized (literals and
+placeholders replaced by "?") and accumulated into the active scope:
+
+- statements slower than SQL_SLOW_QUERY_MS are logged, with their EXPLAIN
+  plan when SQL_EXPLAIN_SLOW is on;
+- a scope that runs the same statement shape more than
+  SQL_N_PLUS_ONE_THRESHOLD times logs an N+1 warning (once per shape);
+- HTTP responses carry a Server-Timing header with DB time and query count.
+
+Scopes nest: a tool call inside a request records into both.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_SELECT_PATTERN = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query: str) -> str:
+    """Statement shape: whitespace collapsed, literals and placeholders replaced by "?"."""
+    shape = _STRING_LITERAL.sub("?", query)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("(?+)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryProfile:
+    """Statements recorded in one request or tool scope."""
+
+    def __init__(self, name: str, parent: Optional["QueryProfile"] = None):
+        self.name = name
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.shapes: Counter = Counter()
+        self._warned: set = set()
+
+    def add(self, shape: str, duration: float, rowcount: int):
+        self.queries += 1
+        self.db_seconds += duration
+        if rowcount and rowcount > 0:
+            self.rows += rowcount
+        self.shapes[shape] += 1
+
+        threshold = settings.SQL_N_PLUS_ONE_THRESHOLD
+        if threshold > 0 and self.shapes[shape] > threshold and shape not in self._warned:
+            # Enclosing scopes would report the same loop again
+            scope = self
+            while scope is not None:
+                scope._warned.add(shape)
+                scope = scope.parent
+            logger.warning(
+                "Possible N+1 in %s: statement executed more than %d times: %s",
+                self.name, threshold, shape,
+            )
+
+    def server_timing(self) -> str:
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries", '
+            f"app;dur={elapsed_ms:.2f}"
+        )
+
+
+_current: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar("sql_profile", default=None)
+
+
+def enabled() -> bool:
+    return settings.SQL_PROFILER_ENABLED
+
+
+def current_profile() -> Optional[QueryProfile]:
+    return _current.get()
+
+
+@contextmanager
+def profile_scope(name: str):
+    """Records statements run inside the block (including worker threads that copy the context)."""
+    profile = QueryProfile(name, parent=_current.get())
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+def _explain(raw_cursor, query: str, args) -> list:
+    """EXPLAIN on a second cursor of the same connection, so it sees the same transaction."""
+    try:
+        with raw_cursor.connection.cursor(type(raw_cursor)) as cursor:
+            cursor.execute("EXPLAIN " + query, args)
+            return list(cursor.fetchall())
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+
+
+def record_statement(raw_cursor, query: str, args, duration: float, rowcount: int):
+    """Called by get_db_cursor's cursor after every statement."""
+    shape = normalize_sql(query)
+    profile = _current.get()
+    while profile is not None:
+        profile.add(shape, duration, rowcount)
+        profile = profile.parent
+
+    if duration * 1000 < settings.SQL_SLOW_QUERY_MS:
+        return
+    scope = _current.get()
+    plan = None
+    if settings.SQL_EXPLAIN_SLOW and _SELECT_PATTERN.match(query):
+        plan = _explain(raw_cursor, query, args)
+    logger.warning(
+        "Slow query %.1fms rows=%s scope=%s: %s%s",
+        duration * 1000, rowcount, scope.name if scope else "-", shape,
+        f"\n  plan: {plan}" if plan is not None else "",
+    )
+
+
+# ==================== HTTP middleware ====================
+
+class ServerTimingMiddleware:
+    """
+    Opens a profile scope per HTTP request and reports it in a Server-Timing
+    header. Streaming responses send headers first, so their header only
+    covers work done before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+
+        with profile_scope(f"{scope.get('method', '')} {scope.get('path', '')}") as profile:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,155 @@
+"""
+Prompt assembly for the agent.
+
+The prompt is split so that providers can reuse their prompt/KV cache:
+
+- a static prefix (instructions + tool schemas) that is built once per
+  process and is byte-identical across calls;
+- the conversation history;
+- a small dynamic suffix carrying the current date and time.
+
+Nothing time-dependent may be added to the static prefix.
+"""
+import hashlib
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from .history import estimate_tokens, message_tokens
+
+SYSTEM_PROMPT = """
+你是一个智能课程管理助手，专为郑婷婷老师服务。
+
+## 交流风格
+- 语气温柔、可靠、清晰；必要时可用可爱颜文字缓和语气（例如：(´▽｀)、(>_<)、(｡•̀ᴗ•́)）。
+- 不要使用 emoji 表情符号。如果工具返回了 emoji，请在回复中改写为不含 emoji 的文本。
+
+## 总体原则（避免缺参数/误操作）
+- 工具调用前先做信息校验：缺什么就问什么，不要猜。
+- 允许多轮追问：每轮只问最关键的缺口；用户答完仍缺则继续问。
+- 涉及删除/批量修改/批量删除：先查询并说明“范围 + 数量 + 影响”，再让用户确认后才执行。
+- 原样录入关键信息（人名、价格、日期时间），除非用户明确要求调整。
+
+## 工具使用与所需信息（必须遵守）
+
+### A. 学生档案
+- 查询学生：get_student_by_name_tool(name)
+- 创建学生：create_student_tool(name, grade?, phone?, parent_contact?, progress?, notes?)
+  - 必填：name
+  - 可选：grade/phone/parent_contact/progress/notes
+  - 如果用户没给可选项，可以先创建；但当后续操作需要联系方式/年级时要向用户补问确认。
+
+### B. 添加单节课程（add_course_tool）
+必填信息：
+- 课程名称：title
+- 学生姓名：student_name（必须存在学生档案；不确定先查）
+- 开始时间：start_time（ISO，例如：2026-01-27T10:00:00）
+- 结束时间：end_time（ISO）
+- 价格：price（数字）
+可选信息：location、description
+
+流程：
+1) student_name 未给：先问学生是谁。
+2) 用 get_student_by_name_tool 确认学生存在；不存在则先询问是否创建学生档案，并收集至少“学生姓名”（必要时再问年级等）。
+3) 时间信息不完整（缺日期/开始/结束/时长）：先问清楚再调用工具；不要自行脑补。
+4) 执行前可复述一次关键信息请求确认（尤其是新建课程）。
+5) add_course_tool 会在添加时一并检查时间冲突，不需要先调用 check_availability_tool；返回冲突时告知用户冲突课程，用户确认仍要添加再传 allow_conflict=true。
+6) 用户提到老师或教室时传 teacher / room（名称）；冲突只按同一学生、老师、教室判断。
+
+### C. 添加周期课程（add_recurring_course_tool）
+当用户表达“每周固定”“从A到B每周X”“连续多次”等，优先使用此工具。
+必填信息：
+- title、student_name
+- start_date（YYYY-MM-DD）、end_date（YYYY-MM-DD）
+- weekdays（例如：周一,周三 或 1,3）
+- start_time（HH:MM）、end_time（HH:MM）
+- price（数字）
+可选信息：grade、location、description
+
+流程：
+1) 任一必填缺失：先提问补齐。
+2) 执行前必须先复述计划并请求确认，例如：
+   “我将为{student_name}在{start_date}到{end_date}每周{weekdays}的{start_time}-{end_time}安排{title}，单价{price}，可以吗？(´▽｀)”
+3) 用户确认后再调用工具。
+
+### D. 规划周课表（plan_weekly_timetable_tool）
+当用户要为多名学生（或新学期）统一安排每周固定上课时间时使用。
+- 每名学生需要：姓名、每周节数、每节时长、可上课时段（如“周一 16:00-20:00, 周三至周五 18:00-21:00”），可选更希望的时段 preferred。
+- 老师工作时间可选（如“工作日 16:00-21:00, 周末 09:00-18:00”）。
+- 工具只给出方案；用户确认后，再按方案逐个学生调用 add_recurring_course_tool 创建周期课程。
+
+### E. 修改/删除课程
+- 不要凭空猜 course_id。
+- 先用 query_courses_tool 查询候选课程列表，并向用户确认要操作哪一节/哪些节。
+- 批量修改使用 batch_modify_courses_tool；批量删除使用 batch_remove_courses_tool。
+- 当用户说“删除全部/全部取消”：必须二次确认（数量、范围、不可恢复提醒）后才执行。
+
+## 输出要求
+- 每次回复先给出 1-2 句简短计划（说明你接下来要问什么或要做什么），然后再提问或调用工具。
+- 需要用户补充信息时，用清单式提问，尽量少问且明确格式。
+"""
+
+WEEKDAY_NAMES = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+
+@lru_cache(maxsize=1)
+def static_system_message() -> SystemMessage:
+    """The static instruction prefix, shared by every call."""
+    return SystemMessage(content=SYSTEM_PROMPT)
+
+
+_tool_schemas_cache: dict = {}
+
+
+def tool_schemas(tools: Sequence) -> List[dict]:
+    """OpenAI tool schemas for `tools`, converted once and memoized."""
+    key = tuple(getattr(t, "name", id(t)) for t in tools)
+    schemas = _tool_schemas_cache.get(key)
+    if schemas is None:
+        schemas = [convert_to_openai_tool(t) for t in tools]
+        _tool_schemas_cache[key] = schemas
+    return schemas
+
+
+def dynamic_context_message(now: datetime = None) -> SystemMessage:
+    """The small, per-call suffix with the current date and time."""
+    now = now or datetime.now()
+    current_date = now.strftime("%Y年%m月%d日") + " " + WEEKDAY_NAMES[now.weekday()] + " " + now.strftime("%H:%M")
+    return SystemMessage(content=f"现在是：{current_date}")
+
+
+def build_prompt_messages(history: Sequence[BaseMessage], now: datetime = None) -> List[BaseMessage]:
+    """[static prefix] + history + [dynamic suffix]"""
+    return [static_system_message()] + list(history) + [dynamic_context_message(now)]
+
+
+_prefix_tokens_cache: dict = {}
+
+
+def fixed_prompt_tokens(tools: Sequence, now: datetime = None) -> int:
+    """
+    Tokens of everything sent besides the history: the static system message,
+    the bound tool schemas and the dynamic date/time suffix.
+    """
+    key = tuple(getattr(t, "name", id(t)) for t in tools)
+    prefix = _prefix_tokens_cache.get(key)
+    if prefix is None:
+        prefix = message_tokens(static_system_message()) + estimate_tokens(
+            json.dumps(tool_schemas(tools), ensure_ascii=False)
+        )
+        _prefix_tokens_cache[key] = prefix
+    return prefix + message_tokens(dynamic_context_message(now))
+
+
+def prefix_fingerprint(tools: Sequence) -> str:
+    """Hash of the static prefix (system prompt + tool schemas); must not change between calls."""
+    payload = json.dumps(
+        {"system": SYSTEM_PROMPT, "tools": tool_schemas(tools)},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
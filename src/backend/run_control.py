@@ -0,0 +1,132 @@
+"""
+Cancellation and per-thread serialization for agent runs.
+
+A CancelToken is installed in the run's context; it is visible to the
+graph, the tools and (through copied contexts) the worker threads the
+tools run in. get_db_cursor checks it before committing, so a tool that
+is still running when its client went away rolls its transaction back.
+
+ThreadRunLocks guarantees a conversation thread never has two runs at
+once: a new run either waits its turn ("queue") or is refused ("reject").
+"""
+import asyncio
+import contextvars
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from .config import settings
+
+
+class RunCancelled(Exception):
+    """Raised inside a cancelled run before it can commit work."""
+
+
+class ThreadBusy(Exception):
+    """The conversation thread already has a run and cannot accept another one."""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = ""
+
+    def cancel(self, reason: str = "cancelled"):
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("run_cancel_token", default=None)
+
+
+def install_token(token: CancelToken) -> contextvars.Token:
+    return _current_token.set(token)
+
+
+def reset_token(marker: contextvars.Token):
+    _current_token.reset(marker)
+
+
+def is_cancelled() -> bool:
+    token = _current_token.get()
+    return token is not None and token.cancelled
+
+
+def raise_if_cancelled():
+    token = _current_token.get()
+    if token is not None and token.cancelled:
+        raise RunCancelled(f"运行已取消（{token.reason}）")
+
+
+# ==================== Per-thread serialization ====================
+
+class _ThreadSlot:
+    __slots__ = ("lock", "waiting")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+
+
+class ThreadRunLocks:
+    """One asyncio.Lock per conversation thread, dropped when nobody holds or waits for it."""
+
+    def __init__(self):
+        self._slots: Dict[str, _ThreadSlot] = {}
+
+    def held(self, thread_id: str) -> bool:
+        slot = self._slots.get(thread_id)
+        return slot is not None and slot.lock.locked()
+
+    def waiting(self, thread_id: str) -> int:
+        slot = self._slots.get(thread_id)
+        return slot.waiting if slot is not None else 0
+
+    def reserve(self, thread_id: str):
+        """
+        Claims a place for a new run (synchronously, so two requests cannot both
+        see an idle thread). Raises ThreadBusy when the policy refuses it.
+        """
+        slot = self._slots.get(thread_id)
+        if slot is not None and (slot.lock.locked() or slot.waiting):
+            if settings.CHAT_THREAD_POLICY == "reject" or slot.waiting >= settings.CHAT_THREAD_QUEUE_MAX:
+                raise ThreadBusy(thread_id)
+        if slot is None:
+            slot = self._slots[thread_id] = _ThreadSlot()
+        slot.waiting += 1
+
+    def cancel_reservation(self, thread_id: str):
+        """For a reserved run that ended before reaching hold()."""
+        slot = self._slots.get(thread_id)
+        if slot is None:
+            return
+        slot.waiting -= 1
+        self._drop_if_idle(thread_id, slot)
+
+    def _drop_if_idle(self, thread_id: str, slot: _ThreadSlot):
+        if not slot.waiting and not slot.lock.locked():
+            self._slots.pop(thread_id, None)
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str):
+        """Runs the block as the thread's only run. Requires a prior reserve()."""
+        slot = self._slots[thread_id]
+        try:
+            await slot.lock.acquire()
+        except BaseException:
+            slot.waiting -= 1
+            self._drop_if_idle(thread_id, slot)
+            raise
+        slot.waiting -= 1
+        try:
+            yield
+        finally:
+            slot.lock.release()
+            self._drop_if_idle(thread_id, slot)
+
+
+thread_locks = ThreadRunLocks()
@@ -0,0 +1,158 @@
+"""
+数据库表结构
+建表语句与索引集中在此，供本地/基准测试数据库初始化，以及线上库补齐索引
+所有操作幂等：表已存在或索引已存在时跳过
+"""
+from typing import List, Optional, Tuple
+
+TABLES: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS students (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(64) NOT NULL,
+        grade VARCHAR(32) NULL,
+        phone VARCHAR(32) NULL,
+        parent_contact VARCHAR(128) NULL,
+        progress INT NOT NULL DEFAULT 0,
+        notes TEXT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    # 老师与教室；课程通过 teacher_id / room_id 关联，冲突按资源分别判断
+    """
+    CREATE TABLE IF NOT EXISTS resources (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        kind VARCHAR(16) NOT NULL,
+        name VARCHAR(64) NOT NULL,
+        notes TEXT NULL,
+        UNIQUE KEY uq_resources_kind_name (kind, name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS courses (
+        id CHAR(36) PRIMARY KEY,
+        title VARCHAR(128) NOT NULL,
+        start DATETIME NOT NULL,
+        end DATETIME NOT NULL,
+        student_id INT NOT NULL,
+        teacher_id INT NULL,
+        room_id INT NULL,
+        price DECIMAL(10, 2) NOT NULL DEFAULT 0,
+        color VARCHAR(16) NULL,
+        description TEXT NULL,
+        location VARCHAR(255) NULL,
+        CONSTRAINT fk_courses_student FOREIGN KEY (student_id)
+            REFERENCES students (id) ON DELETE CASCADE,
+        CONSTRAINT fk_courses_teacher FOREIGN KEY (teacher_id)
+            REFERENCES resources (id) ON DELETE SET NULL,
+        CONSTRAINT fk_courses_room FOREIGN KEY (room_id)
+            REFERENCES resources (id) ON DELETE SET NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+]
+
+# 后台任务表（jobs.py 首次使用时也会单独建表）
+JOBS_TABLE = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id CHAR(32) PRIMARY KEY,
+        kind VARCHAR(64) NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        params TEXT NOT NULL,
+        progress INT NOT NULL DEFAULT 0,
+        total INT NOT NULL DEFAULT 0,
+        result MEDIUMTEXT NULL,
+        error TEXT NULL,
+        created_at DATETIME NOT NULL,
+        started_at DATETIME NULL,
+        finished_at DATETIME NULL,
+        owner VARCHAR(96) NULL,
+        heartbeat_at DATETIME NULL,
+        KEY idx_jobs_status_created (status, created_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+TABLES.append(JOBS_TABLE)
+
+# 已有库补列：(表名, 列名, 列定义, 外键约束)，在建索引之前执行
+COLUMNS: List[Tuple[str, str, str, Optional[str]]] = [
+    ("courses", "teacher_id", "INT NULL",
+     "fk_courses_teacher FOREIGN KEY (teacher_id) REFERENCES resources (id) ON DELETE SET NULL"),
+    ("courses", "room_id", "INT NULL",
+     "fk_courses_room FOREIGN KEY (room_id) REFERENCES resources (id) ON DELETE SET NULL"),
+    # 多进程部署：任务归属的工作进程与其心跳，只有心跳超时的任务才会被判定中断
+    ("jobs", "owner", "VARCHAR(96) NULL", None),
+    ("jobs", "heartbeat_at", "DATETIME NULL", None),
+]
+
+# (表名, 索引名, 列定义)
+INDEXES: List[Tuple[str, str, str]] = [
+    ("students", "idx_students_name", "(name)"),
+    ("courses", "idx_courses_start", "(start)"),
+    # 按学生的范围读与冲突检测用其 (student_id, start) 前缀；
+    # 学生名册按学生聚合课时与收入时作覆盖索引，不必回表
+    ("courses", "idx_courses_student_start_price", "(student_id, start, price)"),
+    # 冲突检测按资源分区：每位老师/每间教室各自一段索引范围
+    ("courses", "idx_courses_teacher_start", "(teacher_id, start)"),
+    ("courses", "idx_courses_room_start", "(room_id, start)"),
+]
+
+# 被上面的索引以前缀覆盖、已废弃的索引：(表名, 索引名)，新索引建好后删除，避免每次写入多维护一份
+OBSOLETE_INDEXES: List[Tuple[str, str]] = [
+    ("courses", "idx_courses_student_start"),
+]
+
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (table, index),
+    )
+    return cursor.fetchone() is not None
+
+
+def _column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+        """,
+        (table, column),
+    )
+    return cursor.fetchone() is not None
+
+
+def ensure_columns(cursor, table: Optional[str] = None) -> List[str]:
+    """补齐缺失的列（可只处理一张表），返回本次新建的列"""
+    created = []
+    for name, column, definition, foreign_key in COLUMNS:
+        if table is not None and name != table:
+            continue
+        if not _column_exists(cursor, name, column):
+            ddl = f"ALTER TABLE {name} ADD COLUMN {column} {definition}"
+            if foreign_key:
+                ddl += f", ADD CONSTRAINT {foreign_key}"
+            cursor.execute(ddl)
+            created.append(f"{name}.{column}")
+    return created
+
+
+def ensure_schema(cursor) -> List[str]:
+    """建表、补齐缺失的列与索引并删除废弃索引，返回本次新建的列与索引名（删除的索引以 - 开头）"""
+    for ddl in TABLES:
+        cursor.execute(ddl)
+
+    created = ensure_columns(cursor)
+
+    for table, index, columns in INDEXES:
+        if not _index_exists(cursor, table, index):
+            cursor.execute(f"CREATE INDEX {index} ON {table} {columns}")
+            created.append(index)
+
+    for table, index in OBSOLETE_INDEXES:
+        if _index_exists(cursor, table, index):
+            cursor.execute(f"DROP INDEX {index} ON {table}")
+            created.append(f"-{index}")
+    return created
@@ -3,14 +3,24 @@
 遵循 SOLID 原则：单一职责，所有数据访问集中在此模块
 """
 import pymysql
-from typing import List, Optional, Dict
-from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Dict
+from datetime import date, datetime, timedelta
 from contextlib import contextmanager
-from .models import Course, CourseCreate, CourseUpdate, Student, StudentCreate, StudentUpdate
+from .models import (
+    Course, CourseCreate, CourseMove, CourseUpdate, Resource, ResourceCreate,
+    Student, StudentCreate, StudentUpdate, StudentRosterEntry,
+    TimetablePlan, TimetableResult, TimetableSlot, TimetableUnplaced,
+)
 from .config import settings
+from . import metrics, profiler, run_control, schema, timetable
+import logging
 import uuid
+import time
+import threading
 from queue import LifoQueue, Empty
 
+logger = logging.getLogger(__name__)
+
 # ==================== 数据库配置 ====================
 
 DB_CONFIG = {
@@ -28,10 +38,13 @@ _CONN_POOL: LifoQueue = LifoQueue(maxsize=_POOL_SIZE)
 
 
 def _acquire_conn():
+    t0 = time.perf_counter()
     try:
         conn = _CONN_POOL.get_nowait()
     except Empty:
+        # 连接池不阻塞等待：池空时直接新建连接（计入 pool_empty）
         conn = pymysql.connect(**DB_CONFIG)
+        metrics.DB_POOL_CREATED.inc(reason="pool_empty")
 
     try:
         conn.ping(reconnect=True)
@@ -41,11 +54,15 @@ def _acquire_conn():
         except Exception:
             pass
         conn = pymysql.connect(**DB_CONFIG)
+        metrics.DB_POOL_CREATED.inc(reason="reconnect")
 
+    metrics.DB_POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - t0)
+    metrics.DB_POOL_IN_USE.inc()
     return conn
 
 
 def _release_conn(conn, healthy: bool):
+    metrics.DB_POOL_IN_USE.dec()
     if not healthy:
         try:
             conn.close()
@@ -61,6 +78,115 @@ def _release_conn(conn, healthy: bool):
             pass
 
 
+# ==================== 数据版本 ====================
+# 每次写事务提交后递增，供只读结果缓存判断数据是否已变化（仅限本进程）
+
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def get_data_version() -> int:
+    return _data_version
+
+
+def bump_data_version() -> int:
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        return _data_version
+
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def _is_write(query: str) -> bool:
+    return query.lstrip()[:7].upper().startswith(_WRITE_PREFIXES)
+
+
+# ==================== 查询观察者 ====================
+# 观察者签名: fn(sql, duration_seconds, rowcount)，用于性能统计/基准测试
+
+_query_observers: list = []
+
+
+def add_query_observer(fn):
+    _query_observers.append(fn)
+
+
+def remove_query_observer(fn):
+    try:
+        _query_observers.remove(fn)
+    except ValueError:
+        pass
+
+
+def _notify_observers(query: str, duration: float, rowcount: int):
+    for fn in list(_query_observers):
+        try:
+            fn(query, duration, rowcount)
+        except Exception:
+            pass
+
+
+_METRIC_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+
+def _observe_query_metrics(query: str, duration: float, rowcount: int):
+    operation = query.lstrip()[:7].upper().split(None, 1)[0] if query.strip() else ""
+    metrics.DB_QUERY_SECONDS.observe(
+        duration, operation=operation if operation in _METRIC_OPERATIONS else "OTHER"
+    )
+
+
+if settings.METRICS_ENABLED:
+    add_query_observer(_observe_query_metrics)
+    metrics.register_pool_gauge(_CONN_POOL.qsize)
+
+
+class _TrackedCursor:
+    """
+    游标代理：记录本事务是否执行过写语句，并把每条语句的耗时通知观察者与 SQL 分析器
+    其余属性与方法透传给真实游标
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.wrote = False
+
+    def execute(self, query, args=None):
+        if not self.wrote and _is_write(query):
+            self.wrote = True
+        if not _query_observers and not profiler.enabled():
+            return self._cursor.execute(query, args)
+        t0 = time.perf_counter()
+        result = self._cursor.execute(query, args)
+        self._observe(query, args, time.perf_counter() - t0)
+        return result
+
+    def executemany(self, query, args):
+        if not self.wrote and _is_write(query):
+            self.wrote = True
+        if not _query_observers and not profiler.enabled():
+            return self._cursor.executemany(query, args)
+        t0 = time.perf_counter()
+        result = self._cursor.executemany(query, args)
+        # executemany 的参数是多行，不做 EXPLAIN
+        self._observe(query, None, time.perf_counter() - t0)
+        return result
+
+    def _observe(self, query, args, duration: float):
+        rowcount = self._cursor.rowcount
+        _notify_observers(query, duration, rowcount)
+        if profiler.enabled():
+            try:
+                profiler.record_statement(self._cursor, query, args, duration, rowcount)
+            except Exception:
+                pass
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
 @contextmanager
 def get_db_cursor():
     """
@@ -71,8 +197,13 @@ def get_db_cursor():
     healthy = True
     try:
         cursor = conn.cursor(pymysql.cursors.DictCursor)
-        yield cursor
+        tracked = _TrackedCursor(cursor)
+        yield tracked
+        # 所属的 AI 运行已取消（客户端断开）时不提交，走下方回滚
+        run_control.raise_if_cancelled()
         conn.commit()
+        if tracked.wrote:
+            bump_data_version()
     except Exception:
         try:
             conn.rollback()
@@ -87,6 +218,66 @@ def get_db_cursor():
         _release_conn(conn, healthy=healthy)
 
 
+# ==================== 资源（老师 / 教室） ====================
+
+RESOURCE_KIND_NAMES = {"teacher": "老师", "room": "教室"}
+
+
+def ensure_schema_ready() -> List[str]:
+    """启动时补齐表、列与索引（已有库升级时新增 resources 表与 courses.teacher_id / room_id）"""
+    with get_db_cursor() as cursor:
+        return schema.ensure_schema(cursor)
+
+
+def list_resources(kind: Optional[str] = None) -> List[Resource]:
+    if kind and kind not in RESOURCE_KIND_NAMES:
+        raise ValueError(f"kind 须为 {'/'.join(RESOURCE_KIND_NAMES)}")
+    with get_db_cursor() as cursor:
+        if kind:
+            cursor.execute("SELECT * FROM resources WHERE kind = %s ORDER BY name", (kind,))
+        else:
+            cursor.execute("SELECT * FROM resources ORDER BY kind, name")
+        return [Resource(**row) for row in cursor.fetchall()]
+
+
+def get_resource_by_name(kind: str, name: str) -> Optional[Resource]:
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT * FROM resources WHERE kind = %s AND name = %s", (kind, name))
+        row = cursor.fetchone()
+        return Resource(**row) if row else None
+
+
+def resolve_resource_id(kind: str, name: Optional[str]) -> Optional[int]:
+    """名称 -> 资源 ID；名称为空返回 None，找不到时抛出 ValueError 并列出可选名称"""
+    if not name:
+        return None
+    resource = get_resource_by_name(kind, name)
+    if resource is None:
+        available = "、".join(r.name for r in list_resources(kind)) or "无"
+        raise ValueError(f"找不到{RESOURCE_KIND_NAMES[kind]} '{name}'，可选: {available}")
+    return resource.id
+
+
+def create_resource(resource_in: ResourceCreate) -> Resource:
+    """创建老师/教室；同类型下重名时抛出 ValueError"""
+    with get_db_cursor() as cursor:
+        try:
+            cursor.execute(
+                "INSERT INTO resources (kind, name, notes) VALUES (%s, %s, %s)",
+                (resource_in.kind, resource_in.name, resource_in.notes),
+            )
+        except pymysql.err.IntegrityError as e:
+            raise ValueError(f"{RESOURCE_KIND_NAMES[resource_in.kind]} '{resource_in.name}' 已存在") from e
+        return Resource(id=cursor.lastrowid, **resource_in.model_dump())
+
+
+def delete_resource(resource_id: int) -> bool:
+    """删除老师/教室；关联课程的 teacher_id / room_id 由外键置空"""
+    with get_db_cursor() as cursor:
+        cursor.execute("DELETE FROM resources WHERE id = %s", (resource_id,))
+        return cursor.rowcount > 0
+
+
 # ==================== 学生服务 ====================
 
 def get_all_students() -> List[Student]:
@@ -212,66 +403,95 @@ def get_course(course_id: str) -> Optional[Course]:
         return Course(**row) if row else None
 
 
+def _insert_course(cursor, course_in: CourseCreate) -> Course:
+    """在当前事务中插入课程并查回（带学生信息）；时间按 _wall_clock 存储"""
+    course_id = str(uuid.uuid4())
+
+    # 验证学生存在 - 直接查询，不需要额外函数调用
+    cursor.execute("SELECT * FROM students WHERE id = %s", (course_in.student_id,))
+    student_row = cursor.fetchone()
+    if not student_row:
+        raise ValueError(f"Student with id {course_in.student_id} not found")
+
+    # 插入课程
+    cursor.execute("""
+        INSERT INTO courses (id, title, start, end, student_id, teacher_id, room_id, price, color, description, location)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        course_id,
+        course_in.title,
+        _wall_clock(course_in.start),
+        _wall_clock(course_in.end),
+        course_in.student_id,
+        course_in.teacher_id,
+        course_in.room_id,
+        course_in.price,
+        course_in.color if course_in.color else "#F5A3C8",
+        course_in.description,
+        course_in.location
+    ))
+
+    # 在同一个事务中查询刚插入的数据
+    cursor.execute("""
+        SELECT c.*,
+               s.name as student_name,
+               s.grade as student_grade
+        FROM courses c
+        LEFT JOIN students s ON c.student_id = s.id
+        WHERE c.id = %s
+    """, (course_id,))
+    row = cursor.fetchone()
+    return Course(**row)
+
+
 def create_course(course_in: CourseCreate) -> Course:
     """
-    创建新课程
-    学生存在性由数据库外键约束保证
+    创建新课程（不检查冲突）
+    学生存在性由数据库外键约束保证；时间段不合法时抛出 ValueError
     """
-    import uuid
-
+    error = _validate_interval(_wall_clock(course_in.start), _wall_clock(course_in.end))
+    if error:
+        raise ValueError(error)
     with get_db_cursor() as cursor:
-        course_id = str(uuid.uuid4())
-
-        # 验证学生存在 - 直接查询，不需要额外函数调用
-        cursor.execute("SELECT * FROM students WHERE id = %s", (course_in.student_id,))
-        student_row = cursor.fetchone()
-        if not student_row:
-            raise ValueError(f"Student with id {course_in.student_id} not found")
-
-        # 插入课程
-        cursor.execute("""
-            INSERT INTO courses (id, title, start, end, student_id, price, color, description, location)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            course_id,
-            course_in.title,
-            course_in.start,
-            course_in.end,
-            course_in.student_id,
-            course_in.price,
-            course_in.color if course_in.color else "#F5A3C8",
-            course_in.description,
-            course_in.location
-        ))
-
-        # 在同一个事务中查询刚插入的数据
-        cursor.execute("""
-            SELECT c.*,
-                   s.name as student_name,
-                   s.grade as student_grade
-            FROM courses c
-            LEFT JOIN students s ON c.student_id = s.id
-            WHERE c.id = %s
-        """, (course_id,))
-        row = cursor.fetchone()
-        return Course(**row)
+        return _insert_course(cursor, course_in)
 
 
 def update_course(course_id: str, course_in: CourseUpdate) -> Optional[Course]:
     """
     更新课程
-    如果修改 student_id，数据库外键约束会自动验证
+    如果修改 student_id，数据库外键约束会自动验证；修改时间时与未修改的一端一起校验时长
     """
     with get_db_cursor() as cursor:
         update_data = course_in.dict(exclude_unset=True)
         if not update_data:
             return get_course(course_id)
 
+        for key in ('start', 'end'):
+            if update_data.get(key) is not None:
+                update_data[key] = _wall_clock(update_data[key])
+        if 'start' in update_data or 'end' in update_data:
+            cursor.execute("SELECT start, end FROM courses WHERE id = %s FOR UPDATE", (course_id,))
+            current = cursor.fetchone()
+            if not current:
+                return None
+            error = _validate_interval(
+                update_data.get('start') or current['start'],
+                update_data.get('end') or current['end'],
+            )
+            if error:
+                raise ValueError(error)
+
         # 如果要修改学生，先验证
         if 'student_id' in update_data:
             student = get_student(update_data['student_id'])
             if not student:
                 raise ValueError(f"Student with id {update_data['student_id']} not found")
+        for kind in RESOURCE_KIND_NAMES:
+            resource_id = update_data.get(f"{kind}_id")
+            if resource_id is not None:
+                cursor.execute("SELECT 1 FROM resources WHERE id = %s AND kind = %s", (resource_id, kind))
+                if not cursor.fetchone():
+                    raise ValueError(f"{RESOURCE_KIND_NAMES[kind]} id {resource_id} not found")
 
         set_clause = ", ".join(f"{k} = %s" for k in update_data.keys())
         values = list(update_data.values()) + [course_id]
@@ -293,25 +513,120 @@ def delete_course(course_id: str) -> bool:
         return cursor.rowcount > 0
 
 
-def check_conflicts(start: datetime, end: datetime, exclude_id: str = None) -> List[Course]:
+# ==================== 冲突域 ====================
+# 两节课只有占用同一资源时才算冲突：同一学生、同一位老师、同一间教室
+# 未指定老师的课程视为同一位（默认）老师，所以单老师部署仍是一条全局时间线；未指定教室的课程不占用教室
+
+def _course_domains(student_id: Optional[int], teacher_id: Optional[int], room_id: Optional[int]) -> List[tuple]:
+    """课程占用的冲突域 [(列名, 值)]，每个域对应一段 (列, start) 索引"""
+    domains = [("teacher_id", teacher_id)]
+    if student_id is not None:
+        domains.append(("student_id", student_id))
+    if room_id is not None:
+        domains.append(("room_id", room_id))
+    return domains
+
+
+def _row_domains(row: dict) -> List[tuple]:
+    return _course_domains(row.get("student_id"), row.get("teacher_id"), row.get("room_id"))
+
+
+# 启动时发现的超长历史课程的最大时长（分钟），见 check_course_durations
+_legacy_longest_minutes = 0
+
+
+def max_lesson_span() -> timedelta:
+    """任何课程都不会超过的时长：COURSE_MAX_HOURS，历史数据里有更长的课程时取其最长者"""
+    return max(timedelta(hours=settings.COURSE_MAX_HOURS), timedelta(minutes=_legacy_longest_minutes))
+
+
+def check_course_durations() -> int:
     """
-    检测时间冲突
-    使用数据库原生的时间比较，比 Python 循环更高效
+    启动时检查已有课程：所有写入路径都拒绝超过 COURSE_MAX_HOURS 的课程，但升级前的数据可能更长；
+    发现时记录告警，并把冲突检测的回看范围放宽到最长的那节课，保证它们不会被漏掉。返回超长课程数
     """
+    global _legacy_longest_minutes
     with get_db_cursor() as cursor:
-        if exclude_id:
-            cursor.execute("""
-                SELECT c.*,
-                       s.name as student_name,
-                       s.grade as student_grade
-                FROM courses c
-                LEFT JOIN students s ON c.student_id = s.id
-                WHERE c.id != %s
-                  AND c.start < %s
-                  AND c.end > %s
-                ORDER BY c.start
-            """, (exclude_id, end, start))
-        else:
+        cursor.execute(
+            """
+            SELECT COUNT(*) AS cnt, MAX(TIMESTAMPDIFF(MINUTE, start, end)) AS longest
+            FROM courses WHERE end > start + INTERVAL %s HOUR
+            """,
+            (settings.COURSE_MAX_HOURS,),
+        )
+        row = cursor.fetchone()
+    count = int(row["cnt"] or 0)
+    _legacy_longest_minutes = int(row["longest"] or 0)
+    if count:
+        logger.warning(
+            "%d course(s) are longer than COURSE_MAX_HOURS=%d (longest %d min); "
+            "conflict checks look back that far until they are fixed",
+            count, settings.COURSE_MAX_HOURS, _legacy_longest_minutes,
+        )
+    return count
+
+
+def _schedule_window(cursor, windows: Dict[tuple, tuple], lock: bool = False) -> List[dict]:
+    """
+    读取各冲突域内可能与给定时间段重叠的课程：windows 为 {(列名, 值): (开始, 结束)}
+    每个域一条范围查询，走 (student_id | teacher_id | room_id, start) 索引；所有写入都校验课程时长
+    不超过 max_lesson_span()，所以只需扫描 [开始 - max_lesson_span(), 结束) 这一段
+    lock=True 时 FOR UPDATE：间隙锁只覆盖该资源的这段索引，不同资源或不重叠时段的并发写入互不阻塞，
+    同一资源上重叠的写入则排队执行
+    """
+    rows: Dict[str, dict] = {}
+    for (column, value), (window_start, window_end) in windows.items():
+        match = f"c.{column} IS NULL" if value is None else f"c.{column} = %s"
+        params = [] if value is None else [value]
+        params += [window_start - max_lesson_span(), window_end]
+        cursor.execute(f"""
+            SELECT c.*,
+                   s.name as student_name,
+                   s.grade as student_grade
+            FROM courses c
+            LEFT JOIN students s ON c.student_id = s.id
+            WHERE {match} AND c.start > %s AND c.start < %s
+            {"FOR UPDATE OF c" if lock else ""}
+        """, params)
+        for row in cursor.fetchall():
+            rows[row["id"]] = row
+    return sorted(rows.values(), key=lambda r: r["start"])
+
+
+def _windows(intervals) -> Dict[tuple, tuple]:
+    """[(冲突域列表, 开始, 结束)] -> {冲突域: 覆盖所有相关时间段的 (开始, 结束)}"""
+    windows: Dict[tuple, tuple] = {}
+    for domains, start, end in intervals:
+        for domain in domains:
+            lo, hi = windows.get(domain, (start, end))
+            windows[domain] = (min(lo, start), max(hi, end))
+    return windows
+
+
+def _overlapping(start: datetime, end: datetime, rows, domains: List[tuple],
+                 exclude_id: Optional[str] = None) -> List[dict]:
+    return [
+        r for r in rows
+        if r["id"] != exclude_id and r["start"] < end and r["end"] > start
+        and any(r.get(column) == value for column, value in domains)
+    ]
+
+
+def check_conflicts(
+    start: datetime,
+    end: datetime,
+    exclude_id: str = None,
+    student_id: Optional[int] = None,
+    teacher_id: Optional[int] = None,
+    room_id: Optional[int] = None,
+) -> List[Course]:
+    """
+    检测时间冲突
+    指定学生/老师/教室时只检查这些资源各自的时间线（按资源分区的索引）；
+    都不指定时检查全部课程
+    """
+    if student_id is None and teacher_id is None and room_id is None:
+        with get_db_cursor() as cursor:
             cursor.execute("""
                 SELECT c.*,
                        s.name as student_name,
@@ -322,8 +637,202 @@ def check_conflicts(start: datetime, end: datetime, exclude_id: str = None) -> L
                   AND c.end > %s
                 ORDER BY c.start
             """, (end, start))
+            return [Course(**row) for row in cursor.fetchall() if row["id"] != exclude_id]
 
-        return [Course(**row) for row in cursor.fetchall()]
+    domains = _course_domains(student_id, teacher_id, room_id)
+    with get_db_cursor() as cursor:
+        rows = _schedule_window(cursor, {domain: (start, end) for domain in domains})
+    return [Course(**row) for row in _overlapping(start, end, rows, domains, exclude_id=exclude_id)]
+
+
+def get_courses_in_domains(start: datetime, end: datetime, domains: List[tuple]) -> List[Course]:
+    """[start, end) 内与给定冲突域（例如若干学生、一位老师、一间教室）相关的课程，用于查找空闲时段"""
+    with get_db_cursor() as cursor:
+        rows = _schedule_window(cursor, {domain: (start, end) for domain in domains})
+    return [Course(**row) for row in rows if row["start"] < end and row["end"] > start]
+
+
+# ==================== 带冲突校验的写入 ====================
+
+class ScheduleConflict(ValueError):
+    """时间段与已有课程冲突；conflicts 为冲突课程列表（id/title/start/end/student_name）"""
+
+    def __init__(self, conflicts: List[dict]):
+        super().__init__(f"与 {len(conflicts)} 节课程时间冲突")
+        self.conflicts = conflicts
+
+
+# InnoDB 死锁：两个事务锁住同一段空的索引间隙后都要插入，其中一个会被回滚，重试即可
+_DEADLOCK_ERRORS = (1213, 1205)
+_DEADLOCK_RETRIES = 3
+
+
+def _retry_on_deadlock(fn: Callable):
+    for attempt in range(_DEADLOCK_RETRIES):
+        try:
+            return fn()
+        except pymysql.err.OperationalError as e:
+            if e.args[0] not in _DEADLOCK_ERRORS or attempt == _DEADLOCK_RETRIES - 1:
+                raise
+            time.sleep(0.02 * (attempt + 1))
+
+
+def _wall_clock(value: datetime) -> datetime:
+    """
+    数据库存储老师（浏览器）所在地的本地时间，不带时区：日历读取、添加弹窗都按这个时间收发
+    带时区偏移的输入（拖拽提交的 ISO 字符串）只去掉时区、不换算，服务器时区与浏览器不同时也不会平移课程
+    """
+    return value.replace(tzinfo=None)
+
+
+def _validate_interval(start: datetime, end: datetime) -> Optional[str]:
+    if end <= start:
+        return "结束时间必须晚于开始时间"
+    if end - start > timedelta(hours=settings.COURSE_MAX_HOURS):
+        return f"单节课时长不能超过 {settings.COURSE_MAX_HOURS} 小时"
+    return None
+
+
+def _conflict_info(row: dict) -> dict:
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "start": row["start"].isoformat(),
+        "end": row["end"].isoformat(),
+        "student_name": row.get("student_name"),
+        "teacher_id": row.get("teacher_id"),
+        "room_id": row.get("room_id"),
+    }
+
+
+def _select_courses_by_ids(cursor, ids: list, lock: bool = False) -> Dict[str, dict]:
+    if not ids:
+        return {}
+    cursor.execute(f"""
+        SELECT c.*,
+               s.name as student_name,
+               s.grade as student_grade
+        FROM courses c
+        LEFT JOIN students s ON c.student_id = s.id
+        WHERE c.id IN ({', '.join(['%s'] * len(ids))})
+        {"FOR UPDATE OF c" if lock else ""}
+    """, ids)
+    return {row["id"]: row for row in cursor.fetchall()}
+
+
+def create_course_checked(course_in: CourseCreate) -> Course:
+    """
+    检查冲突并创建课程，在同一个事务中完成
+    按冲突域加锁范围读（见 _schedule_window），同一资源上时间段重叠的并发创建排队执行，不会重复占用同一时段；
+    有冲突时抛出 ScheduleConflict，事务回滚
+    """
+    start, end = _wall_clock(course_in.start), _wall_clock(course_in.end)
+    error = _validate_interval(start, end)
+    if error:
+        raise ValueError(error)
+    course_in = course_in.model_copy(update={"start": start, "end": end})
+
+    domains = _course_domains(course_in.student_id, course_in.teacher_id, course_in.room_id)
+
+    def attempt() -> Course:
+        with get_db_cursor() as cursor:
+            rows = _schedule_window(cursor, {domain: (start, end) for domain in domains}, lock=True)
+            found = _overlapping(start, end, rows, domains)
+            if found:
+                raise ScheduleConflict([_conflict_info(r) for r in found])
+            return _insert_course(cursor, course_in)
+
+    return _retry_on_deadlock(attempt)
+
+
+def _plan_moves(rows: List[dict], targets: Dict[str, tuple], allow_conflicts: bool) -> tuple[Dict[str, tuple], Dict[str, dict]]:
+    """
+    在加锁读出的课程上判断一批移动：返回 (可以写入的移动, 被拒绝的移动 -> 结果)
+    几个移动互相冲突时按批次顺序保留靠前的；被拒绝的移动会让课程留在原位，
+    可能又与其他移动冲突，所以反复检查直到没有新的冲突
+    allow_conflicts=True 时全部写入，重叠课程作为提示放在结果里
+    """
+    existing = {row["id"]: row for row in rows}
+    domains = {course_id: _row_domains(row) for course_id, row in existing.items()}
+    accepted = {course_id: interval for course_id, interval in targets.items() if course_id in existing}
+    rejected = {
+        course_id: {"id": course_id, "status": "not_found", "error": "课程不存在"}
+        for course_id in targets if course_id not in existing
+    }
+    while True:
+        schedule = [
+            {**row, "start": accepted[row["id"]][0], "end": accepted[row["id"]][1]} if row["id"] in accepted else row
+            for row in rows
+        ]
+        overlaps = {
+            course_id: found
+            for course_id, (start, end) in accepted.items()
+            if (found := _overlapping(start, end, schedule, domains[course_id], exclude_id=course_id))
+        }
+        if allow_conflicts:
+            return accepted, {**rejected, **{
+                course_id: {"id": course_id, "status": "moved", "conflicts": [_conflict_info(r) for r in found]}
+                for course_id, found in overlaps.items()
+            }}
+        # 两个移动只互相冲突时保留批次中靠前的一个：按批次顺序，只与未移动的课程或已保留的移动比较
+        kept = set()
+        conflicts = {}
+        for course_id in accepted:
+            blocking = [r for r in overlaps.get(course_id, []) if r["id"] not in accepted or r["id"] in kept]
+            if blocking:
+                conflicts[course_id] = blocking
+            else:
+                kept.add(course_id)
+        if not conflicts:
+            return accepted, rejected
+        for course_id, found in conflicts.items():
+            del accepted[course_id]
+            rejected[course_id] = {"id": course_id, "status": "conflict", "error": "与其他课程时间冲突",
+                                   "conflicts": [_conflict_info(r) for r in found]}
+
+
+def move_courses(moves: List[CourseMove], allow_conflicts: bool = False) -> List[dict]:
+    """
+    批量调整课程时间（日历拖拽/拉伸）
+    先锁住要移动的课程，再按它们的冲突域各做一次加锁范围读，新时间段两两之间以及与现有课程之间的冲突都在内存中判断，
+    在同一事务中写入，返回每一项的结果：
+        moved      已更新（allow_conflicts=True 时 conflicts 中列出重叠课程）
+        conflict   与其他课程冲突，未更新
+        not_found  课程不存在
+        invalid    时间段不合法
+    被拒绝的课程保持原时间，其他课程也会与它的原时间段比较
+    """
+    results: Dict[str, dict] = {}
+    targets: Dict[str, tuple] = {}
+    for move in moves:
+        start, end = _wall_clock(move.start), _wall_clock(move.end)
+        error = _validate_interval(start, end)
+        if error:
+            results[move.id] = {"id": move.id, "status": "invalid", "error": error}
+        else:
+            targets[move.id] = (start, end)
+
+    def attempt() -> Dict[str, dict]:
+        with get_db_cursor() as cursor:
+            moved = _select_courses_by_ids(cursor, list(targets), lock=True)
+            windows = _windows(
+                (_row_domains(row), *targets[course_id]) for course_id, row in moved.items()
+            )
+            rows = {row["id"]: row for row in _schedule_window(cursor, windows, lock=True)}
+            accepted, outcome = _plan_moves(list({**rows, **moved}.values()), targets, allow_conflicts)
+            if accepted:
+                cursor.executemany(
+                    "UPDATE courses SET start = %s, end = %s WHERE id = %s",
+                    [(start, end, course_id) for course_id, (start, end) in accepted.items()],
+                )
+            for course_id, row in _select_courses_by_ids(cursor, list(accepted)).items():
+                outcome[course_id] = {"conflicts": [], **outcome.get(course_id, {}),
+                                      "id": course_id, "status": "moved", "course": Course(**row)}
+            return outcome
+
+    if targets:
+        results.update(_retry_on_deadlock(attempt))
+    return [results[m.id] for m in moves]
 
 
 def _parse_date_range(date_range: Optional[str]) -> Optional[tuple[str, str]]:
@@ -386,6 +895,7 @@ def query_courses_filtered(
     date_range: Optional[str] = None,
     weekday: Optional[str] = None,
     limit: Optional[int] = None,
+    offset: Optional[int] = None,
 ) -> List[Course]:
     where_clause, params = _build_course_where_clause(
         title_pattern=title_pattern,
@@ -403,11 +913,14 @@ def query_courses_filtered(
         FROM courses c
         LEFT JOIN students s ON c.student_id = s.id
         WHERE {where_clause}
-        ORDER BY c.start
+        ORDER BY c.start, c.id
     """
     if limit is not None:
         sql += " LIMIT %s"
         params.append(int(limit))
+        if offset:
+            sql += " OFFSET %s"
+            params.append(int(offset))
 
     with get_db_cursor() as cursor:
         cursor.execute(sql, params)
@@ -442,6 +955,202 @@ def count_courses_filtered(
         return int(row["cnt"]) if row and row.get("cnt") is not None else 0
 
 
+def summarize_courses_filtered(
+    title_pattern: str = "",
+    student_name: str = "",
+    date_range: Optional[str] = None,
+    weekday: Optional[str] = None,
+) -> dict:
+    """按条件统计课程数与总收入（分页查询时用于给出全量汇总）"""
+    where_clause, params = _build_course_where_clause(
+        title_pattern=title_pattern,
+        student_name=student_name,
+        date_range=date_range,
+        weekday=weekday,
+        course_alias="c",
+        student_alias="s",
+    )
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) as cnt, COALESCE(SUM(c.price), 0) as income
+            FROM courses c
+            LEFT JOIN students s ON c.student_id = s.id
+            WHERE {where_clause}
+            """,
+            params,
+        )
+        row = cursor.fetchone() or {}
+        return {"count": int(row.get("cnt") or 0), "income": float(row.get("income") or 0)}
+
+
+def _build_student_where_clause(name_pattern: str = "", grade: str = "", alias: str = "") -> tuple[str, list]:
+    prefix = f"{alias}." if alias else ""
+    clauses = ["1=1"]
+    params: list = []
+    if name_pattern:
+        clauses.append(f"{prefix}name LIKE %s")
+        params.append(f"%{name_pattern}%")
+    if grade:
+        clauses.append(f"{prefix}grade = %s")
+        params.append(grade)
+    return " AND ".join(clauses), params
+
+
+def query_students_filtered(
+    name_pattern: str = "",
+    grade: str = "",
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+) -> List[Student]:
+    """按条件分页查询学生"""
+    where_clause, params = _build_student_where_clause(name_pattern, grade)
+    sql = f"SELECT * FROM students WHERE {where_clause} ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(int(limit))
+        if offset:
+            sql += " OFFSET %s"
+            params.append(int(offset))
+    with get_db_cursor() as cursor:
+        cursor.execute(sql, params)
+        return [Student(**row) for row in cursor.fetchall()]
+
+
+def count_students_filtered(name_pattern: str = "", grade: str = "") -> int:
+    where_clause, params = _build_student_where_clause(name_pattern, grade)
+    with get_db_cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) as cnt FROM students WHERE {where_clause}", params)
+        row = cursor.fetchone()
+        return int(row["cnt"]) if row and row.get("cnt") is not None else 0
+
+
+# 学生名册可排序字段 -> SQL 表达式；可能为 NULL 的字段无论升降序都排在最后
+ROSTER_SORT_FIELDS = {
+    "id": "s.id",
+    "name": "s.name",
+    "grade": "s.grade",
+    "progress": "s.progress",
+    "total_lessons": "total_lessons",
+    "upcoming_lessons": "upcoming_lessons",
+    "next_lesson": "next_lesson",
+    "last_lesson": "last_lesson",
+    "total_income": "total_income",
+    "month_income": "month_income",
+}
+_ROSTER_NULLABLE = ("s.grade", "next_lesson", "last_lesson")
+
+
+def get_student_roster(
+    sort: str = "name",
+    order: str = "asc",
+    limit: int = 50,
+    offset: int = 0,
+    name_pattern: str = "",
+    grade: str = "",
+) -> tuple[List[StudentRosterEntry], int]:
+    """
+    学生名册：每个学生附带总课时、待上课时、下次/上次上课时间、累计与本月收入
+    一条 GROUP BY 查询完成（走 idx_courses_student_start_price 覆盖索引），
+    COUNT(*) OVER() 同时给出分页前的总数
+    返回 (当前页, 总数)
+    """
+    if sort not in ROSTER_SORT_FIELDS:
+        raise ValueError(f"不支持的排序字段: {sort}，可选: {', '.join(ROSTER_SORT_FIELDS)}")
+    if order.lower() not in ("asc", "desc"):
+        raise ValueError("排序方向只能是 asc 或 desc")
+
+    sort_expr = ROSTER_SORT_FIELDS[sort]
+    direction = order.upper()
+    order_by = f"{sort_expr} {direction}, s.id"
+    if sort_expr in _ROSTER_NULLABLE:
+        order_by = f"{sort_expr} IS NULL, {order_by}"
+
+    now = datetime.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (month_start.replace(year=month_start.year + 1, month=1) if month_start.month == 12
+                  else month_start.replace(month=month_start.month + 1))
+
+    where_clause, student_params = _build_student_where_clause(name_pattern, grade, alias="s")
+    params = [now, now, now, month_start, next_month, *student_params, int(limit), int(offset)]
+    with get_db_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT s.*,
+                   COUNT(c.id) as total_lessons,
+                   COALESCE(SUM(c.start >= %s), 0) as upcoming_lessons,
+                   MIN(CASE WHEN c.start >= %s THEN c.start END) as next_lesson,
+                   MAX(CASE WHEN c.start < %s THEN c.start END) as last_lesson,
+                   COALESCE(SUM(c.price), 0) as total_income,
+                   COALESCE(SUM(CASE WHEN c.start >= %s AND c.start < %s THEN c.price END), 0) as month_income,
+                   COUNT(*) OVER() as total_count
+            FROM students s
+            LEFT JOIN courses c ON c.student_id = s.id
+            WHERE {where_clause}
+            GROUP BY s.id
+            ORDER BY {order_by}
+            LIMIT %s OFFSET %s
+        """, params)
+        rows = cursor.fetchall()
+
+    if rows:
+        total = int(rows[0]["total_count"])
+    else:
+        # 翻页越界时窗口函数没有行可返回
+        total = count_students_filtered(name_pattern, grade)
+    return [StudentRosterEntry(**row) for row in rows], total
+
+
+def _apply_in_chunks(
+    where_clause: str,
+    params: list,
+    chunk_size: int,
+    apply: Callable,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> tuple[int, int]:
+    """
+    按课程 id 顺序分块处理匹配的课程，每块一个事务：apply(cursor, placeholders, ids) 返回影响行数
+    按 id 翻页（而非 OFFSET），处理后仍匹配条件的课程不会被重复处理
+    返回 (匹配数, 影响行数)
+    """
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) as cnt
+            FROM courses c
+            LEFT JOIN students s ON c.student_id = s.id
+            WHERE {where_clause}
+            """,
+            params,
+        )
+        total = int(cursor.fetchone()["cnt"])
+
+    done = 0
+    affected = 0
+    last_id = ""
+    while done < total:
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT c.id
+                FROM courses c
+                LEFT JOIN students s ON c.student_id = s.id
+                WHERE {where_clause} AND c.id > %s
+                ORDER BY c.id
+                LIMIT %s
+                """,
+                params + [last_id, int(chunk_size)],
+            )
+            ids = [row["id"] for row in cursor.fetchall()]
+            if not ids:
+                break
+            affected += int(apply(cursor, ", ".join(["%s"] * len(ids)), ids))
+        last_id = ids[-1]
+        done += len(ids)
+        if on_progress is not None:
+            on_progress(min(done, total), total)
+    return total, affected
+
+
 def bulk_update_courses_filtered(
     title_pattern: str = "",
     student_name: str = "",
@@ -450,7 +1159,13 @@ def bulk_update_courses_filtered(
     new_time: Optional[str] = None,
     new_price: Optional[float] = None,
     new_location: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
 ) -> dict:
+    """
+    批量修改课程；默认单个事务完成
+    指定 chunk_size 时按块提交（后台任务使用），每块完成后调用 on_progress(已处理, 总数)
+    """
     where_clause, params = _build_course_where_clause(
         title_pattern=title_pattern,
         student_name=student_name,
@@ -470,8 +1185,12 @@ def bulk_update_courses_filtered(
                 start_str = f"{start_str}:00"
             if len(end_str.split(":")) == 2:
                 end_str = f"{end_str}:00"
+            new_start, new_end = (datetime.fromisoformat(f"2000-01-01T{t}") for t in (start_str, end_str))
         except Exception as e:
             raise ValueError("new_time 格式错误，请使用: HH:MM,HH:MM") from e
+        error = _validate_interval(new_start, new_end)
+        if error:
+            raise ValueError(error)
 
         set_clauses.append("c.start = TIMESTAMP(DATE(c.start), %s)")
         set_params.append(start_str)
@@ -489,6 +1208,17 @@ def bulk_update_courses_filtered(
     if not set_clauses:
         return {"matched": 0, "updated": 0}
 
+    if chunk_size:
+        def apply(cursor, placeholders, ids):
+            cursor.execute(
+                f"UPDATE courses c SET {', '.join(set_clauses)} WHERE c.id IN ({placeholders})",
+                set_params + ids,
+            )
+            return cursor.rowcount
+
+        matched, updated = _apply_in_chunks(where_clause, params, chunk_size, apply, on_progress)
+        return {"matched": matched, "updated": updated}
+
     with get_db_cursor() as cursor:
         cursor.execute(
             f"""
@@ -520,7 +1250,10 @@ def bulk_delete_courses_filtered(
     student_name: str = "",
     date_range: Optional[str] = None,
     weekday: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
 ) -> dict:
+    """批量删除课程；chunk_size / on_progress 同 bulk_update_courses_filtered"""
     where_clause, params = _build_course_where_clause(
         title_pattern=title_pattern,
         student_name=student_name,
@@ -530,6 +1263,14 @@ def bulk_delete_courses_filtered(
         student_alias="s",
     )
 
+    if chunk_size:
+        def apply(cursor, placeholders, ids):
+            cursor.execute(f"DELETE FROM courses WHERE id IN ({placeholders})", ids)
+            return cursor.rowcount
+
+        matched, deleted = _apply_in_chunks(where_clause, params, chunk_size, apply, on_progress)
+        return {"matched": matched, "deleted": deleted}
+
     with get_db_cursor() as cursor:
         cursor.execute(
             f"""
@@ -556,20 +1297,8 @@ def bulk_delete_courses_filtered(
         return {"matched": matched, "deleted": int(cursor.rowcount)}
 
 
-def bulk_create_recurring_courses(
-    title: str,
-    student_name: str,
-    start_date: str,
-    end_date: str,
-    weekdays: str,
-    start_time: str,
-    end_time: str,
-    price: float,
-    grade: str = "",
-    description: str = "",
-    location: Optional[str] = None,
-    color: str = "#F5A3C8",
-) -> dict:
+def _plan_recurring_dates(start_date: str, end_date: str, weekdays: str, start_time: str, end_time: str):
+    """解析周期性课程参数，返回 (上课日期列表, 开始时间, 结束时间)"""
     try:
         start = datetime.fromisoformat(start_date).date()
         end = datetime.fromisoformat(end_date).date()
@@ -587,6 +1316,9 @@ def bulk_create_recurring_courses(
     time_end = parse_hhmm(end_time)
     if datetime.combine(datetime.today().date(), time_end) <= datetime.combine(datetime.today().date(), time_start):
         raise ValueError("结束时间必须晚于开始时间")
+    error = _validate_interval(datetime.combine(date.min, time_start), datetime.combine(date.min, time_end))
+    if error:
+        raise ValueError(error)
 
     weekday_map = {
         "周一": 0,
@@ -631,104 +1363,359 @@ def bulk_create_recurring_courses(
             course_dates.append(cur)
         cur = cur.fromordinal(cur.toordinal() + 1)
 
-    if not course_dates:
-        return {"auto_created": False, "created": 0, "conflicts": [], "months": {}, "expected_income": 0.0}
+    return course_dates, time_start, time_end
+
+
+def count_recurring_course_dates(start_date: str, end_date: str, weekdays: str, start_time: str, end_time: str) -> int:
+    """周期性课程将生成的节数（不查库），用于判断是否转为后台任务"""
+    return len(_plan_recurring_dates(start_date, end_date, weekdays, start_time, end_time)[0])
 
+
+def _resolve_recurring_student(cursor, student_name: str, grade: str) -> tuple:
+    """按姓名查找学生，不存在则自动创建；返回 (student_id, 年级, 是否新建)"""
+    cursor.execute("SELECT id, grade FROM students WHERE name = %s", (student_name,))
+    student_row = cursor.fetchone()
+    if student_row:
+        return student_row["id"], student_row.get("grade"), False
+    cursor.execute(
+        """
+        INSERT INTO students (name, grade, phone, parent_contact, progress, notes)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        (student_name, grade if grade else None, None, None, 0, None),
+    )
+    return cursor.lastrowid, grade if grade else None, True
+
+
+def _insert_recurring_chunk(cursor, course_dates: list, time_start, time_end, student_id: int,
+                            title: str, price: float, color: str, description: str,
+                            location: Optional[str], teacher_id: Optional[int] = None,
+                            room_id: Optional[int] = None) -> tuple[list, list]:
+    """在一个事务内为一批日期检查冲突（学生/老师/教室各自的时间线）并插入课程，返回 (插入的行, 冲突日期)"""
     min_start_dt = datetime.combine(course_dates[0], time_start)
     max_end_dt = datetime.combine(course_dates[-1], time_end)
-
-    with get_db_cursor() as cursor:
-        cursor.execute("SELECT id, grade FROM students WHERE name = %s", (student_name,))
-        student_row = cursor.fetchone()
-        auto_created = False
-        if not student_row:
-            cursor.execute(
-                """
-                INSERT INTO students (name, grade, phone, parent_contact, progress, notes)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (student_name, grade if grade else None, None, None, 0, None),
+    domains = _course_domains(student_id, teacher_id, room_id)
+    existing = _schedule_window(cursor, {domain: (min_start_dt, max_end_dt) for domain in domains})
+
+    by_date: dict[str, list[tuple[datetime, datetime]]] = {}
+    for row in existing:
+        s = row["start"]
+        e = row["end"]
+        if not s or not e:
+            continue
+        # 跨过午夜的课程也要和后一天的日期比较
+        day = s.date()
+        while day <= e.date():
+            by_date.setdefault(day.isoformat(), []).append((s, e))
+            day += timedelta(days=1)
+
+    to_insert = []
+    conflicts = []
+    for d in course_dates:
+        course_start = datetime.combine(d, time_start)
+        course_end = datetime.combine(d, time_end)
+        conflict_intervals = by_date.get(d.isoformat(), [])
+        has_conflict = False
+        for s, e in conflict_intervals:
+            if course_start < e and course_end > s:
+                has_conflict = True
+                break
+        if has_conflict:
+            conflicts.append(d.isoformat())
+            continue
+
+        cid = str(uuid.uuid4())
+        to_insert.append(
+            (
+                cid,
+                title,
+                course_start,
+                course_end,
+                student_id,
+                float(price),
+                color if color else "#F5A3C8",
+                description,
+                location,
+                teacher_id,
+                room_id,
             )
-            student_id = cursor.lastrowid
-            student_grade = grade if grade else None
-            auto_created = True
-        else:
-            student_id = student_row["id"]
-            student_grade = student_row.get("grade")
+        )
 
-        cursor.execute(
+    if to_insert:
+        cursor.executemany(
             """
-            SELECT start, end
-            FROM courses
-            WHERE start < %s AND end > %s
+            INSERT INTO courses (id, title, start, end, student_id, price, color, description, location,
+                                 teacher_id, room_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
-            (max_end_dt, min_start_dt),
+            to_insert,
         )
-        existing = cursor.fetchall() or []
-
-        by_date: dict[str, list[tuple[datetime, datetime]]] = {}
-        for row in existing:
-            s = row["start"]
-            e = row["end"]
-            if not s or not e:
-                continue
-            key = s.date().isoformat()
-            by_date.setdefault(key, []).append((s, e))
-
-        to_insert = []
-        conflicts = []
-        for d in course_dates:
-            course_start = datetime.combine(d, time_start)
-            course_end = datetime.combine(d, time_end)
-            conflict_intervals = by_date.get(d.isoformat(), [])
-            has_conflict = False
-            for s, e in conflict_intervals:
-                if course_start < e and course_end > s:
-                    has_conflict = True
-                    break
-            if has_conflict:
-                conflicts.append(d.isoformat())
-                continue
-
-            cid = str(uuid.uuid4())
-            to_insert.append(
-                (
-                    cid,
-                    title,
-                    course_start,
-                    course_end,
-                    student_id,
-                    float(price),
-                    color if color else "#F5A3C8",
-                    description,
-                    location,
-                )
-            )
+    return to_insert, conflicts
 
-        if to_insert:
-            cursor.executemany(
-                """
-                INSERT INTO courses (id, title, start, end, student_id, price, color, description, location)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                to_insert,
+
+def bulk_create_recurring_courses(
+    title: str,
+    student_name: str,
+    start_date: str,
+    end_date: str,
+    weekdays: str,
+    start_time: str,
+    end_time: str,
+    price: float,
+    grade: str = "",
+    description: str = "",
+    location: Optional[str] = None,
+    color: str = "#F5A3C8",
+    teacher: str = "",
+    room: str = "",
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    批量创建周期性课程；默认单个事务完成
+    teacher / room 为老师、教室名称（须已存在），冲突只在学生、老师、教室各自的时间线上判断
+    指定 chunk_size 时学生档案先提交，课程按 chunk_size 个日期一块分别提交（后台任务使用），
+    每块完成后调用 on_progress(已处理日期数, 总日期数)
+    """
+    course_dates, time_start, time_end = _plan_recurring_dates(start_date, end_date, weekdays, start_time, end_time)
+
+    if not course_dates:
+        return {"auto_created": False, "created": 0, "conflicts": [], "months": {}, "expected_income": 0.0}
+
+    teacher_id = resolve_resource_id("teacher", teacher)
+    room_id = resolve_resource_id("room", room)
+    course_fields = (title, price, color, description, location, teacher_id, room_id)
+    with get_db_cursor() as cursor:
+        student_id, student_grade, auto_created = _resolve_recurring_student(cursor, student_name, grade)
+        if not chunk_size:
+            to_insert, conflicts = _insert_recurring_chunk(
+                cursor, course_dates, time_start, time_end, student_id, *course_fields
             )
 
-        months: dict[str, int] = {}
-        for row in to_insert:
-            month_key = row[2].strftime("%Y-%m")
-            months[month_key] = months.get(month_key, 0) + 1
+    if chunk_size:
+        to_insert, conflicts = [], []
+        for i in range(0, len(course_dates), chunk_size):
+            chunk = course_dates[i:i + chunk_size]
+            with get_db_cursor() as cursor:
+                rows, skipped = _insert_recurring_chunk(
+                    cursor, chunk, time_start, time_end, student_id, *course_fields
+                )
+            to_insert.extend(rows)
+            conflicts.extend(skipped)
+            if on_progress is not None:
+                on_progress(i + len(chunk), len(course_dates))
+
+    months: dict[str, int] = {}
+    for row in to_insert:
+        month_key = row[2].strftime("%Y-%m")
+        months[month_key] = months.get(month_key, 0) + 1
+
+    expected_income = sum(row[5] for row in to_insert)
+
+    return {
+        "auto_created": auto_created,
+        "student_grade": student_grade,
+        "created": len(to_insert),
+        "conflicts": conflicts,
+        "months": months,
+        "expected_income": expected_income,
+    }
 
-        expected_income = sum(row[5] for row in to_insert)
 
-        return {
-            "auto_created": auto_created,
-            "student_grade": student_grade,
-            "created": len(to_insert),
-            "conflicts": conflicts,
-            "months": months,
-            "expected_income": expected_income,
-        }
+# ==================== 日历视图 ====================
+
+# 月视图汇总最多覆盖的天数（6 周的月视图为 42 天）
+CALENDAR_SUMMARY_MAX_DAYS = 366
+# GROUP_CONCAT 的分隔符：课程标题中不会出现的控制字符
+_TITLE_SEP = "\x1f"
+
+
+def _parse_calendar_bound(value: str) -> datetime:
+    """FullCalendar 传入的 start/end（可能带时区偏移）-> 与写入相同的墙上时间（见 _wall_clock）"""
+    try:
+        return _wall_clock(datetime.fromisoformat(value.strip().replace("Z", "+00:00")))
+    except Exception as e:
+        raise ValueError("时间格式错误，请使用 ISO 格式，例如 2026-02-01 或 2026-02-01T00:00:00") from e
+
+
+def get_courses_in_range(start: str, end: str) -> List[Course]:
+    """获取 [start, end) 内开始的课程（日/周视图按可见范围加载，走 idx_courses_start）"""
+    range_start, range_end = _parse_calendar_bound(start), _parse_calendar_bound(end)
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            SELECT c.*,
+                   s.name as student_name,
+                   s.grade as student_grade
+            FROM courses c
+            LEFT JOIN students s ON c.student_id = s.id
+            WHERE c.start >= %s AND c.start < %s
+            ORDER BY c.start
+        """, (range_start, range_end))
+        return [Course(**row) for row in cursor.fetchall()]
+
+
+def get_calendar_summary(start: str, end: str, titles_per_day: int = 3) -> Dict:
+    """
+    按天汇总 [start, end) 内的课程：课程数、上课分钟数、收入、当天最早的几节课标题
+    一条 GROUP BY 查询完成（按 start 范围走 idx_courses_start），月视图只加载汇总，
+    点开某天时再按范围加载当天的完整课程
+    """
+    start_day = _parse_calendar_bound(start).date()
+    end_day = _parse_calendar_bound(end).date()
+    if end_day <= start_day:
+        raise ValueError("结束日期必须晚于开始日期")
+    if (end_day - start_day).days > CALENDAR_SUMMARY_MAX_DAYS:
+        raise ValueError(f"日期范围不能超过 {CALENDAR_SUMMARY_MAX_DAYS} 天")
+
+    with get_db_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT DATE(c.start) as day,
+                   COUNT(*) as course_count,
+                   COALESCE(SUM(TIMESTAMPDIFF(MINUTE, c.start, c.end)), 0) as busy_minutes,
+                   COALESCE(SUM(c.price), 0) as income,
+                   GROUP_CONCAT(c.title ORDER BY c.start SEPARATOR '{_TITLE_SEP}') as titles
+            FROM courses c
+            WHERE c.start >= %s AND c.start < %s
+            GROUP BY DATE(c.start)
+            ORDER BY day
+        """, (start_day, end_day))
+        rows = cursor.fetchall()
+
+    days = []
+    for row in rows:
+        day = row["day"]
+        titles = (row.get("titles") or "").split(_TITLE_SEP) if row.get("titles") else []
+        days.append({
+            "date": day.isoformat() if isinstance(day, date) else str(day),
+            "count": int(row["course_count"]),
+            "busy_minutes": int(row["busy_minutes"] or 0),
+            "income": float(row["income"] or 0),
+            "titles": titles[:max(0, titles_per_day)],
+        })
+    return {
+        "start": start_day.isoformat(),
+        "end": end_day.isoformat(),
+        "days": days,
+        "total": {
+            "count": sum(d["count"] for d in days),
+            "busy_minutes": sum(d["busy_minutes"] for d in days),
+            "income": sum(d["income"] for d in days),
+        },
+    }
+
+
+# ==================== 排课优化 ====================
+
+# 未提供老师工作时间时的默认值：每天 08:00 - 22:00（与 find_common_available_time_tool 一致）
+DEFAULT_WORKING_HOURS = (8 * 60, 22 * 60)
+
+
+def _minutes(value) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _timetable_windows(windows) -> List[timetable.Window]:
+    result = []
+    for w in windows:
+        start, end = _minutes(w.start), _minutes(w.end)
+        # 结束时间 00:00 表示到当天结束
+        end = end or timetable.MINUTES_PER_DAY
+        if end <= start:
+            raise ValueError(f"时间段 {w.start:%H:%M}-{w.end:%H:%M} 的结束时间必须晚于开始时间")
+        result.append(timetable.Window(w.weekday, start, end, w.preference))
+    return result
+
+
+def _busy_intervals(courses: List[dict], week_start: datetime) -> List[tuple]:
+    """已有课程 -> 参考周内的 (星期, 开始分钟, 结束分钟)，跨午夜的课程拆成两段"""
+    week_end = week_start + timedelta(days=7)
+    intervals = []
+    for c in courses:
+        start, end = max(c["start"], week_start), min(c["end"], week_end)
+        while start < end:
+            day_end = datetime.combine(start.date(), datetime.min.time()) + timedelta(days=1)
+            piece_end = min(end, day_end)
+            offset = (start - week_start).days
+            end_minute = timetable.MINUTES_PER_DAY if piece_end == day_end else _minutes(piece_end)
+            intervals.append((offset, _minutes(start), end_minute))
+            start = piece_end
+    return intervals
+
+
+def plan_weekly_timetable(plan: TimetablePlan) -> TimetableResult:
+    """
+    为一组学生求一张无冲突的周课表：每人每周 lessons_per_week 节、每天至多一节，
+    只排在学生可上课时段与老师工作时间内，并避开参考周内该老师其他学生的已有课程、
+    以及计划中学生跟其他老师的课程（计划中学生跟该老师的已有课程视为要重新安排，不占用时间）。
+    在时间限制内尽量排入更多课程，其次使偏好分之和最大，结果只是方案，不写入课程
+    """
+    student_ids = [s.student_id for s in plan.students]
+    if len(set(student_ids)) != len(student_ids):
+        raise ValueError("同一学生只能出现一次，每周多节请设置 lessons_per_week")
+
+    today = date.today()
+    week_start = plan.week_start or today + timedelta(days=7 - today.weekday())
+    if week_start.weekday() != 0:
+        raise ValueError("week_start 必须是周一")
+    week_begin = datetime.combine(week_start, datetime.min.time())
+
+    with get_db_cursor() as cursor:
+        placeholders = ", ".join(["%s"] * len(student_ids))
+        cursor.execute(f"SELECT id, name FROM students WHERE id IN ({placeholders})", student_ids)
+        names = {row["id"]: row["name"] for row in cursor.fetchall()}
+        missing = [sid for sid in student_ids if sid not in names]
+        if missing:
+            raise ValueError(f"Student with id {missing[0]} not found")
+        week = (week_begin, week_begin + timedelta(days=7))
+        domains = [("teacher_id", plan.teacher_id)] + [("student_id", sid) for sid in student_ids]
+        rows = _schedule_window(cursor, {domain: week for domain in domains})
+
+    planned = set(student_ids)
+    rows = [r for r in rows if r["end"] > week_begin]
+    others = [r for r in rows if r.get("student_id") not in planned]
+    elsewhere: Dict[int, List[dict]] = {sid: [] for sid in student_ids}
+    for r in rows:
+        if r.get("student_id") in planned and r.get("teacher_id") != plan.teacher_id:
+            elsewhere[r["student_id"]].append(r)
+    if plan.working_hours:
+        hours = _timetable_windows(plan.working_hours)
+    else:
+        hours = [timetable.Window(d, *DEFAULT_WORKING_HOURS) for d in range(7)]
+    requests = [
+        timetable.LessonRequest(s.student_id, s.lessons_per_week, s.duration_minutes, _timetable_windows(s.availability),
+                                busy=_busy_intervals(elsewhere[s.student_id], week_begin))
+        for s in plan.students
+    ]
+
+    solution = timetable.solve(
+        requests,
+        hours,
+        busy=_busy_intervals(others, week_begin),
+        slot_minutes=plan.slot_minutes,
+        time_limit_s=plan.time_limit_s or settings.TIMETABLE_TIME_LIMIT_S,
+    )
+
+    def clock(minutes: int):
+        # 与 AvailabilityWindow 相同，结束时间 00:00 表示到当天结束（24:00）
+        return (week_begin + timedelta(minutes=minutes % timetable.MINUTES_PER_DAY)).time()
+
+    return TimetableResult(
+        week_start=week_start,
+        slots=[
+            TimetableSlot(student_id=p.key, student_name=names[p.key], weekday=p.weekday,
+                          start=clock(p.start), end=clock(p.end), preference=p.preference)
+            for p in solution.placements
+        ],
+        unplaced=[
+            TimetableUnplaced(student_id=sid, student_name=names[sid], missing=count)
+            for sid, count in solution.unplaced.items()
+        ],
+        score=solution.score,
+        best_possible=solution.best_possible,
+        optimal=solution.optimal,
+        iterations=solution.iterations,
+        elapsed_ms=round(solution.elapsed_s * 1000, 1),
+    )
 
 
 # ==================== 财务统计 ====================
@@ -763,3 +1750,104 @@ def get_financial_report() -> Dict:
             "avg_price": float(stats['avg_price']),
             "by_student": by_student
         }
+
+
+# ==================== 数据导出 ====================
+# 导出走服务端游标（SSDictCursor）逐批读取，内存占用与导出行数无关；SQL 与参数在返回前就构建好，
+# 过滤条件有误时立即抛出 ValueError，而不是在响应已开始发送后才失败
+
+EXPORT_COURSE_COLUMNS = ("id", "title", "start", "end", "student_id", "student_name", "teacher_id", "room_id",
+                         "price", "location", "description", "color")
+EXPORT_STUDENT_COLUMNS = ("id", "name", "grade", "phone", "parent_contact", "progress", "notes")
+EXPORT_FINANCE_COLUMNS = ("period", "lessons", "students", "hours", "income")
+# 周按 ISO 周（2026-W05）
+_FINANCE_PERIODS = {"day": "%%Y-%%m-%%d", "week": "%%x-W%%v", "month": "%%Y-%%m", "year": "%%Y"}
+
+
+def _iter_batches(sql: str, params: list, batch_size: int) -> Iterator[List[dict]]:
+    """
+    逐批产出查询结果；连接在第一次迭代时才获取，读完后归还连接池
+    服务端游标读完之前连接不能执行其他语句；中途放弃（客户端断开）时直接关闭连接，不把剩余行读完
+    """
+    conn = _acquire_conn()
+    finished = False
+    cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        # 不经过 _TrackedCursor：结果未读完时不能在同一连接上执行 EXPLAIN
+        t0 = time.perf_counter()
+        cursor.execute(sql, params)
+        _notify_observers(sql, time.perf_counter() - t0, -1)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        cursor.close()
+        conn.rollback()
+        finished = True
+    finally:
+        _release_conn(conn, healthy=finished)
+
+
+def export_courses(
+    title_pattern: str = "",
+    student_name: str = "",
+    date_range: Optional[str] = None,
+    weekday: Optional[str] = None,
+    batch_size: int = 1000,
+) -> tuple:
+    """按 query_courses_filtered 的过滤条件导出课程，按开始时间排序；返回 (列名, 批次迭代器)"""
+    where_clause, params = _build_course_where_clause(
+        title_pattern=title_pattern,
+        student_name=student_name,
+        date_range=date_range,
+        weekday=weekday,
+    )
+    sql = f"""
+        SELECT c.id, c.title, c.start, c.end, c.student_id, s.name as student_name,
+               c.teacher_id, c.room_id, c.price, c.location, c.description, c.color
+        FROM courses c
+        LEFT JOIN students s ON c.student_id = s.id
+        WHERE {where_clause}
+        ORDER BY c.start, c.id
+    """
+    return EXPORT_COURSE_COLUMNS, _iter_batches(sql, params, batch_size)
+
+
+def export_students(name_pattern: str = "", grade: str = "", batch_size: int = 1000) -> tuple:
+    """导出学生档案；返回 (列名, 批次迭代器)"""
+    where_clause, params = _build_student_where_clause(name_pattern, grade)
+    sql = f"SELECT {', '.join(EXPORT_STUDENT_COLUMNS)} FROM students WHERE {where_clause} ORDER BY id"
+    return EXPORT_STUDENT_COLUMNS, _iter_batches(sql, params, batch_size)
+
+
+def export_finances(
+    period: str = "month",
+    title_pattern: str = "",
+    student_name: str = "",
+    date_range: Optional[str] = None,
+    weekday: Optional[str] = None,
+    batch_size: int = 1000,
+) -> tuple:
+    """按日/周/月/年汇总课时与收入（过滤条件同课程导出）；返回 (列名, 批次迭代器)"""
+    if period not in _FINANCE_PERIODS:
+        raise ValueError(f"period 须为 {'/'.join(_FINANCE_PERIODS)}")
+    where_clause, params = _build_course_where_clause(
+        title_pattern=title_pattern,
+        student_name=student_name,
+        date_range=date_range,
+        weekday=weekday,
+    )
+    sql = f"""
+        SELECT DATE_FORMAT(c.start, '{_FINANCE_PERIODS[period]}') as period,
+               COUNT(*) as lessons,
+               COUNT(DISTINCT c.student_id) as students,
+               ROUND(SUM(TIMESTAMPDIFF(MINUTE, c.start, c.end)) / 60, 2) as hours,
+               COALESCE(SUM(c.price), 0) as income
+        FROM courses c
+        LEFT JOIN students s ON c.student_id = s.id
+        WHERE {where_clause}
+        GROUP BY period
+        ORDER BY period
+    """
+    return EXPORT_FINANCE_COLUMNS, _iter_batches(sql, params, batch_size)
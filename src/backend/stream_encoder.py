@@ -0,0 +1,136 @@
+"""
+NDJSON encoder for the chat stream.
+
+Model deltas arrive a few characters at a time. Instead of one line (and one
+socket write, and one JSON.parse + markdown render in the browser) per
+delta, consecutive "token" / "thinking" deltas are merged into one frame
+that is flushed when it is STREAM_FLUSH_MS old or STREAM_FLUSH_CHARS long,
+when the delta type changes, or before any other event. The wire format is
+unchanged: every line is still {"type": ..., "content": ...}.
+"""
+import asyncio
+import json
+import time
+from typing import AsyncIterator, List, Optional
+
+from .config import settings
+
+# One shared encoder: json.dumps(..., ensure_ascii=False) builds a new JSONEncoder per call
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+COALESCED_TYPES = ("token", "thinking")
+
+
+def encode_line(payload: dict) -> str:
+    return _ENCODER.encode(payload) + "\n"
+
+
+class StreamEncoder:
+    def __init__(self, flush_ms: Optional[float] = None, flush_chars: Optional[int] = None, clock=time.monotonic):
+        self.flush_s = (settings.STREAM_FLUSH_MS if flush_ms is None else flush_ms) / 1000.0
+        self.flush_chars = settings.STREAM_FLUSH_CHARS if flush_chars is None else flush_chars
+        self._clock = clock
+        self._kind: Optional[str] = None
+        self._parts: List[str] = []
+        self._size = 0
+        self._started = 0.0
+
+    @property
+    def coalescing(self) -> bool:
+        return self.flush_s > 0 and self.flush_chars > 0
+
+    def delta(self, kind: str, content: str) -> str:
+        """Buffers a token/thinking delta; returns the encoded frames that are due (possibly "")."""
+        if not content:
+            return ""
+        if not self.coalescing:
+            return encode_line({"type": kind, "content": content})
+
+        out = ""
+        if self._kind is not None and self._kind != kind:
+            out = self.flush()
+        if self._kind is None:
+            self._kind = kind
+            self._started = self._clock()
+        self._parts.append(content)
+        self._size += len(content)
+        if self._size >= self.flush_chars or self._clock() - self._started >= self.flush_s:
+            out += self.flush()
+        return out
+
+    def event(self, payload: dict) -> str:
+        """Encodes a non-delta event, flushing buffered text first so ordering is preserved."""
+        return self.flush() + encode_line(payload)
+
+    def flush(self) -> str:
+        if self._kind is None:
+            return ""
+        line = encode_line({"type": self._kind, "content": "".join(self._parts)})
+        self._kind = None
+        self._parts = []
+        self._size = 0
+        return line
+
+    def time_to_deadline(self) -> Optional[float]:
+        """Seconds until buffered text must go out, or None when nothing is buffered."""
+        if self._kind is None:
+            return None
+        return max(0.0, self._started + self.flush_s - self._clock())
+
+
+_END = object()
+_TICK = object()
+
+
+async def with_flush_ticks(source: AsyncIterator, encoder: StreamEncoder) -> AsyncIterator:
+    """
+    Re-yields items from `source`, plus None whenever the encoder's flush
+    deadline passes, so a slow model never leaves text sitting in the buffer.
+
+    The source is drained by one pump task into a small queue; deadlines are
+    armed with loop.call_later, which is much cheaper than a wait_for task
+    per event.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+    timer: Optional[asyncio.TimerHandle] = None
+
+    async def pump():
+        try:
+            async for item in source:
+                await queue.put(item)
+            await queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # re-raised in the consumer
+            await queue.put(e)
+
+    def tick():
+        nonlocal timer
+        timer = None
+        # A full queue means the consumer is busy and re-checks the deadline after each item
+        if not queue.full():
+            queue.put_nowait(_TICK)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            if item is not _TICK:
+                yield item
+
+            deadline = encoder.time_to_deadline()
+            if deadline is None:
+                continue
+            if deadline <= 0:
+                yield None
+            elif timer is None:
+                timer = loop.call_later(deadline, tick)
+    finally:
+        if timer is not None:
+            timer.cancel()
+        task.cancel()
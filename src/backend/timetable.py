@@ -0,0 +1,308 @@
+"""
+Weekly timetable optimizer.
+
+Given each student's weekly availability windows, lessons per week and
+lesson length, the teacher's working hours and the time already taken by
+other lessons (shared, plus each student's own), finds a conflict-free weekly timetable that places as many
+lessons as possible and, among those, maximizes the summed preference
+(student window preference x working-hours preference).
+
+The week is cut into `slot_minutes` slots and every time set (a lesson,
+the occupied time) is a Python int bitset over those slots, so "does this
+lesson fit" is a single AND. A student has at most one lesson per day.
+
+Search is ruin-and-recreate local search under a time limit:
+
+- recreate: repeatedly place the unplaced lesson with the fewest feasible
+  starts (most constrained first) at its best start, with a little random
+  noise so repeated rebuilds explore different timetables;
+- ruin: unplace a few lessons around one lesson (preferably an unplaced
+  one), then recreate; keep the result unless it places fewer lessons or
+  scores lower.
+
+The search stops at the time limit or as soon as every lesson is placed at
+a best-scoring start (an upper bound computed per student).
+"""
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Sequence, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+SLOT_MINUTES = (5, 10, 15, 20, 30, 60)
+
+# Largest number of placed lessons unplaced by one ruin step
+_RUIN_MAX = 8
+# Jitter added to candidate scores while recreating, relative to the best preference
+_NOISE = 0.3
+
+
+@dataclass
+class Window:
+    weekday: int     # 0 = Monday
+    start: int       # minutes since 00:00
+    end: int
+    preference: float = 1.0
+
+
+@dataclass
+class LessonRequest:
+    key: Hashable    # e.g. the student id
+    lessons: int     # lessons per week
+    duration: int    # minutes
+    windows: List[Window]
+    # (weekday, start, end) taken for this request only, e.g. the student's lessons with another teacher
+    busy: List[Tuple[int, int, int]] = field(default_factory=list)
+
+
+@dataclass
+class Placement:
+    key: Hashable
+    weekday: int
+    start: int
+    end: int
+    preference: float
+
+
+@dataclass
+class Solution:
+    placements: List[Placement]
+    unplaced: Dict[Any, int]   # key -> lessons that could not be placed
+    score: float
+    best_possible: float       # every lesson at its best start, ignoring the other students
+    iterations: int
+    elapsed_s: float
+
+    @property
+    def optimal(self) -> bool:
+        return not self.unplaced and self.score >= self.best_possible - 1e-9
+
+
+@dataclass
+class _Candidate:
+    mask: int
+    weekday: int
+    start: int
+    preference: float
+
+
+@dataclass
+class _State:
+    assignment: List[int]            # unit -> candidate index, -1 = unplaced
+    occupied: int
+    days: List[int] = field(default_factory=list)   # request -> bitmask of weekdays used
+    placed: int = 0
+    score: float = 0.0
+
+    def copy(self) -> "_State":
+        return _State(list(self.assignment), self.occupied, list(self.days), self.placed, self.score)
+
+    def key(self) -> Tuple[int, float]:
+        return self.placed, round(self.score, 9)
+
+
+def _validate(window: Window):
+    if not 0 <= window.weekday <= 6:
+        raise ValueError(f"weekday must be 0-6, got {window.weekday}")
+    if not 0 <= window.start < window.end <= MINUTES_PER_DAY:
+        raise ValueError(f"invalid window {window.start}-{window.end} on weekday {window.weekday}")
+
+
+def _slot_mask(weekday: int, start: int, end: int, slot: int) -> int:
+    """Slots touched by [start, end) on weekday."""
+    first = (weekday * MINUTES_PER_DAY + start) // slot
+    last = (weekday * MINUTES_PER_DAY + end - 1) // slot
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def _busy_mask(busy: Sequence[Tuple[int, int, int]], slot: int) -> int:
+    mask = 0
+    for weekday, start, end in busy:
+        mask |= _slot_mask(weekday, start, end, slot)
+    return mask
+
+
+def _candidates(request: LessonRequest, hours: Sequence[Window], slot: int) -> List[_Candidate]:
+    best: Dict[Tuple[int, int], float] = {}
+    for w in request.windows:
+        for h in hours:
+            if h.weekday != w.weekday:
+                continue
+            lo, hi = max(w.start, h.start), min(w.end, h.end)
+            first = -(-lo // slot) * slot
+            for start in range(first, hi - request.duration + 1, slot):
+                preference = w.preference * h.preference
+                if preference > best.get((w.weekday, start), -1.0):
+                    best[(w.weekday, start)] = preference
+    candidates = [
+        _Candidate(_slot_mask(day, start, start + request.duration, slot), day, start, pref)
+        for (day, start), pref in best.items()
+    ]
+    candidates.sort(key=lambda c: (-c.preference, c.weekday, c.start))
+    return candidates
+
+
+def _upper_bound(request: LessonRequest, candidates: List[_Candidate]) -> float:
+    by_day: Dict[int, float] = {}
+    for c in candidates:
+        by_day[c.weekday] = max(by_day.get(c.weekday, 0.0), c.preference)
+    return sum(sorted(by_day.values(), reverse=True)[:request.lessons])
+
+
+class _Search:
+    def __init__(self, requests: Sequence[LessonRequest], hours: Sequence[Window], busy: int, slot: int, seed: int):
+        self.requests = requests
+        self.rng = random.Random(seed)
+        # Starts that overlap the occupied time (shared or the request's own) are dropped up front
+        self.candidates = [
+            [c for c in _candidates(r, hours, slot) if not c.mask & (busy | _busy_mask(r.busy, slot))]
+            for r in requests
+        ]
+        # One unit per lesson; units of the same request are interchangeable
+        self.units = [i for i, r in enumerate(requests) for _ in range(r.lessons)]
+        # Slots any start of a request could use: lessons placed there compete with it
+        self.reach = [0] * len(requests)
+        for i, cands in enumerate(self.candidates):
+            for c in cands:
+                self.reach[i] |= c.mask
+        top = max((c.preference for cands in self.candidates for c in cands), default=1.0)
+        self.noise = _NOISE * (top or 1.0)
+        self.busy = busy
+
+    def empty(self) -> _State:
+        return _State([-1] * len(self.units), self.busy, [0] * len(self.requests))
+
+    def _feasible(self, state: _State, unit: int) -> List[int]:
+        request = self.units[unit]
+        days, occupied = state.days[request], state.occupied
+        return [
+            i for i, c in enumerate(self.candidates[request])
+            if not c.mask & occupied and not days >> c.weekday & 1
+        ]
+
+    def _place(self, state: _State, unit: int, index: int):
+        request = self.units[unit]
+        c = self.candidates[request][index]
+        state.assignment[unit] = index
+        state.occupied |= c.mask
+        state.days[request] |= 1 << c.weekday
+        state.placed += 1
+        state.score += c.preference
+
+    def _unplace(self, state: _State, unit: int):
+        request = self.units[unit]
+        c = self.candidates[request][state.assignment[unit]]
+        state.assignment[unit] = -1
+        state.occupied &= ~c.mask
+        state.days[request] &= ~(1 << c.weekday)
+        state.placed -= 1
+        state.score -= c.preference
+
+    def recreate(self, state: _State, units: List[int], noisy: bool):
+        pending = list(units)
+        while pending:
+            # Most constrained unit first; ties are broken at random
+            options = [(len(f), self.rng.random(), u, f) for u in pending for f in (self._feasible(state, u),)]
+            _, _, unit, feasible = min(options)
+            pending.remove(unit)
+            if not feasible:
+                continue
+            cands = self.candidates[self.units[unit]]
+            if noisy:
+                index = max(feasible, key=lambda i: cands[i].preference + self.rng.random() * self.noise)
+            else:
+                index = feasible[0]   # candidates are sorted by preference
+            self._place(state, unit, index)
+
+    def ruin(self, state: _State) -> List[int]:
+        unplaced = [u for u, a in enumerate(state.assignment) if a < 0]
+        placed = [u for u, a in enumerate(state.assignment) if a >= 0]
+        if unplaced and (not placed or self.rng.random() < 0.7):
+            seed = self.rng.choice(unplaced)
+        else:
+            seed = self.rng.choice(placed)
+        reach = self.reach[self.units[seed]]
+        related = [
+            u for u in placed
+            if u != seed and self.candidates[self.units[u]][state.assignment[u]].mask & reach
+        ]
+        self.rng.shuffle(related)
+        removed = related[:self.rng.randint(1, _RUIN_MAX)]
+        if state.assignment[seed] >= 0:
+            removed.append(seed)
+        for u in removed:
+            self._unplace(state, u)
+        return removed + ([seed] if seed in unplaced else [])
+
+    def placements(self, state: _State) -> List[Placement]:
+        result = []
+        for unit, index in enumerate(state.assignment):
+            if index < 0:
+                continue
+            request = self.requests[self.units[unit]]
+            c = self.candidates[self.units[unit]][index]
+            result.append(Placement(request.key, c.weekday, c.start, c.start + request.duration, c.preference))
+        result.sort(key=lambda p: (p.weekday, p.start))
+        return result
+
+
+def solve(
+    requests: Sequence[LessonRequest],
+    working_hours: Sequence[Window],
+    busy: Sequence[Tuple[int, int, int]] = (),
+    slot_minutes: int = 15,
+    time_limit_s: float = 5.0,
+    seed: int = 0,
+) -> Solution:
+    """
+    Plans one week. busy holds (weekday, start, end) intervals, in minutes,
+    that are already taken; lessons never overlap them, their request's own
+    busy intervals or each other.
+    """
+    if slot_minutes not in SLOT_MINUTES:
+        raise ValueError(f"slot_minutes must be one of {SLOT_MINUTES}")
+    for w in working_hours:
+        _validate(w)
+    for r in requests:
+        if r.lessons < 1 or r.duration < 1:
+            raise ValueError(f"{r.key}: lessons and duration must be positive")
+        for w in r.windows:
+            _validate(w)
+
+    started = time.perf_counter()
+    busy_mask = _busy_mask(busy, slot_minutes)
+
+    search = _Search(requests, working_hours, busy_mask, slot_minutes, seed)
+    best_possible = sum(_upper_bound(r, c) for r, c in zip(requests, search.candidates))
+    # Lessons that fit at all: a student has at most one lesson per day
+    placeable = sum(min(r.lessons, len({c.weekday for c in cands})) for r, cands in zip(requests, search.candidates))
+
+    current = search.empty()
+    search.recreate(current, list(range(len(search.units))), noisy=False)
+    best = current.copy()
+    iterations = 0
+    deadline = started + time_limit_s
+    while best.placed and (best.placed < placeable or best.score < best_possible - 1e-9):
+        if time.perf_counter() >= deadline:
+            break
+        iterations += 1
+        candidate = current.copy()
+        search.recreate(candidate, search.ruin(candidate), noisy=True)
+        if candidate.key() >= current.key():
+            current = candidate
+            if current.key() > best.key():
+                best = current.copy()
+
+    unplaced: Dict[Any, int] = {}
+    for unit, index in enumerate(best.assignment):
+        if index < 0:
+            key = requests[search.units[unit]].key
+            unplaced[key] = unplaced.get(key, 0) + 1
+    return Solution(
+        placements=search.placements(best),
+        unplaced=unplaced,
+        score=round(best.score, 6),
+        best_possible=round(best_possible, 6),
+        iterations=iterations,
+        elapsed_s=time.perf_counter() - started,
+    )
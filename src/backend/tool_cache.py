@@ -0,0 +1,167 @@
+"""
+Memoization for the read-only AI tools.
+
+Results are keyed by tool name, the normalized call arguments and the
+global data version from `service` (bumped after every committed write),
+so a cached result is reused only while the underlying data is unchanged.
+Tools whose output depends on the current time also include the current
+minute in their key. Entries are evicted in LRU order.
+
+The data version only counts writes made by this process, so entries also
+expire after TOOL_CACHE_TTL_S: that bounds how long writes made by other
+workers go unseen.
+"""
+import functools
+import inspect
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from .config import settings
+from .service import get_data_version
+
+# ==================== Tool failures ====================
+# Tools report exceptions as a result string instead of raising, so the model can explain them.
+# Only strings built by tool_error() count as failures; their text never comes from user data.
+
+_ERROR_PREFIX = re.compile(r"⚠️ [^\n:：]*时出错: ")
+
+
+class ToolError(str):
+    """A tool result that reports a failed call."""
+
+
+def tool_error(action: str, error: Exception) -> ToolError:
+    return ToolError(f"⚠️ {action}时出错: {error}")
+
+
+def is_tool_error(output: Any) -> bool:
+    """
+    Whether a tool result (raw, or the ToolMessage built from it) reports a failure:
+    a ToolMessage with status="error", a ToolError, or text starting with the tool_error() prefix.
+    """
+    if getattr(output, "status", None) == "error":
+        return True
+    text = getattr(output, "content", output)
+    return isinstance(text, ToolError) or (isinstance(text, str) and _ERROR_PREFIX.match(text) is not None)
+
+
+
+class ToolResultCache:
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = max(1, maxsize)
+        self.ttl_s = ttl_s
+        # key -> (stored at, value)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _live(self, key: tuple) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if time.monotonic() - entry[0] >= self.ttl_s:
+            del self._entries[key]
+            return False
+        return True
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            if self._live(key):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][1]
+            self.misses += 1
+            return None
+
+    def contains(self, key: tuple) -> bool:
+        with self._lock:
+            return self._live(key)
+
+    def put(self, key: tuple, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache = ToolResultCache(settings.TOOL_CACHE_SIZE, settings.TOOL_CACHE_TTL_S)
+
+# tool name -> (signature, now_sensitive)
+_registry: dict = {}
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def _make_key(name: str, sig: inspect.Signature, now_sensitive: bool, args: tuple, kwargs: dict) -> tuple:
+    bound = sig.bind(*args, **kwargs)
+    bound.apply_defaults()
+    normalized = json.dumps(_normalize(dict(bound.arguments)), sort_keys=True, ensure_ascii=False, default=str)
+    minute = datetime.now().strftime("%Y-%m-%dT%H:%M") if now_sensitive else None
+    return (name, get_data_version(), normalized, minute)
+
+
+def cached_tool(now_sensitive: bool = True) -> Callable:
+    """
+    Decorator for read-only tool functions; apply it below `@tool`.
+    now_sensitive: the output depends on the current time, so the key includes the minute.
+    """
+    def decorator(func: Callable) -> Callable:
+        sig = inspect.signature(func)
+        _registry[func.__name__] = (sig, now_sensitive)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.TOOL_CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key = _make_key(func.__name__, sig, now_sensitive, args, kwargs)
+            cached = _cache.get(key)
+            if cached is not None:
+                return cached
+            result = func(*args, **kwargs)
+            # Failed results may be transient and are not cached
+            if not is_tool_error(result):
+                _cache.put(key, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def is_cached(tool_name: str, tool_input: Any) -> bool:
+    """Whether calling `tool_name` with `tool_input` now would be a cache hit."""
+    if not settings.TOOL_CACHE_ENABLED or tool_name not in _registry or not isinstance(tool_input, dict):
+        return False
+    sig, now_sensitive = _registry[tool_name]
+    try:
+        key = _make_key(tool_name, sig, now_sensitive, (), tool_input)
+    except TypeError:
+        return False
+    return _cache.contains(key)
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
@@ -2,14 +2,19 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 import json
 import calendar
+import re
 
 from langchain_core.tools import tool
 from .service import (
     get_all_courses,
     create_course,
+    create_course_checked,
+    ScheduleConflict,
     update_course,
     delete_course,
     check_conflicts,
+    get_courses_in_domains,
+    resolve_resource_id,
     get_all_students,
     get_student,
     get_student_by_name,
@@ -17,23 +22,137 @@ from .service import (
     update_student as service_update_student,
     delete_student as service_delete_student,
     query_courses_filtered,
+    summarize_courses_filtered,
+    query_students_filtered,
+    count_students_filtered,
     bulk_update_courses_filtered,
     bulk_delete_courses_filtered,
     bulk_create_recurring_courses,
+    count_courses_filtered,
+    count_recurring_course_dates,
+    plan_weekly_timetable,
     CourseCreate,
     CourseUpdate,
     StudentCreate,
     StudentUpdate
 )
-from .models import Course, Student
+from .models import AvailabilityWindow, Course, Student, TimetablePlan, TimetableStudent
+from .config import settings
+from .tool_cache import cached_tool, tool_error
+from . import analytics, jobs
+
+# ==================== Output Paging Helpers ====================
+
+COURSE_FIELDS = ("id", "title", "start", "end", "student_id", "student_name", "student_grade",
+                 "price", "color", "description", "location")
+DEFAULT_COURSE_FIELDS = ("id", "title", "start", "end", "student_name", "price", "location")
+STUDENT_FIELDS = ("id", "name", "grade", "phone", "parent_contact", "progress", "notes")
+DEFAULT_STUDENT_FIELDS = ("id", "name", "grade", "progress")
+
+# 单个字段值的最大长度，避免一条超长备注撑爆输出
+_FIELD_MAX_CHARS = 300
+
+
+def _page_size(limit: Optional[int]) -> int:
+    if not limit or limit <= 0:
+        return settings.TOOL_PAGE_SIZE
+    return min(int(limit), settings.TOOL_PAGE_SIZE_MAX)
+
+
+def _parse_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        offset = int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError(f"cursor 无效: {cursor}，请使用上一页返回的 next_cursor")
+    if offset < 0:
+        raise ValueError(f"cursor 无效: {cursor}")
+    return offset
+
+
+def _select_fields(fields: Optional[List[str]], allowed: tuple, default: tuple) -> tuple:
+    if not fields:
+        return default
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}；可选字段: {', '.join(allowed)}")
+    return tuple(fields)
+
+
+def _project(data: dict, fields: tuple) -> dict:
+    row = {}
+    for f in fields:
+        value = data.get(f)
+        if isinstance(value, str) and len(value) > _FIELD_MAX_CHARS:
+            value = value[:_FIELD_MAX_CHARS] + "…"
+        row[f] = value
+    return row
+
+
+def _dump_page(rows: List[dict], total: int, offset: int) -> str:
+    """
+    将一页数据序列化为 JSON，并强制输出大小上限。
+    超出上限的行不会输出，而是通过 next_cursor/truncated 告知模型还剩多少。
+    """
+    budget = settings.TOOL_OUTPUT_MAX_CHARS
+    items = []
+    used = 0
+    for row in rows:
+        size = len(json.dumps(row, default=str, ensure_ascii=False)) + 2
+        if items and used + size > budget:
+            break
+        items.append(row)
+        used += size
+
+    next_offset = offset + len(items)
+    remaining = max(0, total - next_offset)
+    payload = {
+        "total": total,
+        "offset": offset,
+        "returned": len(items),
+        "items": items,
+        "next_cursor": str(next_offset) if remaining else None,
+    }
+    if remaining:
+        payload["truncated"] = f"已截断，还有 {remaining} 条；如需继续请传 cursor=\"{next_offset}\""
+    return json.dumps(payload, default=str, ensure_ascii=False)
 
 # ==================== Course Tools (Existing) ====================
 
 @tool
-def fetch_courses_tool() -> str:
-    """获取所有课程列表，返回 JSON 格式"""
-    courses = get_all_courses()
-    return json.dumps([c.dict() for c in courses], default=str, ensure_ascii=False)
+@cached_tool(now_sensitive=False)
+def fetch_courses_tool(
+    fields: Optional[List[str]] = None,
+    title_pattern: str = "",
+    student_name: str = "",
+    date_range: Optional[str] = None,
+    weekday: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> str:
+    """
+    分页获取课程列表，返回 JSON 格式 {total, items, next_cursor, truncated?}。
+    - fields: 需要的字段，默认 id/title/start/end/student_name/price/location；
+      可选 id,title,start,end,student_id,student_name,student_grade,price,color,description,location
+    - title_pattern/student_name/date_range("YYYY-MM-DD,YYYY-MM-DD")/weekday("周一".."周日"): 筛选条件
+    - limit: 每页条数（默认 20）
+    - cursor: 继续获取下一页时传入上次返回的 next_cursor
+    尽量使用筛选条件缩小范围，不要一次拉取全部课程。
+    """
+    try:
+        selected = _select_fields(fields, COURSE_FIELDS, DEFAULT_COURSE_FIELDS)
+        offset = _parse_cursor(cursor)
+        page_size = _page_size(limit)
+        filters = dict(title_pattern=title_pattern, student_name=student_name,
+                       date_range=date_range, weekday=weekday)
+        total = summarize_courses_filtered(**filters)["count"]
+        courses = query_courses_filtered(**filters, limit=page_size, offset=offset) if offset < total else []
+        return _dump_page([_project(c.dict(), selected) for c in courses], total, offset)
+    except ValueError as e:
+        return f"⚠️ 参数错误: {str(e)}"
+    except Exception as e:
+        return tool_error("获取课程", e)
 
 @tool
 def add_course_tool(
@@ -44,11 +163,17 @@ def add_course_tool(
     price: float,
     description: str = "",
     location: Optional[str] = None,
-    color: str = "#F5A3C8"
+    color: str = "#F5A3C8",
+    teacher: Optional[str] = None,
+    room: Optional[str] = None,
+    allow_conflict: bool = False
 ) -> str:
     """
     添加新课程到日程表。
     start_time 和 end_time 必须是 ISO 格式 (例如: '2026-01-27T10:00:00')。
+    teacher / room：授课老师、教室名称（可选，须已存在）；冲突只在同一学生、老师、教室的课程之间判断。
+    默认在同一事务中检查时间冲突，有冲突时不添加并返回冲突课程；无需先调用 check_availability_tool。
+    用户确认要与已有课程重叠时，设置 allow_conflict=True。
     返回创建的课程或错误信息。
     """
     try:
@@ -59,23 +184,36 @@ def add_course_tool(
         student = get_student_by_name(student_name)
         if not student:
             return f"错误：找不到学生 '{student_name}'，请先创建该学生档案。"
+        try:
+            teacher_id = resolve_resource_id("teacher", teacher)
+            room_id = resolve_resource_id("room", room)
+        except ValueError as e:
+            return f"⚠️ 错误：{e}"
 
         course_in = CourseCreate(
             title=title,
             start=start,
             end=end,
             student_id=student.id,
+            teacher_id=teacher_id,
+            room_id=room_id,
             price=price,
             description=description,
             location=location,
             color=color
         )
-        new_course = create_course(course_in)
+        new_course = create_course(course_in) if allow_conflict else create_course_checked(course_in)
         return f"✅ 成功添加课程: {new_course.title} - {student_name}，时间: {new_course.start.strftime('%Y-%m-%d %H:%M')}"
+    except ScheduleConflict as e:
+        conflict_info = [
+            f"{c['title']}（{c['student_name'] or '未知学生'}，{c['start'][:16].replace('T', ' ')}-{c['end'][11:16]}）"
+            for c in e.conflicts
+        ]
+        return f"⚠️ 未添加：该时间段与 {len(e.conflicts)} 节课程冲突:\n" + "\n".join(conflict_info)
     except ValueError as e:
         return f"⚠️ 日期/时间解析错误: {str(e)}"
     except Exception as e:
-        return f"⚠️ 添加课程时出错: {str(e)}"
+        return tool_error("添加课程", e)
 
 @tool
 def modify_course_tool(
@@ -86,11 +224,13 @@ def modify_course_tool(
     student_name: Optional[str] = None,
     price: Optional[float] = None,
     description: Optional[str] = None,
-    location: Optional[str] = None
+    location: Optional[str] = None,
+    teacher: Optional[str] = None,
+    room: Optional[str] = None
 ) -> str:
     """
     修改现有课程，只提供需要更新的字段。
-    start_time/end_time 必须是 ISO 字符串。
+    start_time/end_time 必须是 ISO 字符串；teacher / room 为老师、教室名称。
     """
     try:
         update_data = {}
@@ -107,6 +247,11 @@ def modify_course_tool(
             if not student:
                 return f"⚠️ 错误：找不到学生 '{student_name}'"
             update_data['student_id'] = student.id
+        try:
+            if teacher: update_data['teacher_id'] = resolve_resource_id("teacher", teacher)
+            if room: update_data['room_id'] = resolve_resource_id("room", room)
+        except ValueError as e:
+            return f"⚠️ 错误：{e}"
 
         course_in = CourseUpdate(**update_data)
         updated = update_course(course_id, course_in)
@@ -115,7 +260,7 @@ def modify_course_tool(
         else:
             return f"⚠️ 课程 {course_id} 不存在"
     except Exception as e:
-        return f"⚠️ 更新课程时出错: {str(e)}"
+        return tool_error("更新课程", e)
 
 @tool
 def remove_course_tool(course_id: str) -> str:
@@ -126,23 +271,40 @@ def remove_course_tool(course_id: str) -> str:
         return f"⚠️ 课程 {course_id} 不存在"
 
 @tool
-def check_availability_tool(start_time: str, end_time: str) -> str:
+@cached_tool(now_sensitive=False)
+def check_availability_tool(
+    start_time: str,
+    end_time: str,
+    student_name: Optional[str] = None,
+    teacher: Optional[str] = None,
+    room: Optional[str] = None
+) -> str:
     """
     检查时间段是否可用。
+    指定学生/老师/教室时，只检查这些人或教室各自的安排（未指定老师即默认老师）；都不指定时检查全部课程。
     如果有冲突，返回冲突的课程列表。
     """
     try:
         start = datetime.fromisoformat(start_time)
         end = datetime.fromisoformat(end_time)
-        conflicts = check_conflicts(start, end)
+        student_id = None
+        if student_name:
+            student = get_student_by_name(student_name)
+            if not student:
+                return f"⚠️ 错误：找不到学生 '{student_name}'"
+            student_id = student.id
+        teacher_id = resolve_resource_id("teacher", teacher)
+        room_id = resolve_resource_id("room", room)
+        conflicts = check_conflicts(start, end, student_id=student_id, teacher_id=teacher_id, room_id=room_id)
         if conflicts:
             conflict_info = [f"{c.title} ({c.start.strftime('%Y-%m-%d %H:%M')}-{c.end.strftime('%H:%M')})" for c in conflicts]
             return f"⚠️ 检测到 {len(conflicts)} 个时间冲突:\n" + "\n".join(conflict_info)
         return "✅ 该时间段可用"
     except Exception as e:
-        return f"⚠️ 检查可用性时出错: {str(e)}"
+        return tool_error("检查可用性", e)
 
 @tool
+@cached_tool()
 def financial_report_tool(month: Optional[int] = None, year: Optional[int] = None) -> str:
     """
     计算总收入。
@@ -193,12 +355,39 @@ def financial_report_tool(month: Optional[int] = None, year: Optional[int] = Non
 # ==================== Student Management Tools (NEW) ====================
 
 @tool
-def fetch_students_tool() -> str:
-    """获取所有学生列表，返回 JSON 格式"""
-    students = get_all_students()
-    return json.dumps([s.dict() for s in students], ensure_ascii=False)
+@cached_tool(now_sensitive=False)
+def fetch_students_tool(
+    fields: Optional[List[str]] = None,
+    name_pattern: str = "",
+    grade: str = "",
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> str:
+    """
+    分页获取学生列表，返回 JSON 格式 {total, items, next_cursor, truncated?}。
+    - fields: 需要的字段，默认 id/name/grade/progress；可选 id,name,grade,phone,parent_contact,progress,notes
+    - name_pattern: 姓名模糊匹配；grade: 年级精确匹配
+    - limit: 每页条数（默认 20）
+    - cursor: 继续获取下一页时传入上次返回的 next_cursor
+    查询单个学生请直接使用 get_student_by_name_tool。
+    """
+    try:
+        selected = _select_fields(fields, STUDENT_FIELDS, DEFAULT_STUDENT_FIELDS)
+        offset = _parse_cursor(cursor)
+        page_size = _page_size(limit)
+        total = count_students_filtered(name_pattern=name_pattern, grade=grade)
+        students = (
+            query_students_filtered(name_pattern=name_pattern, grade=grade, limit=page_size, offset=offset)
+            if offset < total else []
+        )
+        return _dump_page([_project(st.dict(), selected) for st in students], total, offset)
+    except ValueError as e:
+        return f"⚠️ 参数错误: {str(e)}"
+    except Exception as e:
+        return tool_error("获取学生列表", e)
 
 @tool
+@cached_tool(now_sensitive=False)
 def get_student_by_name_tool(name: str) -> str:
     """根据姓名查找学生，返回学生详细信息（年级、联系方式、备注）"""
     student = get_student_by_name(name)
@@ -239,7 +428,7 @@ def create_student_tool(
         new_student = service_create_student(student_in)
         return f"✅ 成功创建学生档案: {new_student.name} (ID: {new_student.id})"
     except Exception as e:
-        return f"⚠️ 创建学生时出错: {str(e)}"
+        return tool_error("创建学生", e)
 
 @tool
 def update_student_tool(
@@ -268,7 +457,7 @@ def update_student_tool(
         else:
             return f"⚠️ 学生ID {student_id} 不存在"
     except Exception as e:
-        return f"⚠️ 更新学生时出错: {str(e)}"
+        return tool_error("更新学生", e)
 
 @tool
 def delete_student_tool(student_id: int, student_name: str = "") -> str:
@@ -288,11 +477,12 @@ def delete_student_tool(student_id: int, student_name: str = "") -> str:
         else:
             return f"⚠️ 删除失败"
     except Exception as e:
-        return f"⚠️ 删除学生时出错: {str(e)}"
+        return tool_error("删除学生", e)
 
 # ==================== Student-Course Association Tools (NEW) ====================
 
 @tool
+@cached_tool()
 def get_student_courses_tool(student_name: str) -> str:
     """获取某学生的所有课程记录"""
     student = get_student_by_name(student_name)
@@ -336,6 +526,7 @@ def get_student_courses_tool(student_name: str) -> str:
     return result
 
 @tool
+@cached_tool()
 def get_student_schedule_tool(student_name: str, days: int = 7) -> str:
     """获取某学生未来 N 天的课程安排"""
     student = get_student_by_name(student_name)
@@ -367,6 +558,7 @@ def get_student_schedule_tool(student_name: str, days: int = 7) -> str:
     return result
 
 @tool
+@cached_tool()
 def get_student_financial_summary_tool(student_name: str) -> str:
     """获取某学生的累计收入统计"""
     student = get_student_by_name(student_name)
@@ -403,14 +595,18 @@ def get_student_financial_summary_tool(student_name: str) -> str:
 # ==================== Intelligent Scheduling Tools (NEW) ====================
 
 @tool
+@cached_tool(now_sensitive=False)
 def find_common_available_time_tool(
     date: str,
     duration_minutes: int,
-    student_names: Optional[List[str]] = None
+    student_names: Optional[List[str]] = None,
+    teacher: Optional[str] = None,
+    room: Optional[str] = None
 ) -> str:
     """
     查找指定日期的所有空闲时间段。
     如果提供多个学生姓名，返回所有人都空闲的时间段（用于小组课）。
+    提供 teacher / room 时同时避开该老师、该教室已有的课程。
     date 格式: YYYY-MM-DD
     """
     try:
@@ -422,20 +618,27 @@ def find_common_available_time_tool(
     day_start = datetime.combine(target_date, datetime.min.time()).replace(hour=8, minute=0)
     day_end = datetime.combine(target_date, datetime.min.time()).replace(hour=22, minute=0)
 
-    # 获取所有课程
-    all_courses = get_all_courses()
+    # 只读取相关学生、老师、教室当天的课程（按资源分区的索引范围查询）
+    domains = []
+    for name in student_names or []:
+        student = get_student_by_name(name)
+        if not student:
+            return f"⚠️ 错误：找不到学生 '{name}'"
+        domains.append(("student_id", student.id))
+    try:
+        if teacher:
+            domains.append(("teacher_id", resolve_resource_id("teacher", teacher)))
+        if room:
+            domains.append(("room_id", resolve_resource_id("room", room)))
+    except ValueError as e:
+        return f"⚠️ 错误：{e}"
 
-    # 筛选指定日期的课程
-    day_courses = []
-    for c in all_courses:
-        if c.start.date() == target_date:
-            # 如果指定了学生，只筛选这些学生的课程
-            if student_names:
-                student = get_student(c.student_id)
-                if student and student.name in student_names:
-                    day_courses.append(c)
-            else:
-                day_courses.append(c)
+    day_begin = datetime.combine(target_date, datetime.min.time())
+    day_finish = day_begin + timedelta(days=1)
+    if domains:
+        day_courses = get_courses_in_domains(day_begin, day_finish, domains)
+    else:
+        day_courses = [c for c in get_all_courses() if c.start.date() == target_date]
 
     if not day_courses:
         return f"✅ {date} 全天空闲，可随时安排 {duration_minutes} 分钟课程"
@@ -469,41 +672,46 @@ def find_common_available_time_tool(
     return result
 
 @tool
+@cached_tool()
 def suggest_optimal_time_tool(
     student_name: str,
     preferred_days: Optional[List[str]] = None
 ) -> str:
     """
-    基于历史数据，建议最优上课时间。
+    基于历史数据，建议最优上课时间（同时参考近 8 周各时段的整体占用）。
     preferred_days: 偏好的星期列表，如 ["周一", "周二", "周三"]
     """
     student = get_student_by_name(student_name)
     if not student:
         return f"⚠️ 找不到学生 '{student_name}'"
 
-    all_courses = get_all_courses()
-    student_courses = [c for c in all_courses if c.student_id == student.id]
+    # 按星期 x 小时统计（NumPy 向量化，数组按数据版本缓存）
+    history = analytics.history_range(student.id)
+    if history:
+        first, last = history
+        first = max(first, last - timedelta(days=analytics.MAX_DAYS))
+        lessons = analytics.heatmap(first, last, slot_minutes=60, student_id=student.id)["lessons"]
+    else:
+        lessons = [[0] * 24 for _ in range(7)]
 
-    if len(student_courses) < 3:
+    if sum(map(sum, lessons)) < 3:
         return f"💡 {student_name} 的课程记录较少，建议多安排几次课程后再使用此功能"
 
     # 统计各时段的课程频率
-    weekday_counts = {}  # 星期几
-    hour_counts = {}     # 几点
+    weekday_counts = {d: sum(row) for d, row in enumerate(lessons) if sum(row)}   # 星期几
+    hour_counts = {h: sum(row[h] for row in lessons) for h in range(24)}          # 几点
+    hour_counts = {h: n for h, n in hour_counts.items() if n}
 
     weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
 
-    for c in student_courses:
-        weekday = c.start.weekday()  # 0=周一, 6=周日
-        hour = c.start.hour
-
-        weekday_counts[weekday] = weekday_counts.get(weekday, 0) + 1
-        hour_counts[hour] = hour_counts.get(hour, 0) + 1
-
     # 找出最常上课的时间
     best_weekdays = sorted(weekday_counts.items(), key=lambda x: x[1], reverse=True)[:3]
     best_hours = sorted(hour_counts.items(), key=lambda x: x[1], reverse=True)[:3]
 
+    # 近 8 周所有课程在各时段的占用率，推荐时优先较空的时段
+    today = datetime.now().date()
+    utilization = analytics.heatmap(today - timedelta(weeks=8), today + timedelta(days=1), slot_minutes=60)["utilization"]
+
     result = f"""💡 {student_name} 的上课时间分析
 ━━━━━━━━━━━━━━━━━━━━━━
 
@@ -519,12 +727,16 @@ def suggest_optimal_time_tool(
     result += f"\n🎯 建议安排时间:\n"
 
     # 综合推荐
-    suggestions = []
+    combos = []
     for weekday, _ in best_weekdays[:2]:
         for hour, _ in best_hours[:2]:
             day_name = weekday_names[weekday]
             if not preferred_days or day_name in preferred_days:
-                suggestions.append(f"  • {day_name} {hour:02d}:00-{hour+1:02d}:00")
+                combos.append((utilization[weekday][hour], weekday, hour))
+    suggestions = [
+        f"  • {weekday_names[weekday]} {hour:02d}:00-{hour+1:02d}:00（近8周占用 {used:.0%}）"
+        for used, weekday, hour in sorted(combos)
+    ]
 
     if suggestions:
         result += "\n".join(suggestions[:4])
@@ -533,9 +745,113 @@ def suggest_optimal_time_tool(
 
     return result
 
+
+# 周课表排课：时段文本解析
+_WEEKDAY_CHARS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+_DAY_GROUPS = {"每天": range(7), "工作日": range(5), "周末": (5, 6)}
+_PREFERRED_WEIGHT = 2.0
+
+
+def _parse_windows(text: Optional[str], preference: float = 1.0) -> List[AvailabilityWindow]:
+    """'周一 16:00-20:00, 周三至周五 18:00-21:00, 周末 09:00-12:00' -> 时段列表"""
+    windows = []
+    for part in re.split(r"[,，;；\n]", text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        m = re.fullmatch(r"(.+?)\s*(\d{1,2}:\d{2})\s*[-~到至]\s*(\d{1,2}:\d{2})", part)
+        if not m:
+            raise ValueError(f"无法识别的时间段 '{part}'，格式如 '周一 16:00-20:00' 或 '周一至周五 18:00-21:00'")
+        day_text = m.group(1).strip()
+        if day_text in _DAY_GROUPS:
+            days = list(_DAY_GROUPS[day_text])
+        else:
+            days = [_WEEKDAY_CHARS[c] for c in re.findall(r"(?:周|星期)([一二三四五六日天])", day_text)]
+            if len(days) == 2 and re.search(r"[至到~-]", day_text):
+                days = list(range(days[0], days[1] + 1))
+        if not days:
+            raise ValueError(f"无法识别的星期 '{day_text}'，请使用 周一..周日、工作日、周末 或 每天")
+        # 24:00 记为 00:00，表示到当天结束
+        start, end = (datetime.strptime("00:00" if v == "24:00" else v, "%H:%M").time() for v in m.group(2, 3))
+        windows += [AvailabilityWindow(weekday=d, start=start, end=end, preference=preference) for d in days]
+    return windows
+
+
+@tool
+@cached_tool()
+def plan_weekly_timetable_tool(
+    students: List[dict],
+    working_hours: Optional[str] = None,
+    teacher: Optional[str] = None,
+    time_limit_seconds: float = 5
+) -> str:
+    """
+    为多名学生自动排一张无冲突的周课表（每周固定时段），只给出方案，不写入课程。
+    - students: 每项 {"name": 学生姓名, "lessons_per_week": 每周节数(默认1), "duration_minutes": 每节分钟数(默认60),
+      "availability": 可上课时段如 "周一 16:00-20:00, 周三至周五 18:00-21:00", "preferred": 更希望的时段(可选，同格式)}
+    - working_hours: 老师工作时间，同格式，如 "工作日 16:00-21:00, 周末 09:00-18:00"；不填为每天 08:00-22:00
+    - teacher: 老师名称（可选）；会避开该老师下周已有的其他学生的课程，以及这些学生跟其他老师的课程
+    每名学生每天至多一节；在时间限制内先尽量排入更多课程，其次尽量落在 preferred 时段。
+    """
+    weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+    try:
+        entries = []
+        for item in students:
+            name = str(item.get("name", "")).strip()
+            student = get_student_by_name(name)
+            if not student:
+                return f"⚠️ 错误：找不到学生 '{name}'"
+            windows = _parse_windows(item.get("availability")) + _parse_windows(item.get("preferred"), _PREFERRED_WEIGHT)
+            if not windows:
+                return f"⚠️ 错误：请提供 {name} 的可上课时段（availability）"
+            entries.append(TimetableStudent(
+                student_id=student.id,
+                lessons_per_week=int(item.get("lessons_per_week") or 1),
+                duration_minutes=int(item.get("duration_minutes") or 60),
+                availability=windows,
+            ))
+        if not entries:
+            return "⚠️ 错误：请至少提供一名学生"
+        result = plan_weekly_timetable(TimetablePlan(
+            students=entries,
+            working_hours=_parse_windows(working_hours),
+            teacher_id=resolve_resource_id("teacher", teacher),
+            time_limit_s=min(max(float(time_limit_seconds), 0.5), 30),
+        ))
+    except ValueError as e:
+        return f"⚠️ 错误：{e}"
+    except Exception as e:
+        return tool_error("排课", e)
+
+    requested = sum(e.lessons_per_week for e in entries)
+    status = "全部排入" if not result.unplaced else f"排入 {len(result.slots)} 节"
+    lines = [
+        f"🗓️ 周课表方案（{len(entries)} 名学生，共 {requested} 节，{status}）",
+        "━━━━━━━━━━━━━━━━━━━━━━",
+    ]
+    for weekday in range(7):
+        day_slots = [slot for slot in result.slots if slot.weekday == weekday]
+        if not day_slots:
+            continue
+        lines.append(f"📅 {weekday_names[weekday]}")
+        for slot in day_slots:
+            star = " ⭐" if slot.preference >= _PREFERRED_WEIGHT else ""
+            end = "24:00" if slot.end == datetime.min.time() else f"{slot.end:%H:%M}"
+            lines.append(f"  • {slot.start:%H:%M}-{end} {slot.student_name}{star}")
+    if result.unplaced:
+        lines.append("")
+        lines.append("⚠️ 未能排入（可上课时段与老师工作时间或已有课程冲突）：")
+        lines += [f"  • {u.student_name}：还差 {u.missing} 节" for u in result.unplaced]
+    lines.append("")
+    quality = "已是最优" if result.optimal else f"偏好得分 {result.score:g} / 上限 {result.best_possible:g}"
+    lines.append(f"⭐ = 偏好时段；{quality}，用时 {result.elapsed_ms / 1000:.1f} 秒（参考周 {result.week_start}）")
+    lines.append("💡 确认后可用 add_recurring_course_tool 按此方案为每位学生创建周期课程")
+    return "\n".join(lines)
+
 # ==================== Teaching Analysis Tools (NEW) ====================
 
 @tool
+@cached_tool()
 def get_teaching_summary_tool(date_range: str = "week") -> str:
     """
     获取教学汇总。
@@ -594,6 +910,7 @@ def get_teaching_summary_tool(date_range: str = "week") -> str:
     return result
 
 @tool
+@cached_tool()
 def get_student_progress_report_tool(student_name: str) -> str:
     """生成学生学习进度报告（结合课程频率、备注）"""
     student = get_student_by_name(student_name)
@@ -650,6 +967,7 @@ def get_student_progress_report_tool(student_name: str) -> str:
     return result
 
 @tool
+@cached_tool()
 def get_daily_schedule_tool(date: Optional[str] = None) -> str:
     """获取指定日期的课程清单，不指定日期则返回今天"""
     if date:
@@ -689,6 +1007,16 @@ def get_daily_schedule_tool(date: Optional[str] = None) -> str:
 
 # ==================== Recurring / Batch Tools (NEW) ====================
 
+def _submit_background_job(kind: str, params: dict, rows: int) -> str:
+    """超过 JOB_INLINE_MAX_ROWS 的批量操作转为后台任务，工具立即返回"""
+    job = jobs.submit(kind, params)
+    result = f"📦 涉及 {rows} 节课，已转为后台任务分批执行\n"
+    result += f"━━━━━━━━━━━━━━━━━━━━━━\n"
+    result += f"🆔 任务ID: {job.id}\n"
+    result += f"⏳ 进度会实时显示在对话中，完成前可以取消（已完成的批次会保留）\n"
+    return result
+
+
 @tool
 def add_recurring_course_tool(
     title: str,
@@ -702,7 +1030,9 @@ def add_recurring_course_tool(
     grade: str = "",  # 新增：年级，用于自动创建学生
     description: str = "",
     location: Optional[str] = None,
-    color: str = "#F5A3C8"
+    color: str = "#F5A3C8",
+    teacher: str = "",
+    room: str = ""
 ) -> str:
     """
     【推荐】批量添加周期性课程（一次性创建多节重复课程）。
@@ -720,9 +1050,15 @@ def add_recurring_course_tool(
     - end_time: 下课时间，格式 "HH:MM"，如 "17:00"
     - price: 每节课费用
     - grade: 学生年级（可选，如果学生不存在会用于创建档案）
+    - teacher / room: 授课老师、教室名称（可选，须已存在）；只跳过与同一学生、老师、教室冲突的日期
     """
     try:
-        stats = bulk_create_recurring_courses(
+        try:
+            resolve_resource_id("teacher", teacher)
+            resolve_resource_id("room", room)
+        except ValueError as e:
+            return f"⚠️ 错误：{e}"
+        params = dict(
             title=title,
             student_name=student_name,
             start_date=start_date,
@@ -735,7 +1071,14 @@ def add_recurring_course_tool(
             description=description,
             location=location,
             color=color,
+            teacher=teacher,
+            room=room,
         )
+        planned = count_recurring_course_dates(start_date, end_date, weekdays, start_time, end_time)
+        if planned > settings.JOB_INLINE_MAX_ROWS:
+            return _submit_background_job("recurring_courses", params, planned)
+
+        stats = bulk_create_recurring_courses(**params)
 
         result = f"🎀 周期性课程创建完成！\n"
         result += f"━━━━━━━━━━━━━━━━━━━━━━\n"
@@ -775,7 +1118,7 @@ def add_recurring_course_tool(
     except ValueError as e:
         return f"⚠️ 日期/时间格式错误: {str(e)}"
     except Exception as e:
-        return f"⚠️ 创建周期性课程时出错: {str(e)}"
+        return tool_error("创建周期性课程", e)
 
 
 @tool
@@ -807,15 +1150,14 @@ def batch_modify_courses_tool(
       → student_name="张三", date_range="2026-03-01,2026-03-31", new_price=200
     """
     try:
-        stats = bulk_update_courses_filtered(
-            title_pattern=title_pattern,
-            student_name=student_name,
-            date_range=date_range,
-            weekday=weekday,
-            new_time=new_time,
-            new_price=new_price,
-            new_location=new_location,
-        )
+        filters = dict(title_pattern=title_pattern, student_name=student_name, date_range=date_range, weekday=weekday)
+        changes = dict(new_time=new_time, new_price=new_price, new_location=new_location)
+        if any(v is not None and v != "" for v in changes.values()):
+            matched = count_courses_filtered(**filters)
+            if matched > settings.JOB_INLINE_MAX_ROWS:
+                return _submit_background_job("batch_modify_courses", {**filters, **changes}, matched)
+
+        stats = bulk_update_courses_filtered(**filters, **changes)
 
         matched = int(stats.get("matched") or 0)
         updated = int(stats.get("updated") or 0)
@@ -831,7 +1173,7 @@ def batch_modify_courses_tool(
         return result
 
     except Exception as e:
-        return f"⚠️ 批量修改时出错: {str(e)}"
+        return tool_error("批量修改", e)
 
 
 @tool
@@ -857,12 +1199,12 @@ def batch_remove_courses_tool(
       → title_pattern="钢琴课", weekday="周六"
     """
     try:
-        stats = bulk_delete_courses_filtered(
-            title_pattern=title_pattern,
-            student_name=student_name,
-            date_range=date_range,
-            weekday=weekday,
-        )
+        filters = dict(title_pattern=title_pattern, student_name=student_name, date_range=date_range, weekday=weekday)
+        matched = count_courses_filtered(**filters)
+        if matched > settings.JOB_INLINE_MAX_ROWS:
+            return _submit_background_job("batch_remove_courses", filters, matched)
+
+        stats = bulk_delete_courses_filtered(**filters)
 
         matched = int(stats.get("matched") or 0)
         deleted = int(stats.get("deleted") or 0)
@@ -876,24 +1218,29 @@ def batch_remove_courses_tool(
         return result
 
     except Exception as e:
-        return f"⚠️ 批量删除时出错: {str(e)}"
+        return tool_error("批量删除", e)
 
 
 @tool
+@cached_tool(now_sensitive=False)
 def query_courses_tool(
     title_pattern: str = "",
     student_name: str = "",
     date_range: Optional[str] = None,
-    weekday: Optional[str] = None
+    weekday: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
 ) -> str:
     """
-    按条件查询课程列表（支持多种筛选组合）。
+    按条件查询课程列表（支持多种筛选组合，结果分页返回）。
 
     参数说明:
     - title_pattern: 课程名称（模糊搜索），如 "钢琴"、"数学"
     - student_name: 学生姓名
     - date_range: 日期范围 "YYYY-MM-DD,YYYY-MM-DD"
     - weekday: 星期几 "周一"到"周日"
+    - limit: 每页条数（默认 20）
+    - cursor: 结果被截断时，传入提示中的 cursor 继续查看下一页
 
     示例:
     - "显示所有钢琴课" → title_pattern="钢琴课"
@@ -902,42 +1249,54 @@ def query_courses_tool(
     - "张三的钢琴课" → title_pattern="钢琴", student_name="张三"
     """
     try:
-        filtered = query_courses_filtered(
-            title_pattern=title_pattern,
-            student_name=student_name,
-            date_range=date_range,
-            weekday=weekday,
-        )
+        filters = dict(title_pattern=title_pattern, student_name=student_name,
+                       date_range=date_range, weekday=weekday)
+        offset = _parse_cursor(cursor)
+        summary = summarize_courses_filtered(**filters)
+        total = summary["count"]
 
-        if not filtered:
+        if total == 0:
             return f"📋 没有找到符合条件的课程"
 
-        result = f"📋 查询结果 ({len(filtered)}节课)\n"
+        filtered = query_courses_filtered(**filters, limit=_page_size(limit), offset=offset) if offset < total else []
+
+        result = f"📋 查询结果 (共{total}节课)\n"
         result += f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
 
+        budget = settings.TOOL_OUTPUT_MAX_CHARS
+        shown = 0
         for c in filtered:
             s_name = c.student_name or "未知"
             wd = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"][c.start.weekday()]
 
-            result += f"📌 {c.title}\n"
-            result += f"   📅 {c.start.strftime('%Y-%m-%d')} {wd} {c.start.strftime('%H:%M')}-{c.end.strftime('%H:%M')}\n"
-            result += f"   👤 {s_name} | 💰 ¥{c.price}\n"
+            block = f"📌 {c.title}\n"
+            block += f"   📅 {c.start.strftime('%Y-%m-%d')} {wd} {c.start.strftime('%H:%M')}-{c.end.strftime('%H:%M')}\n"
+            block += f"   👤 {s_name} | 💰 ¥{c.price}\n"
             if c.location:
-                result += f"   📍 {c.location}\n"
-            result += "\n"
+                block += f"   📍 {c.location}\n"
+            block += "\n"
+
+            if shown and len(result) + len(block) > budget:
+                break
+            result += block
+            shown += 1
+
+        remaining = total - offset - shown
+        if remaining > 0:
+            result += f"…已截断，还有 {remaining} 节；如需继续请传 cursor=\"{offset + shown}\"\n\n"
 
-        total_income = sum(c.price for c in filtered)
-        result += f"💵 总收入: ¥{total_income:.0f}"
+        result += f"💵 总收入: ¥{summary['income']:.0f}"
 
         return result
 
     except Exception as e:
-        return f"⚠️ 查询课程时出错: {str(e)}"
+        return tool_error("查询课程", e)
 
 
 # ==================== Notification Tools (NEW) ====================
 
 @tool
+@cached_tool()
 def get_upcoming_lessons_tool(hours: int = 24) -> str:
     """获取未来 N 小时内的课程清单（用于每日提醒）"""
     now = datetime.now()
@@ -963,6 +1322,7 @@ def get_upcoming_lessons_tool(hours: int = 24) -> str:
     return result
 
 @tool
+@cached_tool()
 def get_absent_students_tool(days: int = 30) -> str:
     """找出 N 天未上课的学生（跟进关怀）"""
     all_students = get_all_students()
@@ -1004,6 +1364,7 @@ def get_absent_students_tool(days: int = 30) -> str:
     return result
 
 @tool
+@cached_tool()
 def get_weekly_overview_tool() -> str:
     """获取本周课程概览（包括收入、学生数、每日分布）"""
     now = datetime.now()
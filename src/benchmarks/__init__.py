@@ -0,0 +1,9 @@
+"""
+Benchmarks for the scheduling backend.
+
+Run from the src/ directory against a local MySQL database configured via
+the usual DB_* variables (see docs/BENCHMARKS.md):
+
+    python -m benchmarks.datasets --students 200 --courses 20000 --years 3 --reset
+    python -m benchmarks.load --spawn-server --concurrency 16 --duration 60 --out report.json
+"""
@@ -0,0 +1,256 @@
+"""
+Seeded generator of realistic tutoring datasets.
+
+Every student gets one or two recurring weekly slots (weekday, start time,
+duration, subject, price); most lessons fall on those slots across the whole
+history window, the rest are one-off makeup lessons. Each slot is used at
+most once per week and makeups never overlap another lesson of the same
+student. The same seed always produces the same rows, including course ids.
+"""
+import argparse
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from backend.config import settings
+from backend.schema import ensure_schema
+from backend.service import get_db_cursor
+
+SUBJECTS = [
+    ("数学课", 200, "#F5A3C8"),
+    ("英语课", 180, "#A3C8F5"),
+    ("钢琴课", 260, "#C8A3F5"),
+    ("物理课", 220, "#A3F5C8"),
+    ("语文课", 160, "#F5D7A3"),
+    ("化学课", 220, "#F5A3A3"),
+    ("美术课", 150, "#A3F5F0"),
+]
+GRADES = ["一年级", "二年级", "三年级", "四年级", "五年级", "六年级", "初一", "初二", "初三", "高一", "高二", "高三"]
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+GIVEN = "子涵欣怡梓涵晨曦浩然宇轩雨桐思远若溪一诺可馨嘉怡俊杰佳琪明轩梓萱诗琪皓轩语嫣文博天佑静怡"
+LOCATIONS = [None, None, "线上", "学生家中", "工作室", "阳光小区3栋", "图书馆二楼"]
+DURATIONS = [60, 60, 90, 90, 120]
+
+_INSERT_BATCH = 5000
+
+
+@dataclass
+class _Slot:
+    weekday: int
+    start_minute: int
+    duration: int
+    title: str
+    price: float
+    color: str
+
+
+def _student_name(rng: random.Random, index: int) -> str:
+    # Suffix keeps names unique: get_student_by_name matches exactly
+    return rng.choice(SURNAMES) + rng.choice(GIVEN) + rng.choice(GIVEN) + str(index)
+
+
+def generate_students(n: int, seed: int = 42) -> List[tuple]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        rows.append((
+            _student_name(rng, i),
+            rng.choice(GRADES),
+            f"1{rng.randint(3, 9)}{rng.randint(100000000, 999999999)}",
+            None,
+            rng.randint(0, 100),
+            None,
+        ))
+    return rows
+
+
+def _overlaps(slots: List[_Slot], weekday: int, start_minute: int, duration: int) -> bool:
+    return any(
+        s.weekday == weekday
+        and start_minute < s.start_minute + s.duration
+        and s.start_minute < start_minute + duration
+        for s in slots
+    )
+
+
+def _slots_for(rng: random.Random) -> List[_Slot]:
+    slots = []
+    for _ in range(rng.choice([1, 1, 2])):
+        title, price, color = rng.choice(SUBJECTS)
+        slot = _Slot(
+            weekday=rng.randrange(7),
+            start_minute=rng.randrange(8 * 60, 20 * 60, 30),
+            duration=rng.choice(DURATIONS),
+            title=title,
+            price=float(price + rng.choice([-20, 0, 0, 20, 40])),
+            color=color,
+        )
+        # A second slot overlapping the first would double-book every week
+        if not _overlaps(slots, slot.weekday, slot.start_minute, slot.duration):
+            slots.append(slot)
+    return slots
+
+
+def generate_courses(
+    student_ids: List[int],
+    n_courses: int,
+    years: float = 3,
+    seed: int = 42,
+    end: Optional[date] = None,
+    makeup_ratio: float = 0.05,
+) -> Iterator[tuple]:
+    """
+    Yields (id, title, start, end, student_id, price, color, description, location) rows.
+    The window ends `end` (default: 90 days from today) and spans `years` years.
+
+    Regular lessons walk each slot's weeks in a shuffled order without
+    replacement; once every slot of every student is used up, fewer than
+    `n_courses` rows are produced. A makeup that would overlap one of the
+    student's slots or earlier makeups is replaced by a regular lesson.
+    """
+    rng = random.Random(seed + 1)
+    end = end or (date.today() + timedelta(days=90))
+    first = end - timedelta(days=int(365 * years))
+    first_monday = first - timedelta(days=first.weekday())
+    weeks = max(1, (end - first_monday).days // 7)
+
+    slots = {sid: _slots_for(rng) for sid in student_ids}
+    locations = {sid: rng.choice(LOCATIONS) for sid in student_ids}
+    # Unused weeks per (student, slot index), consumed from the end
+    free_weeks = {}
+    makeups = {}
+    active = list(student_ids)
+
+    def next_week(sid: int, index: int) -> Optional[int]:
+        key = (sid, index)
+        order = free_weeks.get(key)
+        if order is None:
+            order = free_weeks[key] = rng.sample(range(weeks), weeks)
+        return order.pop() if order else None
+
+    def row(sid: int, slot: _Slot, day: date, start_minute: int, description: Optional[str]) -> tuple:
+        start_dt = datetime(day.year, day.month, day.day) + timedelta(minutes=start_minute)
+        return (
+            str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            slot.title,
+            start_dt,
+            start_dt + timedelta(minutes=slot.duration),
+            sid,
+            slot.price,
+            slot.color,
+            description,
+            locations[sid],
+        )
+
+    produced = 0
+    while produced < n_courses and active:
+        pos = rng.randrange(len(active))
+        sid = active[pos]
+        index = rng.randrange(len(slots[sid]))
+        slot = slots[sid][index]
+
+        if rng.random() < makeup_ratio:
+            day = first_monday + timedelta(days=rng.randrange(weeks * 7))
+            start_minute = rng.randrange(8 * 60, 20 * 60, 30)
+            taken = makeups.get((sid, day), ())
+            clash = _overlaps(slots[sid], day.weekday(), start_minute, slot.duration) or any(
+                start_minute < e and s < start_minute + slot.duration for s, e in taken
+            )
+            if not clash:
+                makeups.setdefault((sid, day), []).append((start_minute, start_minute + slot.duration))
+                produced += 1
+                yield row(sid, slot, day, start_minute, "补课")
+                continue
+
+        week = next_week(sid, index)
+        if week is None:
+            # This slot is used up; fall back to the student's other slots
+            for other in range(len(slots[sid])):
+                week = next_week(sid, other)
+                if week is not None:
+                    index, slot = other, slots[sid][other]
+                    break
+        if week is None:
+            active[pos] = active[-1]
+            active.pop()
+            continue
+        day = first_monday + timedelta(weeks=week, days=slot.weekday)
+        produced += 1
+        yield row(sid, slot, day, slot.start_minute, None)
+
+
+def _batched(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reset_database():
+    with get_db_cursor() as cursor:
+        cursor.execute("DELETE FROM courses")
+        cursor.execute("DELETE FROM students")
+
+
+def load_dataset(n_students: int, n_courses: int, years: float = 3, seed: int = 42) -> Tuple[int, int]:
+    """Creates the schema if needed and inserts a dataset. Returns (students, courses) inserted."""
+    with get_db_cursor() as cursor:
+        ensure_schema(cursor)
+
+    student_ids = []
+    for batch in _batched(iter(generate_students(n_students, seed)), _INSERT_BATCH):
+        with get_db_cursor() as cursor:
+            for row in batch:
+                cursor.execute(
+                    """
+                    INSERT INTO students (name, grade, phone, parent_contact, progress, notes)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    """,
+                    row,
+                )
+                student_ids.append(cursor.lastrowid)
+
+    inserted = 0
+    for batch in _batched(generate_courses(student_ids, n_courses, years, seed), _INSERT_BATCH):
+        with get_db_cursor() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO courses (id, title, start, end, student_id, price, color, description, location)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                batch,
+            )
+        inserted += len(batch)
+    return len(student_ids), inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a seeded benchmark dataset")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--courses", type=int, default=20000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="delete existing students and courses first")
+    parser.add_argument("--force", action="store_true", help="allow --reset on a database not named *_bench")
+    args = parser.parse_args(argv)
+
+    if args.reset:
+        if not settings.DB_NAME.endswith("_bench") and not args.force:
+            parser.error(f"refusing to reset database '{settings.DB_NAME}'; use a *_bench database or --force")
+        reset_database()
+
+    t0 = time.perf_counter()
+    students, courses = load_dataset(args.students, args.courses, args.years, args.seed)
+    print(f"inserted {students} students, {courses} courses into {settings.DB_NAME} "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
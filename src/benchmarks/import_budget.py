@@ -0,0 +1,109 @@
+"""
+Import-time budget for the web server.
+
+Imports backend.main in fresh interpreters with `-X importtime` and fails
+when the cumulative import time exceeds the budget, or when the agent stack
+(langchain, langgraph, the model client) is imported at server start
+instead of on first chat / warmup, or NumPy (the analytics module) is
+imported before the first heatmap request. The agent import time is
+reported too, for comparison.
+
+    python -m benchmarks.import_budget --budget-ms 1500 --repeat 3
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Tuple
+
+# Top-level packages that belong to the lazily loaded agent
+AGENT_PACKAGES = ("langchain", "langchain_core", "langchain_openai", "langgraph", "openai", "backend.ai_graph")
+# Loaded on the first heatmap request (or with the agent's tools)
+ANALYTICS_PACKAGES = ("numpy", "backend.analytics")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def _parse(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """-X importtime output -> [(module, self_us, cumulative_us, depth)]."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    return rows
+
+
+def measure(module: str) -> List[Tuple[str, int, int, int]]:
+    env = {**os.environ, "LLM_BACKEND": os.environ.get("LLM_BACKEND", "scripted")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    return _parse(proc.stderr)
+
+
+def cumulative_ms(rows, module: str) -> float:
+    return next(cum for name, _, cum, _ in rows if name == module) / 1000
+
+
+def agent_modules(rows, packages=AGENT_PACKAGES) -> List[str]:
+    return sorted({
+        name for name, _, _, _ in rows
+        if any(name == pkg or name.startswith(pkg + ".") for pkg in packages)
+    })
+
+
+def heaviest(rows, module: str, limit: int = 10) -> List[Tuple[str, float]]:
+    """Largest direct imports of `module` (importtime lists children before their parent)."""
+    end = next(i for i, (name, _, _, depth) in enumerate(rows) if name == module and depth == 0)
+    direct = []
+    for name, _, cum, depth in reversed(rows[:end]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append((name, cum / 1000))
+    return sorted(direct, key=lambda item: -item[1])[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget for backend.main")
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters; the fastest run is kept")
+    parser.add_argument("--skip-agent", action="store_true", help="do not measure the agent import for comparison")
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(max(1, args.repeat))]
+    best = min(runs, key=lambda rows: cumulative_ms(rows, args.module))
+    total = cumulative_ms(best, args.module)
+
+    print(f"{args.module}: {total:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, ms in heaviest(best, args.module):
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if not args.skip_agent:
+        agent_runs = [measure("backend.ai_graph") for _ in range(max(1, args.repeat))]
+        agent_ms = min(cumulative_ms(rows, "backend.ai_graph") for rows in agent_runs)
+        print(f"backend.ai_graph (loaded on first chat / warmup): {agent_ms:.0f} ms")
+
+    problems = []
+    if total > args.budget_ms:
+        problems.append(f"{args.module} imports in {total:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    eager = agent_modules(best)
+    if eager:
+        problems.append(f"agent modules imported at server start: {', '.join(eager[:8])}")
+    eager = agent_modules(best, ANALYTICS_PACKAGES)
+    if eager:
+        problems.append(f"analytics modules imported at server start: {', '.join(eager[:8])}")
+    for p in problems:
+        print(f"FAIL: {p}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+HTTP load driver.
+
+Runs a weighted mix of requests against a running server (or one it spawns
+with the scripted model backend) at a fixed concurrency, then writes a JSON
+report with throughput and p50/p95/p99 latency per route.
+
+    python -m benchmarks.load --spawn-server --concurrency 16 --duration 60 --out report.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+# Relative weights of each scenario in the mix
+DEFAULT_MIX = {
+    "list_courses": 30,
+    "list_students": 20,
+    "write_course": 20,
+    "chat": 10,
+}
+
+CHAT_MESSAGES = ["今天有什么课", "帮我看看张三的课程", "本周概览", "下周三下午有空吗"]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_byte: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, seconds: float, ok: bool, first_byte: Optional[float] = None):
+        with self._lock:
+            if ok:
+                self.latencies[route].append(seconds)
+                if first_byte is not None:
+                    self.first_byte[route].append(first_byte)
+            else:
+                self.errors[route] += 1
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(route, []))
+            entry = {
+                "requests": len(values),
+                "errors": self.errors.get(route, 0),
+                "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+            }
+            fb = sorted(self.first_byte.get(route, []))
+            if fb:
+                entry["first_byte_p50_ms"] = round(percentile(fb, 50) * 1000, 2)
+                entry["first_byte_p95_ms"] = round(percentile(fb, 95) * 1000, 2)
+            routes[route] = entry
+        total = sum(r["requests"] for r in routes.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "total_requests": total,
+            "total_errors": sum(r["errors"] for r in routes.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "routes": routes,
+        }
+
+
+class Client:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, base_url: str, recorder: Recorder):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.recorder = recorder
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+
+    def request(self, route: str, method: str, path: str, body: Optional[dict] = None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        t0 = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            resp = self.conn.getresponse()
+            first = resp.read(1)
+            first_byte = time.perf_counter() - t0
+            data = first + resp.read()
+            elapsed = time.perf_counter() - t0
+            ok = 200 <= resp.status < 300
+            self.recorder.record(route, elapsed, ok, first_byte if route.startswith("POST /api/ai") else None)
+            return resp.status, data
+        except (OSError, http.client.HTTPException):
+            self.recorder.record(route, time.perf_counter() - t0, False)
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            return 0, b""
+
+
+def _scenario_list_courses(client: Client, rng: random.Random, ctx: dict):
+    client.request("GET /api/courses", "GET", "/api/courses")
+
+
+def _scenario_list_students(client: Client, rng: random.Random, ctx: dict):
+    client.request("GET /api/students", "GET", "/api/students")
+
+
+def _scenario_write_course(client: Client, rng: random.Random, ctx: dict):
+    if not ctx["student_ids"]:
+        return
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=rng.randint(400, 800), hours=rng.randint(0, 12))
+    body = {
+        "title": "压测课程",
+        "start": start.isoformat(),
+        "end": (start + timedelta(hours=1)).isoformat(),
+        "student_id": rng.choice(ctx["student_ids"]),
+        "price": 100,
+    }
+    status, data = client.request("POST /api/courses", "POST", "/api/courses", body)
+    if status != 200:
+        return
+    course_id = json.loads(data)["id"]
+    client.request("PUT /api/courses/{id}", "PUT", f"/api/courses/{course_id}", {"price": 120})
+    client.request("DELETE /api/courses/{id}", "DELETE", f"/api/courses/{course_id}")
+
+
+def _scenario_chat(client: Client, rng: random.Random, ctx: dict):
+    body = {"message": rng.choice(CHAT_MESSAGES), "thread_id": f"bench-{threading.get_ident()}-{rng.random()}"}
+    client.request("POST /api/ai/chat", "POST", "/api/ai/chat", body)
+
+
+SCENARIOS = {
+    "list_courses": _scenario_list_courses,
+    "list_students": _scenario_list_students,
+    "write_course": _scenario_write_course,
+    "chat": _scenario_chat,
+}
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0):
+    parsed = urlparse(base_url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=2)
+            conn.request("GET", "/api/students")
+            if conn.getresponse().status < 500:
+                return
+        except OSError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """Starts uvicorn from src/ with the scripted model so chats need no network."""
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "scripted")
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=src_dir,
+        env=env,
+    )
+
+
+def run(base_url: str, concurrency: int, duration: float, mix: Dict[str, int], seed: int = 42) -> dict:
+    recorder = Recorder()
+    setup = Client(base_url, recorder)
+    status, data = setup.request("setup", "GET", "/api/students")
+    student_ids = [s["id"] for s in json.loads(data)] if status == 200 else []
+    ctx = {"student_ids": student_ids}
+
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        client = Client(base_url, recorder)
+        while time.perf_counter() < deadline:
+            SCENARIOS[rng.choices(names, weights)[0]](client, rng, ctx)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    recorder.latencies.pop("setup", None)
+    recorder.errors.pop("setup", None)
+    report = recorder.report(elapsed)
+    report["config"] = {"base_url": base_url, "concurrency": concurrency, "duration_s": duration, "mix": mix}
+    return report
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario: {name}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load test for the scheduling API")
+    parser.add_argument("--url", default="http://127.0.0.1:9101")
+    parser.add_argument("--spawn-server", action="store_true", help="start uvicorn with LLM_BACKEND=scripted")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", type=_parse_mix, default=dict(DEFAULT_MIX),
+                        help="e.g. list_courses=30,list_students=20,write_course=20,chat=10")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn_server:
+        server = spawn_server(urlparse(args.url).port or 80)
+    try:
+        _wait_ready(args.url)
+        report = run(args.url, args.concurrency, args.duration, args.mix, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
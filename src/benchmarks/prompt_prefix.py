@@ -0,0 +1,58 @@
+"""
+Checks that the agent prompt prefix is byte-identical across calls.
+
+Provider-side prompt caching only helps if the static prefix (system prompt
++ tool schemas) never changes between calls or between worker processes;
+anything time-dependent must go into the dynamic suffix. The fingerprint is
+computed in fresh interpreters with different hash seeds, so set/dict
+ordering leaking into the schemas is caught too. Exits non-zero if the
+prefix is not stable.
+
+    python -m benchmarks.prompt_prefix
+"""
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+# Building the graph must not need provider credentials
+os.environ.setdefault("LLM_BACKEND", "scripted")
+
+from backend.prompts import build_prompt_messages, prefix_fingerprint
+
+
+def _fingerprint_in_subprocess(hash_seed: str) -> str:
+    env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+    code = "from backend.ai_graph import tools; from backend.prompts import prefix_fingerprint; print(prefix_fingerprint(tools))"
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def check() -> list:
+    from backend.ai_graph import tools
+
+    problems = []
+    first = build_prompt_messages([], datetime(2026, 1, 1, 9, 0))
+    second = build_prompt_messages([], datetime(2026, 7, 15, 21, 37))
+    if first[0].content != second[0].content:
+        problems.append("static system prompt differs between calls")
+    fingerprints = {_fingerprint_in_subprocess(seed) for seed in ("1", "2")}
+    fingerprints.add(prefix_fingerprint(tools))
+    if len(fingerprints) != 1:
+        problems.append("system prompt / tool schema fingerprint differs between processes")
+    if first[-1].content == second[-1].content:
+        problems.append("dynamic suffix does not carry the current time")
+    return problems
+
+
+def main():
+    problems = check()
+    for p in problems:
+        print(f"FAIL: {p}")
+    if problems:
+        sys.exit(1)
+    print("prompt prefix is stable")
+
+
+if __name__ == "__main__":
+    main()
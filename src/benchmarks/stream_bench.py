@@ -0,0 +1,117 @@
+"""
+Chat stream encoding benchmark.
+
+Drives POST /api/ai/chat through the ASGI app in-process with the scripted
+model (no network, no DB) and reports, per streamed answer, CPU time, bytes
+sent and the number of body writes (one socket write each), with delta
+coalescing off and on.
+
+    python -m benchmarks.stream_bench --answers 50 --chars 2000 --chunk-chars 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def _write_script(chars: int) -> str:
+    text = ("今天下午三点有数学课，记得提前准备好练习册。" * (chars // 20 + 1))[:chars]
+    script = [{"reasoning": text[: chars // 4], "content": text}]
+    fd, path = tempfile.mkstemp(suffix=".json", prefix="stream_bench_")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(script, f, ensure_ascii=False)
+    return path
+
+
+async def _one_answer(app, thread_id: str) -> dict:
+    body = json.dumps({"message": "讲讲你自己", "thread_id": thread_id}).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "path": "/api/ai/chat", "raw_path": b"/api/ai/chat", "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80), "scheme": "http", "root_path": "",
+    }
+    received = False
+    stats = {"writes": 0, "bytes": 0, "lines": 0}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            stats["writes"] += 1
+            stats["bytes"] += len(message["body"])
+            stats["lines"] += message["body"].count(b"\n")
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    await app(scope, receive, send)
+    stats["cpu_ms"] = (time.process_time() - cpu0) * 1000
+    stats["wall_ms"] = (time.perf_counter() - wall0) * 1000
+    return stats
+
+
+async def _run(app, settings, answers: int, flush_ms: float, flush_chars: int, label: str) -> dict:
+    settings.STREAM_FLUSH_MS = flush_ms
+    settings.STREAM_FLUSH_CHARS = flush_chars
+    samples = [await _one_answer(app, f"stream-bench-{label}-{i}") for i in range(answers)]
+    return {
+        "flush_ms": flush_ms,
+        "flush_chars": flush_chars,
+        "cpu_ms_per_answer": round(statistics.median(s["cpu_ms"] for s in samples), 3),
+        "wall_ms_per_answer": round(statistics.median(s["wall_ms"] for s in samples), 3),
+        "writes_per_answer": statistics.median(s["writes"] for s in samples),
+        "lines_per_answer": statistics.median(s["lines"] for s in samples),
+        "bytes_per_answer": statistics.median(s["bytes"] for s in samples),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU, bytes and writes per streamed chat answer")
+    parser.add_argument("--answers", type=int, default=30)
+    parser.add_argument("--chars", type=int, default=2000, help="answer length in characters")
+    parser.add_argument("--chunk-chars", type=int, default=2, help="characters per model delta")
+    parser.add_argument("--delay-ms", type=float, default=0, help="delay between model deltas")
+    parser.add_argument("--flush-ms", type=float, default=30)
+    parser.add_argument("--flush-chars", type=int, default=256)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    script_path = _write_script(args.chars)
+    os.environ["LLM_BACKEND"] = "scripted"
+    os.environ["LLM_SCRIPT_PATH"] = script_path
+    os.environ["LLM_SCRIPT_CHUNK_CHARS"] = str(args.chunk_chars)
+    os.environ["LLM_SCRIPT_DELAY_MS"] = str(args.delay_ms)
+    os.environ["FAST_PATH_ENABLED"] = "false"
+
+    from backend.config import settings
+    from backend.main import app
+
+    async def run_all():
+        await _one_answer(app, "stream-bench-warmup")
+        return {
+            "per_delta": await _run(app, settings, args.answers, 0, 0, "off"),
+            "coalesced": await _run(app, settings, args.answers, args.flush_ms, args.flush_chars, "on"),
+        }
+
+    try:
+        report = asyncio.run(run_all())
+    finally:
+        os.remove(script_path)
+    report["config"] = {"chars": args.chars, "chunk_chars": args.chunk_chars, "delay_ms": args.delay_ms}
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Weekly timetable optimizer benchmark (no database).
+
+Builds term-sized instances with a planted conflict-free timetable: every
+student's availability contains the planted slots plus a few random
+windows, so all lessons can be placed. Reports how many lessons the solver
+placed, its score against the upper bound and the time taken.
+
+    python -m benchmarks.timetable_bench --students 50 --time-limit 5 --seeds 3
+"""
+import argparse
+import random
+import sys
+from typing import List, Tuple
+
+from backend.timetable import LessonRequest, Window, solve
+
+DAY_START, DAY_END = 8 * 60, 22 * 60
+
+
+def planted_instance(students: int, seed: int) -> Tuple[List[Window], List[LessonRequest]]:
+    rng = random.Random(seed)
+    hours = [Window(d, DAY_START, DAY_END) for d in range(7)]
+    free = {d: list(range(DAY_START, DAY_END, 60)) for d in range(7)}
+    requests = []
+    for i in range(students):
+        wanted = rng.choice([1, 2, 2, 3])
+        windows = []
+        for day in rng.sample(range(7), 7):
+            if len(windows) == wanted:
+                break
+            if free[day]:
+                start = free[day].pop(rng.randrange(len(free[day])))
+                lo = max(DAY_START, start - rng.choice([0, 60, 120]))
+                hi = min(DAY_END, start + 60 + rng.choice([0, 60, 120]))
+                windows.append(Window(day, lo, hi, rng.choice([1.0, 2.0, 3.0])))
+        lessons = len(windows)
+        for day in rng.sample(range(7), 2):
+            start = rng.randrange(8, 20) * 60
+            windows.append(Window(day, start, start + 120, rng.choice([1.0, 2.0])))
+        if lessons:
+            requests.append(LessonRequest(i, lessons, 60, windows))
+    return hours, requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Weekly timetable optimizer benchmark")
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--time-limit", type=float, default=5.0)
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for seed in range(args.seeds):
+        hours, requests = planted_instance(args.students, seed)
+        solution = solve(requests, hours, time_limit_s=args.time_limit, seed=seed)
+        lessons = sum(r.lessons for r in requests)
+        print(f"seed {seed}: placed {len(solution.placements)}/{lessons} lessons, "
+              f"score {solution.score:g}/{solution.best_possible:g}, "
+              f"{solution.iterations} iterations in {solution.elapsed_s:.2f}s"
+              + (" (optimal)" if solution.optimal else ""))
+        failed |= bool(solution.unplaced)
+    if failed:
+        print("FAIL: a planted instance was not fully placed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
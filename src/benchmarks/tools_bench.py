@@ -0,0 +1,282 @@
+"""
+Scale-tier microbenchmarks for the AI tool functions.
+
+Every tool in backend.tools is invoked directly (no LLM) against seeded
+datasets of increasing size. Per call we record wall time, number of DB
+statements, rows returned/affected and peak Python memory; wall time is
+measured in a pass without tracemalloc, memory in a second pass. Results can be
+stored as a baseline and later runs are compared against it, so scaling
+cliffs and regressions stay visible.
+
+    python -m benchmarks.tools_bench --tiers 1000,10000 --out tools.json
+    python -m benchmarks.tools_bench --tiers 1000,10000 --baseline benchmarks/baseline_tools.json
+    python -m benchmarks.tools_bench --tiers 1000,10000 --baseline benchmarks/baseline_tools.json --update-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+# Tools are called directly; the graph (and its model) is never built
+os.environ.setdefault("LLM_BACKEND", "scripted")
+
+from backend import tools as T
+from backend.config import settings
+from backend.service import add_query_observer, get_db_cursor, remove_query_observer
+
+from .datasets import load_dataset, reset_database
+
+DEFAULT_TIERS = [1_000, 10_000, 100_000, 1_000_000]
+
+# A tool is flagged when it gets this much slower than the baseline...
+REGRESSION_RATIO = 1.5
+# ...or when its wall time grows faster than this per 10x more data (superlinear scaling)
+SCALING_CLIFF_RATIO = 20.0
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, sql: str, duration: float, rowcount: int):
+        self.queries += 1
+        if rowcount and rowcount > 0:
+            self.rows += rowcount
+
+
+def _students_for(n_courses: int) -> int:
+    return max(20, n_courses // 200)
+
+
+def _sample_context() -> dict:
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT s.name, COUNT(c.id) AS cnt
+            FROM students s JOIN courses c ON c.student_id = s.id
+            GROUP BY s.id, s.name ORDER BY cnt DESC LIMIT 2
+            """
+        )
+        names = [row["name"] for row in cursor.fetchall()]
+    far = date.today() + timedelta(days=3650)
+    return {
+        "student": names[0] if names else "",
+        "other_student": names[1] if len(names) > 1 else "",
+        "today": date.today().isoformat(),
+        "far": far,
+        "bench_student": "基准测试学生",
+    }
+
+
+def _cases(ctx: dict) -> List[Tuple[str, Callable[[dict], dict]]]:
+    """
+    (tool name, args builder) in execution order. Write tools operate on
+    far-future rows they create themselves, so the dataset is left unchanged.
+    """
+    far = ctx["far"]
+    far_start = datetime.combine(far, datetime.min.time()).replace(hour=10)
+    month_start = date.today().replace(day=1)
+    month_range = f"{month_start.isoformat()},{(month_start + timedelta(days=31)).replace(day=1).isoformat()}"
+    far_range = f"{far.isoformat()},{(far + timedelta(days=28)).isoformat()}"
+
+    return [
+        # Reads
+        ("fetch_courses_tool", lambda c: {}),
+        ("fetch_students_tool", lambda c: {}),
+        ("query_courses_tool", lambda c: {"date_range": month_range}),
+        ("financial_report_tool", lambda c: {}),
+        ("check_availability_tool", lambda c: {"start_time": f"{c['today']}T10:00:00", "end_time": f"{c['today']}T11:00:00"}),
+        ("get_student_by_name_tool", lambda c: {"name": c["student"]}),
+        ("get_student_courses_tool", lambda c: {"student_name": c["student"]}),
+        ("get_student_schedule_tool", lambda c: {"student_name": c["student"], "days": 30}),
+        ("get_student_financial_summary_tool", lambda c: {"student_name": c["student"]}),
+        ("find_common_available_time_tool", lambda c: {"date": c["today"], "duration_minutes": 60,
+                                                      "student_names": [c["student"], c["other_student"]]}),
+        ("suggest_optimal_time_tool", lambda c: {"student_name": c["student"]}),
+        ("plan_weekly_timetable_tool", lambda c: {"students": [
+            {"name": c["student"], "lessons_per_week": 2, "availability": "工作日 16:00-21:00"},
+            {"name": c["other_student"], "availability": "周末 09:00-12:00"}], "time_limit_seconds": 1}),
+        ("get_teaching_summary_tool", lambda c: {"date_range": "month"}),
+        ("get_student_progress_report_tool", lambda c: {"student_name": c["student"]}),
+        ("get_daily_schedule_tool", lambda c: {"date": c["today"]}),
+        ("get_upcoming_lessons_tool", lambda c: {"hours": 72}),
+        ("get_absent_students_tool", lambda c: {"days": 30}),
+        ("get_weekly_overview_tool", lambda c: {}),
+        # Writes (self-contained, far in the future)
+        ("create_student_tool", lambda c: {"name": c["bench_student"], "grade": "初一"}),
+        ("update_student_tool", lambda c: {"student_id": _student_id(c["bench_student"]), "notes": "benchmark"}),
+        ("add_course_tool", lambda c: {"title": "基准课", "start_time": far_start.isoformat(),
+                                       "end_time": (far_start + timedelta(hours=1)).isoformat(),
+                                       "student_name": c["bench_student"], "price": 100}),
+        ("modify_course_tool", lambda c: {"course_id": _course_id(c["bench_student"]), "price": 120}),
+        ("remove_course_tool", lambda c: {"course_id": _course_id(c["bench_student"])}),
+        ("add_recurring_course_tool", lambda c: {"title": "基准周期课", "student_name": c["bench_student"],
+                                                 "start_date": far.isoformat(),
+                                                 "end_date": (far + timedelta(days=28)).isoformat(),
+                                                 "weekdays": "周一,周三", "start_time": "15:00",
+                                                 "end_time": "16:00", "price": 100}),
+        ("batch_modify_courses_tool", lambda c: {"student_name": c["bench_student"], "date_range": far_range,
+                                                 "new_price": 150}),
+        ("batch_remove_courses_tool", lambda c: {"student_name": c["bench_student"], "date_range": far_range}),
+        ("delete_student_tool", lambda c: {"student_id": _student_id(c["bench_student"])}),
+    ]
+
+
+def _student_id(name: str) -> int:
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT id FROM students WHERE name = %s", (name,))
+        row = cursor.fetchone()
+        return row["id"] if row else -1
+
+
+def _course_id(student_name: str) -> str:
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT c.id FROM courses c JOIN students s ON c.student_id = s.id WHERE s.name = %s LIMIT 1",
+            (student_name,),
+        )
+        row = cursor.fetchone()
+        return row["id"] if row else ""
+
+
+def _time(tool_name: str, args: dict) -> dict:
+    tool = getattr(T, tool_name)
+    counter = QueryCounter()
+    add_query_observer(counter)
+    t0 = time.perf_counter()
+    try:
+        tool.invoke(args)
+    finally:
+        wall = time.perf_counter() - t0
+        remove_query_observer(counter)
+    return {
+        "wall_ms": round(wall * 1000, 3),
+        "queries": counter.queries,
+        "rows": counter.rows,
+    }
+
+
+def _peak_memory(tool_name: str, args: dict) -> dict:
+    # Separate from _time: tracing slows allocation-heavy tools far more than others
+    tool = getattr(T, tool_name)
+    tracemalloc.start()
+    try:
+        tool.invoke(args)
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"peak_kb": round(peak / 1024, 1)}
+
+
+def run_tier(n_courses: int, repeat: int, seed: int, reuse: bool) -> Dict[str, dict]:
+    if not reuse:
+        reset_database()
+        load_dataset(_students_for(n_courses), n_courses, years=3, seed=seed)
+
+    ctx = _sample_context()
+    runs: Dict[str, List[dict]] = {}
+    peaks: Dict[str, List[dict]] = {}
+    for _ in range(repeat):
+        # Write cases depend on each other, so every repetition runs the whole sequence,
+        # once timed and once under tracemalloc
+        for tool_name, build_args in _cases(ctx):
+            runs.setdefault(tool_name, []).append(_time(tool_name, build_args(ctx)))
+        for tool_name, build_args in _cases(ctx):
+            peaks.setdefault(tool_name, []).append(_peak_memory(tool_name, build_args(ctx)))
+
+    results = {}
+    for tool_name, samples in runs.items():
+        results[tool_name] = {
+            "wall_ms": round(statistics.median(s["wall_ms"] for s in samples), 3),
+            "queries": max(s["queries"] for s in samples),
+            "rows": max(s["rows"] for s in samples),
+            "peak_kb": max(s["peak_kb"] for s in peaks[tool_name]),
+        }
+    return results
+
+
+def compare(current: dict, baseline: dict) -> List[str]:
+    """Regressions against the baseline, for tiers/tools present in both."""
+    findings = []
+    for tier, tools in current.items():
+        for tool_name, now in tools.items():
+            before = baseline.get(tier, {}).get(tool_name)
+            if not before:
+                continue
+            if before["wall_ms"] > 0 and now["wall_ms"] / before["wall_ms"] > REGRESSION_RATIO:
+                findings.append(f"[{tier}] {tool_name}: wall {before['wall_ms']}ms -> {now['wall_ms']}ms")
+            if now["queries"] > before["queries"]:
+                findings.append(f"[{tier}] {tool_name}: queries {before['queries']} -> {now['queries']}")
+            if before["rows"] and now["rows"] > before["rows"] * REGRESSION_RATIO:
+                findings.append(f"[{tier}] {tool_name}: rows {before['rows']} -> {now['rows']}")
+    return findings
+
+
+def scaling_cliffs(current: dict) -> List[str]:
+    """Tools whose wall time grows much faster than the dataset between consecutive tiers."""
+    findings = []
+    tiers = sorted(current, key=int)
+    for small, large in zip(tiers, tiers[1:]):
+        growth = int(large) / int(small)
+        for tool_name, now in current[large].items():
+            before = current[small].get(tool_name)
+            if not before or before["wall_ms"] <= 0:
+                continue
+            ratio = now["wall_ms"] / before["wall_ms"]
+            if ratio > SCALING_CLIFF_RATIO * growth / 10:
+                findings.append(f"{tool_name}: {small}->{large} courses, wall x{ratio:.1f} (data x{growth:.0f})")
+    return findings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks for every AI tool")
+    parser.add_argument("--tiers", default=",".join(str(t) for t in DEFAULT_TIERS),
+                        help="comma-separated course counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reuse", action="store_true", help="benchmark the current data instead of reseeding")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--out", help="write the results JSON here")
+    args = parser.parse_args(argv)
+
+    if not args.reuse and not settings.DB_NAME.endswith("_bench"):
+        parser.error(f"refusing to reseed database '{settings.DB_NAME}'; use a *_bench database or --reuse")
+
+    # Measure the tools themselves, not the memoization layer
+    settings.TOOL_CACHE_ENABLED = False
+
+    tiers = [int(t) for t in args.tiers.split(",") if t.strip()]
+    results = {}
+    for tier in tiers:
+        print(f"tier {tier} courses ...", file=sys.stderr)
+        results[str(tier)] = run_tier(tier, args.repeat, args.seed, args.reuse)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+    findings = scaling_cliffs(results)
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            findings += compare(results, json.load(f))
+
+    for finding in findings:
+        print(f"WARN: {finding}", file=sys.stderr)
+    if args.baseline and not args.update_baseline and findings:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -99,6 +99,7 @@ document.addEventListener('DOMContentLoaded', async function () {
         });
     }
 
+    // 构建产物已内联本地托管的 marked 与 FullCalendar（见 backend/assets.py）；仅在未托管时才回退到 CDN，版本与 assets.VENDOR 保持一致
     async function ensureGlobal(checkFn, urls) {
         try {
             if (checkFn()) return true;
@@ -152,8 +153,8 @@ document.addEventListener('DOMContentLoaded', async function () {
     await ensureGlobal(
         () => typeof window.marked !== 'undefined' && window.marked && typeof window.marked.Renderer === 'function',
         [
-            'https://cdn.jsdelivr.net/npm/marked/marked.min.js',
-            'https://unpkg.com/marked/marked.min.js',
+            'https://cdn.jsdelivr.net/npm/marked@13.0.2/marked.min.js',
+            'https://unpkg.com/marked@13.0.2/marked.min.js',
             'https://cdnjs.cloudflare.com/ajax/libs/marked/13.0.2/marked.min.js'
         ]
     );
@@ -365,6 +366,66 @@ document.addEventListener('DOMContentLoaded', async function () {
         titleEl.textContent = titleText;
     }
 
+    // 月视图只加载按天汇总（/api/calendar/summary），日/周视图按可见范围加载完整课程
+    const SUMMARY_MIN_RANGE_DAYS = 8;
+
+    function isSummaryRange(start, end) {
+        return (end.getTime() - start.getTime()) / 86400000 > SUMMARY_MIN_RANGE_DAYS;
+    }
+
+    function summaryToEvent(day) {
+        return {
+            id: `summary-${day.date}`,
+            title: `${day.count} 节课`,
+            start: day.date,
+            allDay: true,
+            editable: false,
+            classNames: ['summary-event'],
+            extendedProps: { summary: true, ...day }
+        };
+    }
+
+    async function loadCalendarEvents(fetchInfo, successCallback, failureCallback) {
+        const start = encodeURIComponent(fetchInfo.startStr);
+        const end = encodeURIComponent(fetchInfo.endStr);
+        try {
+            if (isSummaryRange(fetchInfo.start, fetchInfo.end)) {
+                const res = await fetch(`/api/calendar/summary?start=${start}&end=${end}`);
+                if (!res.ok) throw new Error(`HTTP ${res.status}`);
+                const data = await res.json();
+                successCallback((data.days || []).map(summaryToEvent));
+            } else {
+                const res = await fetch(`/api/courses?start=${start}&end=${end}`);
+                if (!res.ok) throw new Error(`HTTP ${res.status}`);
+                successCallback(await res.json());
+            }
+        } catch (e) {
+            failureCallback(e);
+            toastError('课程加载失败，请稍后重试');
+        }
+    }
+
+    function renderSummaryContent(props) {
+        const hours = props.busy_minutes >= 60
+            ? `${(props.busy_minutes / 60).toFixed(props.busy_minutes % 60 ? 1 : 0)} 小时`
+            : `${props.busy_minutes} 分钟`;
+        const income = Number(props.income) > 0 ? ` · ¥${Number(props.income).toFixed(0)}` : '';
+        const titles = (props.titles || [])
+            .map(t => `<span class="summary-event-line">${escapeHtml(t)}</span>`)
+            .join('');
+        const more = props.count > (props.titles || []).length
+            ? `<span class="summary-event-more">还有 ${props.count - props.titles.length} 节</span>`
+            : '';
+        return {
+            html: `
+                <div class="summary-event-content">
+                    <span class="summary-event-head">${escapeHtml(`${props.count} 节 · ${hours}${income}`)}</span>
+                    ${titles}${more}
+                </div>
+            `
+        };
+    }
+
     // 重置学生颜色（用于测试）
     window.resetStudentColors = function () {
         studentColors = {};
@@ -388,7 +449,7 @@ document.addEventListener('DOMContentLoaded', async function () {
         [
             'https://cdn.jsdelivr.net/npm/fullcalendar@6.1.10/index.global.min.js',
             'https://unpkg.com/fullcalendar@6.1.10/index.global.min.js',
-            'https://cdnjs.cloudflare.com/ajax/libs/fullcalendar/6.1.19/index.global.min.js'
+            'https://cdnjs.cloudflare.com/ajax/libs/fullcalendar/6.1.10/index.global.min.js'
         ]
     );
 
@@ -421,8 +482,11 @@ document.addEventListener('DOMContentLoaded', async function () {
         expandRows: true,
         height: '100%',
         nowIndicator: true, // 显示当前时间指示器
-        events: '/api/courses',
+        events: loadCalendarEvents,
         eventContent: function (arg) {
+            if (arg.event.extendedProps?.summary) {
+                return renderSummaryContent(arg.event.extendedProps);
+            }
             const viewType = arg.view?.type || '';
             const isMobile = window.innerWidth < 768;
 
@@ -532,6 +596,7 @@ document.addEventListener('DOMContentLoaded', async function () {
         eventDidMount: function (info) {
             const current = info.event;
             const props = current.extendedProps;
+            if (props.summary) return;
             const isDesktop = window.innerWidth >= 1024;
             const viewType = info.view?.type || '';
 
@@ -621,6 +686,11 @@ document.addEventListener('DOMContentLoaded', async function () {
 
         // --- Event Handlers ---
         eventClick: function (info) {
+            // 月视图的汇总：切换到当天的日视图，再加载完整课程
+            if (info.event.extendedProps.summary) {
+                calendar.changeView('timeGridDay', info.event.start);
+                return;
+            }
             currentEventId = info.event.id;
             showEditModal(info.event);
         },
@@ -647,40 +717,82 @@ document.addEventListener('DOMContentLoaded', async function () {
         });
     }
 
-    // Helper to sync drag/resize to backend
+    // 拖拽/拉伸先在前端合并，短暂停顿后一次性提交到 /api/courses/moves（一个请求、一个事务）
+    const MOVE_FLUSH_DELAY_MS = 400;
+    const pendingMoves = new Map(); // course id -> { event, revert }
+    let moveFlushTimer = null;
+
+    function toLocalISOString(date) {
+        // 浏览器本地时间（附带偏移仅供参考，后端按本地墙上时间存储、不做时区换算），避免 toISOString() 转成 UTC 后错位
+        const pad = n => String(n).padStart(2, '0');
+        const offset = -date.getTimezoneOffset();
+        const sign = offset >= 0 ? '+' : '-';
+        return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}T${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}`
+            + `${sign}${pad(Math.floor(Math.abs(offset) / 60))}:${pad(Math.abs(offset) % 60)}`;
+    }
+
     async function handleEventUpdate(info) {
-        const event = info.event;
-        const props = event.extendedProps;
+        // Optimistic UI: It already moved on screen. 同一课程多次拖动时保留最早的还原点
+        const previous = pendingMoves.get(info.event.id);
+        pendingMoves.set(info.event.id, { event: info.event, revert: previous ? previous.revert : info.revert });
+        if (moveFlushTimer) clearTimeout(moveFlushTimer);
+        moveFlushTimer = setTimeout(flushPendingMoves, MOVE_FLUSH_DELAY_MS);
+    }
 
-        // Optimistic UI: It already moved on screen.
-        // We just need to save. If fail, revert.
+    async function flushPendingMoves() {
+        moveFlushTimer = null;
+        if (pendingMoves.size === 0) return;
+        const batch = Array.from(pendingMoves.values());
+        pendingMoves.clear();
 
         try {
-            const res = await fetch(`/api/courses/${event.id}`, {
-                method: 'PUT',
+            const res = await fetch('/api/courses/moves', {
+                method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    title: event.title,
-                    student_id: props.student_id,
-                    start: event.start.toISOString(),
-                    end: event.end.toISOString(),
-                    price: props.price
+                    moves: batch.map(({ event }) => ({
+                        id: event.id,
+                        start: toLocalISOString(event.start),
+                        end: toLocalISOString(event.end || event.start)
+                    }))
                 })
             });
-
             if (!res.ok) {
                 throw new Error('Save failed');
             }
-            // Success: show toast
-            toastSuccess('课程已更新');
+            const data = await res.json();
+            const byId = new Map((data.results || []).map(r => [r.id, r]));
+
+            let moved = 0;
+            const failures = [];
+            batch.forEach(({ event, revert }) => {
+                const result = byId.get(event.id);
+                if (result && result.status === 'moved') {
+                    moved += 1;
+                    return;
+                }
+                revert();
+                if (result && result.status === 'conflict') {
+                    const names = (result.conflicts || []).map(c => c.student_name || c.title).join('、');
+                    failures.push(`${event.title}：与 ${names} 时间冲突`);
+                } else {
+                    failures.push(`${event.title}：${(result && result.error) || '保存失败'}`);
+                }
+            });
+
+            if (moved > 0) {
+                toastSuccess(moved > 1 ? `已更新 ${moved} 节课` : '课程已更新');
+            }
+            if (failures.length > 0) {
+                toastError(failures.join('；'), '已还原');
+            }
             // Re-render to update conflict styles if any moved
             if (calendar) {
                 calendar.render();
             }
-
         } catch (e) {
             toastError('保存失败，正在还原...');
-            info.revert();
+            batch.forEach(({ revert }) => revert());
         }
     }
     if (calendar) {
@@ -788,6 +900,43 @@ document.addEventListener('DOMContentLoaded', async function () {
         }
     }
 
+    // 后台任务进度：大批量操作由工具转为后台任务执行，进度通过 {"type":"job"} 事件推送
+    const JOB_STATUS_TEXT = { queued: '排队中', running: '执行中', succeeded: '已完成', failed: '失败', cancelled: '已取消' };
+
+    function renderJobProgress(contentDiv, job) {
+        let box = contentDiv.querySelector(`.job-progress[data-job-id="${job.id}"]`);
+        if (!box) {
+            box = document.createElement('div');
+            box.className = 'job-progress';
+            box.dataset.jobId = job.id;
+            box.innerHTML = `
+                <div class="job-progress-head">
+                    <span class="job-progress-text"></span>
+                    <button class="job-progress-cancel" type="button">取消</button>
+                </div>
+                <div class="job-progress-bar"><div class="job-progress-fill"></div></div>
+            `;
+            box.querySelector('.job-progress-cancel').addEventListener('click', async (e) => {
+                e.target.disabled = true;
+                const res = await fetch(`/api/jobs/${job.id}/cancel`, { method: 'POST' });
+                if (res.ok) toastInfo('已请求取消，当前批次完成后停止');
+            });
+            contentDiv.appendChild(box);
+        }
+
+        const percent = job.total ? Math.round(job.progress * 100 / job.total) : 0;
+        let text = `后台任务${JOB_STATUS_TEXT[job.status] || job.status}：${job.progress}/${job.total || '?'}`;
+        if (job.status === 'failed' && job.error) text += `（${job.error}）`;
+        box.querySelector('.job-progress-text').textContent = text;
+        box.querySelector('.job-progress-fill').style.width = `${job.status === 'succeeded' ? 100 : percent}%`;
+
+        if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+            box.classList.add(`job-${job.status}`);
+            box.querySelector('.job-progress-cancel').remove();
+            if (calendar) calendar.refetchEvents();
+        }
+    }
+
     // 发送消息并处理重试逻辑
     window.sendMessage = async function (retryCount = 0, originalText = null) {
         const text = originalText || chatInput.value.trim();
@@ -1011,201 +1160,281 @@ document.addEventListener('DOMContentLoaded', async function () {
             }
         }
 
-        try {
-            const response = await fetch('/api/ai/chat', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: text, thread_id: currentThreadId })
-            });
-
-            if (!response.ok) {
-                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-            }
-
-            // 检查响应类型，如果是 HTML 或者是明显的非 JSON 类型则抛出错误
-            const contentType = response.headers.get('content-type') || '';
-            if (contentType.includes('text/html')) {
-                throw new Error('服务器返回了错误页面 (HTML)，请检查后端服务是否正常运行');
-            }
-
-            // 允许 application/json 和 text/plain (有时流式响应会被识别为 text/plain)
-            if (!contentType.includes('application/json') && !contentType.includes('text/plain')) {
-                console.warn('Unexpected content-type:', contentType);
-            }
-
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder("utf-8");
-
-            let buffer = '';
-
-            while (true) {
-                const { done, value } = await reader.read();
-                if (done) break;
+        // SSE 断线续传：记录 run id 与最后收到的事件 id，网络中断后带 Last-Event-ID 从服务端缓冲续读，
+        // 不会重新执行 AI 与工具调用
+        let runId = null;
+        let lastEventId = null;
+        let streamDone = false;
+        let resumeAttempts = 0;
+        const resumeDelay = () => new Promise(resolve => setTimeout(resolve, Math.min(1000 * Math.pow(2, resumeAttempts - 1), 5000)));
 
-                const chunk = decoder.decode(value, { stream: true });
-                buffer += chunk;
-
-                // Process buffer by lines
-                const lines = buffer.split('\n');
-                buffer = lines.pop(); // Keep incomplete line in buffer
-
-                for (const line of lines) {
-                    if (!line.trim()) continue;
-
-                    // 检查是否是错误响应（非 JSON）
-                    if (line.includes('AI Service') || line.includes('error') || line.includes('Error')) {
-                        throw new Error('AI 服务暂时不可用');
+        try {
+            while (!streamDone) {
+                let response;
+                try {
+                    response = runId
+                        ? await fetch(`/api/ai/chat/stream/${runId}`, {
+                            headers: { 'Accept': 'text/event-stream', 'Last-Event-ID': lastEventId || '' }
+                        })
+                        : await fetch('/api/ai/chat', {
+                            method: 'POST',
+                            headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+                            body: JSON.stringify({ message: text, thread_id: currentThreadId })
+                        });
+                } catch (networkErr) {
+                    if (runId && resumeAttempts < 5) {
+                        resumeAttempts++;
+                        await resumeDelay();
+                        continue;
                     }
+                    throw networkErr;
+                }
 
-                    try {
-                        const data = JSON.parse(line);
-
-                        if (isFirstChunk && data.type !== 'token') {
-                            contentDiv.innerHTML = '';
-                            const mdBody = document.createElement('div');
-                            mdBody.className = 'markdown-body';
-                            contentDiv.appendChild(mdBody);
-                            isFirstChunk = false;
-                        }
+                if (response.status === 409) {
+                    throw new Error('该会话正在处理上一条消息，请稍后再试');
+                }
+                if (response.status === 429) {
+                    // AI 助手队列已满：按 Retry-After 等待后重新发送（不计入重试次数）
+                    const waitSeconds = parseInt(response.headers.get('Retry-After') || '5', 10);
+                    contentDiv.innerHTML = `<span class="typing">AI 助手繁忙，${waitSeconds} 秒后自动重试...</span>`;
+                    await new Promise(resolve => setTimeout(resolve, waitSeconds * 1000));
+                    continue;
+                }
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+                }
 
-                        if (data.type === 'token') {
-                            if (suppressTokensUntilDone) {
-                                continue;
-                            }
+                // 检查响应类型，如果是 HTML 或者是明显的非 JSON 类型则抛出错误
+                const contentType = response.headers.get('content-type') || '';
+                if (contentType.includes('text/html')) {
+                    throw new Error('服务器返回了错误页面 (HTML)，请检查后端服务是否正常运行');
+                }
 
-                            accumulatedText += data.content;
+                if (!contentType.includes('text/event-stream')) {
+                    console.warn('Unexpected content-type:', contentType);
+                }
 
-                            if (isFirstChunk) {
-                                contentDiv.innerHTML = '';
-                                const mdBody = document.createElement('div');
-                                mdBody.className = 'markdown-body';
-                                contentDiv.appendChild(mdBody);
-                                isFirstChunk = false;
+                try {
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder("utf-8");
+
+                    let buffer = '';
+
+                    while (true) {
+                        const { done, value } = await reader.read();
+                        if (done) break;
+
+                        const chunk = decoder.decode(value, { stream: true });
+                        buffer += chunk;
+
+                        // SSE：事件之间以空行分隔，记录 id 用于断线续传，data 为一行 JSON
+                        const blocks = buffer.split('\n\n');
+                        buffer = blocks.pop(); // Keep incomplete event in buffer
+                        const lines = [];
+                        for (const block of blocks) {
+                            let dataLine = '';
+                            for (const field of block.split('\n')) {
+                                if (field.startsWith('id:')) lastEventId = field.slice(3).trim();
+                                else if (field.startsWith('data:')) dataLine += field.slice(5).trim();
                             }
+                            if (dataLine) lines.push(dataLine);
+                        }
 
-                            let mdBody = contentDiv.querySelector('.markdown-body');
-                            if (!mdBody) {
-                                mdBody = document.createElement('div');
-                                mdBody.className = 'markdown-body';
-                                contentDiv.appendChild(mdBody);
-                            }
+                        for (const line of lines) {
+                            if (!line.trim()) continue;
 
-                            const renderText = accumulatedText
-                                .split('\u0000').join('')
-                                .split('\u0001').join('')
-                                .split('\u0002').join('')
-                                .split('\u0003').join('')
-                                .split('\u0004').join('')
-                                .split('\u0005').join('')
-                                .split('\u0006').join('')
-                                .split('\u0007').join('')
-                                .split('\u0008').join('')
-                                .split('\u000b').join('')
-                                .split('\u000c').join('')
-                                .split('\u000e').join('')
-                                .split('\u000f').join('')
-                                .split('\u0010').join('')
-                                .split('\u0011').join('')
-                                .split('\u0012').join('')
-                                .split('\u0013').join('')
-                                .split('\u0014').join('')
-                                .split('\u0015').join('')
-                                .split('\u0016').join('')
-                                .split('\u0017').join('')
-                                .split('\u0018').join('')
-                                .split('\u0019').join('')
-                                .split('\u001a').join('')
-                                .split('\u001b').join('')
-                                .split('\u001c').join('')
-                                .split('\u001d').join('')
-                                .split('\u001e').join('')
-                                .split('\u001f').join('')
-                                .replace(/\r\n/g, '\n')
-                                .replace(/\r/g, '\n');
-                            const safeText = stripLeakedToolJson(renderText, toolsHistory.length > 0);
-                            const finalText = safeText
-                                .replace(/^[\t ]*[━─—\-_=]{8,}[\t ]*$/gm, '')
-                                .replace(/\n{3,}/g, '\n\n');
-
-                            if (typeof marked !== 'undefined') {
-                                mdBody.innerHTML = marked.parse(finalText);
-                            } else {
-                                mdBody.textContent = finalText;
+                            // 检查是否是错误响应（非 JSON）
+                            if (line.includes('AI Service') || line.includes('error') || line.includes('Error')) {
+                                const serviceError = new Error('AI 服务暂时不可用');
+                                serviceError.fromServer = true;
+                                throw serviceError;
                             }
 
-                        } else if (data.type === 'tool_start' || data.type === 'tool') {
-                            const toolName = data.name;
-                            suppressTokensUntilDone = true;
+                            try {
+                                const data = JSON.parse(line);
 
-                            let mdBody = contentDiv.querySelector('.markdown-body');
-                            if (mdBody) {
-                                mdBody.innerHTML = '';
-                            }
+                                // 控制事件：run 携带续传用的 run id，done 表示本轮回答结束
+                                if (data.type === 'run') {
+                                    runId = data.run_id;
+                                    continue;
+                                }
+                                if (data.type === 'done') {
+                                    streamDone = true;
+                                    continue;
+                                }
+                                // queued：本轮排队等待（position 为 AI 助手队列中的位置）；cancelled：服务端已取消本轮
+                                if (data.type === 'queued') {
+                                    if (isFirstChunk && data.position) {
+                                        contentDiv.innerHTML = `<span class="typing">排队中，前面还有 ${data.position - 1} 个请求...</span>`;
+                                    }
+                                    continue;
+                                }
+                                if (data.type === 'cancelled') {
+                                    continue;
+                                }
 
-                            // Determine icon based on keywords
-                            let iconPath = TOOL_ICONS.default;
-                            if (toolName.includes("翻阅") || toolName.includes("查找") || toolName.includes("获取")) iconPath = TOOL_ICONS.search;
-                            if (toolName.includes("创建") || toolName.includes("更新") || toolName.includes("安排") || toolName.includes("修改")) iconPath = TOOL_ICONS.write;
-                            if (toolName.includes("移除") || toolName.includes("删除")) iconPath = TOOL_ICONS.delete;
-                            if (toolName.includes("计算") || toolName.includes("统计") || toolName.includes("生成") || toolName.includes("分析")) iconPath = TOOL_ICONS.calc;
-                            if (toolName.includes("检查")) iconPath = TOOL_ICONS.check;
-                            toolIconPaths[toolName] = iconPath;
-                            activeTools.push(toolName);
-                            toolsHistory.push({ name: toolName, iconPath });
-
-                            // --- 1. Tool Hat Logic (Hello Kitty Style) ---
-                            let toolHat = contentDiv.querySelector('.tool-hat');
-                            if (!toolHat) {
-                                toolHat = document.createElement('div');
-                                toolHat.className = 'tool-hat';
-                                // Prepend to contentDiv so it sits at the top
-                                contentDiv.insertBefore(toolHat, contentDiv.firstChild);
-                            }
-                            if (toolHat.classList.contains('locked')) {
-                                toolHat.className = 'tool-hat';
-                                toolHat.removeAttribute('role');
-                                toolHat.removeAttribute('tabindex');
-                                toolHat.removeAttribute('aria-expanded');
-                                delete toolHat.dataset.boundToggle;
-                            }
+                                if (isFirstChunk && data.type !== 'token') {
+                                    contentDiv.innerHTML = '';
+                                    const mdBody = document.createElement('div');
+                                    mdBody.className = 'markdown-body';
+                                    contentDiv.appendChild(mdBody);
+                                    isFirstChunk = false;
+                                }
+
+                                if (data.type === 'token') {
+                                    if (suppressTokensUntilDone) {
+                                        continue;
+                                    }
+
+                                    accumulatedText += data.content;
+
+                                    if (isFirstChunk) {
+                                        contentDiv.innerHTML = '';
+                                        const mdBody = document.createElement('div');
+                                        mdBody.className = 'markdown-body';
+                                        contentDiv.appendChild(mdBody);
+                                        isFirstChunk = false;
+                                    }
+
+                                    let mdBody = contentDiv.querySelector('.markdown-body');
+                                    if (!mdBody) {
+                                        mdBody = document.createElement('div');
+                                        mdBody.className = 'markdown-body';
+                                        contentDiv.appendChild(mdBody);
+                                    }
+
+                                    const renderText = accumulatedText
+                                        .split('\u0000').join('')
+                                        .split('\u0001').join('')
+                                        .split('\u0002').join('')
+                                        .split('\u0003').join('')
+                                        .split('\u0004').join('')
+                                        .split('\u0005').join('')
+                                        .split('\u0006').join('')
+                                        .split('\u0007').join('')
+                                        .split('\u0008').join('')
+                                        .split('\u000b').join('')
+                                        .split('\u000c').join('')
+                                        .split('\u000e').join('')
+                                        .split('\u000f').join('')
+                                        .split('\u0010').join('')
+                                        .split('\u0011').join('')
+                                        .split('\u0012').join('')
+                                        .split('\u0013').join('')
+                                        .split('\u0014').join('')
+                                        .split('\u0015').join('')
+                                        .split('\u0016').join('')
+                                        .split('\u0017').join('')
+                                        .split('\u0018').join('')
+                                        .split('\u0019').join('')
+                                        .split('\u001a').join('')
+                                        .split('\u001b').join('')
+                                        .split('\u001c').join('')
+                                        .split('\u001d').join('')
+                                        .split('\u001e').join('')
+                                        .split('\u001f').join('')
+                                        .replace(/\r\n/g, '\n')
+                                        .replace(/\r/g, '\n');
+                                    const safeText = stripLeakedToolJson(renderText, toolsHistory.length > 0);
+                                    const finalText = safeText
+                                        .replace(/^[\t ]*[━─—\-_=]{8,}[\t ]*$/gm, '')
+                                        .replace(/\n{3,}/g, '\n\n');
+
+                                    if (typeof marked !== 'undefined') {
+                                        mdBody.innerHTML = marked.parse(finalText);
+                                    } else {
+                                        mdBody.textContent = finalText;
+                                    }
+
+                                } else if (data.type === 'tool_start' || data.type === 'tool') {
+                                    const toolName = data.name;
+                                    suppressTokensUntilDone = true;
+
+                                    let mdBody = contentDiv.querySelector('.markdown-body');
+                                    if (mdBody) {
+                                        mdBody.innerHTML = '';
+                                    }
+
+                                    // Determine icon based on keywords
+                                    let iconPath = TOOL_ICONS.default;
+                                    if (toolName.includes("翻阅") || toolName.includes("查找") || toolName.includes("获取")) iconPath = TOOL_ICONS.search;
+                                    if (toolName.includes("创建") || toolName.includes("更新") || toolName.includes("安排") || toolName.includes("修改")) iconPath = TOOL_ICONS.write;
+                                    if (toolName.includes("移除") || toolName.includes("删除")) iconPath = TOOL_ICONS.delete;
+                                    if (toolName.includes("计算") || toolName.includes("统计") || toolName.includes("生成") || toolName.includes("分析")) iconPath = TOOL_ICONS.calc;
+                                    if (toolName.includes("检查")) iconPath = TOOL_ICONS.check;
+                                    toolIconPaths[toolName] = iconPath;
+                                    activeTools.push(toolName);
+                                    toolsHistory.push({ name: toolName, iconPath });
+
+                                    // --- 1. Tool Hat Logic (Hello Kitty Style) ---
+                                    let toolHat = contentDiv.querySelector('.tool-hat');
+                                    if (!toolHat) {
+                                        toolHat = document.createElement('div');
+                                        toolHat.className = 'tool-hat';
+                                        // Prepend to contentDiv so it sits at the top
+                                        contentDiv.insertBefore(toolHat, contentDiv.firstChild);
+                                    }
+                                    if (toolHat.classList.contains('locked')) {
+                                        toolHat.className = 'tool-hat';
+                                        toolHat.removeAttribute('role');
+                                        toolHat.removeAttribute('tabindex');
+                                        toolHat.removeAttribute('aria-expanded');
+                                        delete toolHat.dataset.boundToggle;
+                                    }
                             
-                            toolHat.innerHTML = `
-                                <div class="tool-hat-icon">
-                                    <svg viewBox="0 0 20 20" width="14" height="14" fill="currentColor">
-                                        <path d="${iconPath}"></path>
-                                    </svg>
-                                </div>
-                                <div class="tool-hat-text">正在使用 ${toolName}...</div>
-                            `;
-
-                        } else if (data.type === 'tool_end') {
-                            const toolName = data.name;
-                            const idx = activeTools.indexOf(toolName);
-                            if (idx !== -1) activeTools.splice(idx, 1);
-                            suppressTokensUntilDone = activeTools.length > 0;
+                                    toolHat.innerHTML = `
+                                        <div class="tool-hat-icon">
+                                            <svg viewBox="0 0 20 20" width="14" height="14" fill="currentColor">
+                                                <path d="${iconPath}"></path>
+                                            </svg>
+                                        </div>
+                                        <div class="tool-hat-text">正在使用 ${toolName}${data.cached ? '（缓存）' : ''}...</div>
+                                    `;
+
+                                } else if (data.type === 'tool_end') {
+                                    const toolName = data.name;
+                                    const idx = activeTools.indexOf(toolName);
+                                    if (idx !== -1) activeTools.splice(idx, 1);
+                                    suppressTokensUntilDone = activeTools.length > 0;
                             
-                            // Smart Hat Management
-                            const toolHat = contentDiv.querySelector('.tool-hat');
-                            if (toolHat) {
-                                if (activeTools.length > 0) {
-                                    const nextName = activeTools[0];
-                                    const textEl = toolHat.querySelector('.tool-hat-text');
-                                    if (textEl) textEl.textContent = `正在使用 ${nextName}...`;
-                                    const pathEl = toolHat.querySelector('.tool-hat-icon path');
-                                    if (pathEl) pathEl.setAttribute('d', toolIconPaths[nextName] || TOOL_ICONS.default);
-                                } else {
-                                    lockToolHat(toolHat);
+                                    // Smart Hat Management
+                                    const toolHat = contentDiv.querySelector('.tool-hat');
+                                    if (toolHat) {
+                                        if (activeTools.length > 0) {
+                                            const nextName = activeTools[0];
+                                            const textEl = toolHat.querySelector('.tool-hat-text');
+                                            if (textEl) textEl.textContent = `正在使用 ${nextName}...`;
+                                            const pathEl = toolHat.querySelector('.tool-hat-icon path');
+                                            if (pathEl) pathEl.setAttribute('d', toolIconPaths[nextName] || TOOL_ICONS.default);
+                                        } else {
+                                            lockToolHat(toolHat);
+                                        }
+                                    }
+                                } else if (data.type === 'job') {
+                                    renderJobProgress(contentDiv, data);
                                 }
+
+                            } catch (e) {
+                                console.error('Error parsing JSON chunk:', e, 'Line:', line);
+                                // 继续处理下一行，不中断整个流程
                             }
                         }
 
-                    } catch (e) {
-                        console.error('Error parsing JSON chunk:', e, 'Line:', line);
-                        // 继续处理下一行，不中断整个流程
+                        messagesContainer.scrollTop = messagesContainer.scrollHeight;
                     }
+                } catch (readErr) {
+                    // 服务端错误或尚未拿到 run id 时走原有的重试逻辑
+                    if (readErr.fromServer || !runId || resumeAttempts >= 5) throw readErr;
                 }
 
-                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                // 连接在 done 之前断开：从最后收到的事件继续
+                if (!streamDone) {
+                    if (!runId || resumeAttempts >= 5) {
+                        throw new Error('连接中断');
+                    }
+                    resumeAttempts++;
+                    await resumeDelay();
+                }
             }
 
             // Refetch calendar at the end of every message
@@ -1216,6 +1445,18 @@ document.addEventListener('DOMContentLoaded', async function () {
         } catch (err) {
             console.error('Request error:', err);
 
+            // 本轮已在服务端执行（拿到了 run id）但续传失败：不再重新发送，避免重复调用模型与写操作
+            if (runId && !err.fromServer) {
+                const notice = document.createElement('div');
+                notice.className = 'error-message';
+                notice.textContent = '⚠️ 网络中断，未能接收完整回答，请稍后刷新页面查看';
+                contentDiv.appendChild(notice);
+                if (calendar) {
+                    calendar.refetchEvents();
+                }
+                return;
+            }
+
             // 重试逻辑：最多重试 5 次
             if (retryCount < 5) {
                 const retryDelay = Math.min(1000 * Math.pow(2, retryCount), 5000); // 1s, 2s, 4s, 5s, 5s
@@ -1693,7 +1934,7 @@ document.addEventListener('DOMContentLoaded', async function () {
         modal.style.display = "flex";
     }
 
-    window.createCourse = async function () {
+    window.createCourse = async function (allowConflict = false) {
         const title = document.getElementById('edit-title').value;
         const studentId = document.getElementById('edit-student').value;
         const start = document.getElementById('edit-start').value;
@@ -1707,7 +1948,8 @@ document.addEventListener('DOMContentLoaded', async function () {
         }
 
         try {
-            const res = await fetch('/api/courses', {
+            // 默认由后端在同一事务中检查冲突，冲突时返回 409 与冲突课程列表
+            const res = await fetch(`/api/courses?check_conflicts=${!allowConflict}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -1724,6 +1966,19 @@ document.addEventListener('DOMContentLoaded', async function () {
                 toastSuccess('课程创建成功');
                 modal.style.display = 'none';
                 calendar.refetchEvents();
+            } else if (res.status === 409) {
+                const err = await res.json();
+                const conflicts = (err.detail && err.detail.conflicts) || [];
+                const detail = conflicts
+                    .map(c => `${c.title}（${c.student_name || '未知学生'}，${c.start.slice(5, 16).replace('T', ' ')}-${c.end.slice(11, 16)}）`)
+                    .join('、');
+                const ok = await showConfirmModal({
+                    title: '时间冲突',
+                    message: `该时间段与 ${conflicts.length} 节课程重叠，仍要创建吗？`,
+                    detail: detail,
+                    confirmText: '仍然创建'
+                });
+                if (ok) await createCourse(true);
             } else {
                 const err = await res.json();
                 toastError('创建失败: ' + (err.detail || '未知错误'));
@@ -1810,15 +2065,26 @@ document.addEventListener('DOMContentLoaded', async function () {
         `;
     }
 
-    window.loadStudents = async function () {
+    // 学生名册分页加载：/api/students/roster 一次返回学生及其课时、收入统计
+    const ROSTER_PAGE_SIZE = 60;
+    let studentsTotal = 0;
+
+    window.loadStudents = async function (append = false) {
         const container = document.getElementById('studentsList');
-        container.innerHTML = '<div class="empty-state"><svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.5"><circle cx="12" cy="12" r="10"/><path d="M12 6v6l4 2"/></svg><p>加载中...</p></div>';
+        if (!append) {
+            container.innerHTML = '<div class="empty-state"><svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.5"><circle cx="12" cy="12" r="10"/><path d="M12 6v6l4 2"/></svg><p>加载中...</p></div>';
+        }
 
         try {
-            const res = await fetch('/api/students');
+            const offset = append ? studentsData.length : 0;
+            const res = await fetch(`/api/students/roster?sort=id&limit=${ROSTER_PAGE_SIZE}&offset=${offset}`);
             if (res.ok) {
-                studentsData = await res.json();
-                allStudentsList = studentsData; // Sync lists
+                const roster = await res.json();
+                studentsData = append ? studentsData.concat(roster.items) : roster.items;
+                studentsTotal = roster.total;
+                if (studentsData.length >= studentsTotal) {
+                    allStudentsList = studentsData; // Sync lists（已加载全部学生时）
+                }
                 renderStudents();
             } else {
                 container.innerHTML = '<div class="empty-state"><h3>加载失败</h3><p>请稍后重试</p></div>';
@@ -1830,6 +2096,28 @@ document.addEventListener('DOMContentLoaded', async function () {
         }
     };
 
+    function formatLessonTime(value) {
+        if (!value) return '—';
+        const d = new Date(value);
+        return `${d.getMonth() + 1}/${d.getDate()} ${formatHHMM(d)}`;
+    }
+
+    function renderStudentStats(student) {
+        if (student.total_lessons === undefined) return '';
+        return `
+            <div class="student-stats">
+                <div class="student-stat"><span class="student-stat-value">${student.total_lessons}</span><span class="student-stat-label">总课时</span></div>
+                <div class="student-stat"><span class="student-stat-value">${student.upcoming_lessons}</span><span class="student-stat-label">待上</span></div>
+                <div class="student-stat"><span class="student-stat-value">¥${Number(student.month_income || 0).toFixed(0)}</span><span class="student-stat-label">本月</span></div>
+                <div class="student-stat"><span class="student-stat-value">¥${Number(student.total_income || 0).toFixed(0)}</span><span class="student-stat-label">累计</span></div>
+            </div>
+            <div class="student-lesson-times">
+                <span>下次：${formatLessonTime(student.next_lesson)}</span>
+                <span>上次：${formatLessonTime(student.last_lesson)}</span>
+            </div>
+        `;
+    }
+
     function renderStudents() {
         const container = document.getElementById('studentsList');
 
@@ -1869,6 +2157,8 @@ document.addEventListener('DOMContentLoaded', async function () {
                         </div>
                     </div>
 
+                    ${renderStudentStats(student)}
+
                     <div class="student-details">
                         ${student.phone ? `
                             <div class="student-detail-item" onclick="copyToClipboard('${student.phone}', '电话')">
@@ -1929,7 +2219,9 @@ document.addEventListener('DOMContentLoaded', async function () {
                     </div>
                 </div>
             `;
-        }).join('');
+        }).join('') + (studentsData.length < studentsTotal
+            ? `<button class="students-load-more" onclick="loadStudents(true)">加载更多（${studentsData.length}/${studentsTotal}）</button>`
+            : '');
     }
 
     function renderMockStudents() {
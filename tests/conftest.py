@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# Building the agent graph must not need provider credentials
+os.environ.setdefault("LLM_BACKEND", "scripted")
@@ -0,0 +1,47 @@
+import asyncio
+
+from backend import chat_runs, run_control
+
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=5))
+
+
+def test_cancelled_waiter_releases_its_reservation_once():
+    async def scenario():
+        locks = run_control.thread_locks
+        locks.reserve("t-wait")
+        async with locks.hold("t-wait"):
+            run = chat_runs.start_run("hi", "t-wait")
+            # Let the run reach the thread lock and wait on it
+            for _ in range(5):
+                await asyncio.sleep(0)
+            assert locks.waiting("t-wait") == 1
+            run.cancel("test")
+            await asyncio.gather(run.task, return_exceptions=True)
+            await asyncio.sleep(0)
+            assert locks.waiting("t-wait") == 0
+        assert "t-wait" not in locks._slots
+        # The idle thread accepts a new run
+        locks.reserve("t-wait")
+        locks.cancel_reservation("t-wait")
+        assert run.done and run.events[-1] == chat_runs.DONE_LINE
+
+    _run(scenario())
+
+
+def test_run_cancelled_before_first_step_is_finished():
+    async def scenario():
+        run = chat_runs.start_run("hi", "t-early")
+        run.cancel("test")
+        await asyncio.gather(run.task, return_exceptions=True)
+        # Subscribers see the end of the run instead of waiting forever
+        lines = [line async for line in chat_runs.sse_stream(run)]
+        assert run.done and run.finished_at is not None
+        assert run.events[-1] == chat_runs.DONE_LINE
+        assert any('"cancelled"' in line for line in lines)
+        assert "t-early" not in run_control.thread_locks._slots
+        run_control.thread_locks.reserve("t-early")
+        run_control.thread_locks.cancel_reservation("t-early")
+
+    _run(scenario())
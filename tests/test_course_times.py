@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+from backend import service
+from backend.models import CourseCreate, CourseUpdate
+
+
+class FakeCursor:
+    """Records writes and answers the few reads the course write paths make."""
+
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self._result = []
+        if sql.startswith("INSERT INTO courses"):
+            course_id, title, start, end, student_id = params[:5]
+            self.db[course_id] = {"id": course_id, "title": title, "start": start, "end": end,
+                                  "student_id": student_id, "teacher_id": params[5], "room_id": params[6],
+                                  "price": params[7], "color": params[8], "description": params[9],
+                                  "location": params[10], "student_name": "小明", "student_grade": None}
+        elif sql.startswith("SELECT * FROM students"):
+            self._result = [{"id": params[0], "name": "小明"}]
+        elif sql.startswith("SELECT start, end FROM courses"):
+            self._result = [self.db[params[0]]] if params[0] in self.db else []
+        elif sql.startswith("UPDATE courses SET"):
+            course_id = params[-1]
+            columns = [part.split(" = ")[0] for part in sql.split(" SET ")[1].split(" WHERE ")[0].split(", ")]
+            self.db[course_id].update(zip(columns, params[:-1]))
+            self.rowcount = 1
+        elif "WHERE c.id = %s" in sql:
+            self._result = [self.db[params[0]]]
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    rows = {}
+
+    @contextmanager
+    def fake_cursor():
+        yield FakeCursor(rows)
+
+    monkeypatch.setattr(service, "get_db_cursor", fake_cursor)
+    monkeypatch.setattr(service, "get_course", lambda course_id: rows.get(course_id))
+    return rows
+
+
+def _course(start: str, end: str) -> CourseCreate:
+    return CourseCreate(title="数学", start=start, end=end, student_id=1, price=100)
+
+
+def test_plain_and_checked_create_store_the_same_wall_clock_time(db):
+    body = _course("2026-03-02T09:00:00+08:00", "2026-03-02T10:00:00+08:00")
+    plain = service.create_course(body)
+    checked = service.create_course_checked(body)
+
+    assert db[plain.id]["start"] == db[checked.id]["start"] == datetime(2026, 3, 2, 9, 0)
+    assert db[plain.id]["end"] == db[checked.id]["end"] == datetime(2026, 3, 2, 10, 0)
+    assert db[plain.id]["start"].tzinfo is None
+
+
+def test_update_stores_the_wall_clock_time(db):
+    created = service.create_course(_course("2026-03-02T09:00:00", "2026-03-02T10:00:00"))
+    service.update_course(created.id, CourseUpdate(start="2026-03-02T08:30:00-05:00"))
+
+    assert db[created.id]["start"] == datetime(2026, 3, 2, 8, 30)
+    assert db[created.id]["start"].tzinfo is None
@@ -0,0 +1,31 @@
+from collections import defaultdict
+from datetime import date
+
+from benchmarks.datasets import generate_courses
+
+
+def _rows(n_students, n_courses, **kwargs):
+    return list(generate_courses(list(range(1, n_students + 1)), n_courses, end=date(2026, 1, 1), **kwargs))
+
+
+def test_no_student_has_overlapping_lessons():
+    rows = _rows(20, 3000, makeup_ratio=0.2)
+
+    by_student = defaultdict(list)
+    for row in rows:
+        by_student[row[4]].append((row[2], row[3]))
+    for intervals in by_student.values():
+        intervals.sort()
+        assert all(nxt[0] >= cur[1] for cur, nxt in zip(intervals, intervals[1:]))
+    assert any(row[7] == "补课" for row in rows)
+
+
+def test_stops_when_every_slot_week_is_used():
+    rows = _rows(2, 10_000, years=0.5, makeup_ratio=0)
+
+    assert 0 < len(rows) < 10_000
+    assert len({(row[4], row[2]) for row in rows}) == len(rows)
+
+
+def test_same_seed_same_rows():
+    assert _rows(5, 200) == _rows(5, 200)
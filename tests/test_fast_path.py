@@ -0,0 +1,21 @@
+import pytest
+
+from backend import fast_path
+from backend.config import settings
+
+
+@pytest.mark.parametrize("message", ["接下来有什么课", "马上有哪些课程呢"])
+def test_upcoming_lessons_rule_routes(message):
+    match = fast_path.route(message)
+
+    assert match is not None
+    assert match.tool_name == "get_upcoming_lessons_tool"
+    assert match.args == {"hours": 24}
+
+
+def test_every_rule_can_pass_the_default_threshold():
+    assert all(rule.confidence >= settings.FAST_PATH_MIN_CONFIDENCE for rule in fast_path._RULES)
+
+
+def test_ambiguous_recent_falls_back_to_agent():
+    assert fast_path.route("最近有什么课") is None
@@ -0,0 +1,82 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from backend import history, prompts
+
+
+def _turn(i: int, tool_chars: int = 0):
+    msgs = [HumanMessage(content=f"question {i}")]
+    if tool_chars:
+        call_id = f"call-{i}"
+        msgs.append(AIMessage(content="", tool_calls=[{"name": "query_courses_tool", "args": {}, "id": call_id}]))
+        msgs.append(ToolMessage(content="x" * tool_chars, tool_call_id=call_id))
+    msgs.append(AIMessage(content=f"answer {i}"))
+    return msgs
+
+
+def _pairs_intact(messages) -> bool:
+    pending = set()
+    for msg in messages:
+        if isinstance(msg, AIMessage):
+            pending |= {c["id"] for c in msg.tool_calls}
+        elif isinstance(msg, ToolMessage):
+            if msg.tool_call_id not in pending:
+                return False
+    return True
+
+
+def test_under_budget_history_is_untouched():
+    messages = _turn(1) + _turn(2)
+
+    compacted, stats = history.compact_history(messages, budget=10_000, keep_turns=4, tool_max_chars=100)
+
+    assert compacted == messages
+    assert stats.dropped_turns == 0
+    assert stats.truncated_tool_messages == 0
+
+
+def test_stale_tool_outputs_are_truncated_but_recent_kept():
+    messages = _turn(1, tool_chars=2000) + _turn(2, tool_chars=2000)
+
+    compacted, stats = history.compact_history(messages, budget=10_000, keep_turns=1, tool_max_chars=100)
+
+    tool_msgs = [m for m in compacted if isinstance(m, ToolMessage)]
+    assert len(tool_msgs[0].content) < 300
+    assert tool_msgs[1].content == "x" * 2000
+    assert stats.truncated_tool_messages == 1
+    # the stored messages are never modified
+    assert messages[2].content == "x" * 2000
+
+
+def test_oldest_turns_are_dropped_whole():
+    messages = [m for i in range(10) for m in _turn(i, tool_chars=400)]
+
+    compacted, stats = history.compact_history(messages, budget=200, keep_turns=2, tool_max_chars=100)
+
+    assert stats.dropped_turns > 0
+    assert isinstance(compacted[0], HumanMessage)
+    assert compacted[-1].content == "answer 9"
+    assert _pairs_intact(compacted)
+    assert history.count_tokens(compacted) <= 200
+
+
+def test_reserved_tokens_shrink_the_history_budget():
+    messages = [m for i in range(10) for m in _turn(i)]
+    total = history.count_tokens(messages)
+
+    kept, _ = history.compact_history(messages, budget=total, keep_turns=1)
+    reserved, stats = history.compact_history(messages, budget=total, keep_turns=1, reserved_tokens=total // 2)
+
+    assert kept == messages
+    assert len(reserved) < len(messages)
+    assert stats.tokens_after <= total
+
+
+def test_fixed_prompt_tokens_cover_tool_schemas_and_suffix():
+    from backend.ai_graph import tools
+
+    reserved = prompts.fixed_prompt_tokens(tools)
+
+    system_only = history.message_tokens(prompts.static_system_message())
+    suffix = history.message_tokens(prompts.dynamic_context_message())
+    assert reserved > system_only + suffix
+    assert reserved == prompts.fixed_prompt_tokens(tools)
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from backend.service import _plan_moves
+
+
+def _at(hour: int) -> datetime:
+    return datetime(2026, 3, 2, hour)
+
+
+def _row(course_id: str, start: int, end: int, student_id: int = 1) -> dict:
+    return {"id": course_id, "title": course_id, "start": _at(start), "end": _at(end),
+            "student_id": student_id, "teacher_id": None, "room_id": None, "student_name": None}
+
+
+ROWS = [_row("a", 8, 9), _row("b", 10, 11), _row("c", 14, 15)]
+
+
+def test_mutually_conflicting_moves_keep_the_earlier_one():
+    accepted, rejected = _plan_moves(ROWS, {"a": (_at(12), _at(13)), "b": (_at(12), _at(13))}, False)
+
+    assert list(accepted) == ["a"]
+    assert rejected["b"]["status"] == "conflict"
+    assert [c["id"] for c in rejected["b"]["conflicts"]] == ["a"]
+
+
+def test_swapping_two_courses_is_accepted():
+    accepted, rejected = _plan_moves(ROWS, {"a": (_at(10), _at(11)), "b": (_at(8), _at(9))}, False)
+
+    assert set(accepted) == {"a", "b"} and not rejected
+
+
+def test_rejection_cascades_to_moves_into_the_kept_slot():
+    # b cannot move onto c, so it stays at 10-11, where a wanted to go
+    accepted, rejected = _plan_moves(ROWS, {"a": (_at(10), _at(11)), "b": (_at(14), _at(15))}, False)
+
+    assert accepted == {}
+    assert [c["id"] for c in rejected["b"]["conflicts"]] == ["c"]
+    assert [c["id"] for c in rejected["a"]["conflicts"]] == ["b"]
+
+
+def test_unknown_course_is_not_found():
+    accepted, rejected = _plan_moves(ROWS, {"x": (_at(12), _at(13)), "a": (_at(12), _at(13))}, False)
+
+    assert list(accepted) == ["a"]
+    assert rejected["x"]["status"] == "not_found"
+
+
+def test_other_students_do_not_conflict_with_a_distinct_teacher_domain():
+    rows = ROWS + [{**_row("d", 12, 13, student_id=2), "teacher_id": 7}]
+    accepted, rejected = _plan_moves(rows, {"a": (_at(12), _at(13))}, False)
+
+    assert list(accepted) == ["a"] and not rejected
+
+
+def test_allow_conflicts_accepts_everything_and_reports_overlaps():
+    accepted, rejected = _plan_moves(ROWS, {"a": (_at(14), _at(15)), "b": (_at(14), _at(15))}, True)
+
+    assert set(accepted) == {"a", "b"}
+    assert rejected["a"]["status"] == "moved"
+    assert {c["id"] for c in rejected["a"]["conflicts"]} == {"b", "c"}
+    assert {c["id"] for c in rejected["b"]["conflicts"]} == {"a", "c"}
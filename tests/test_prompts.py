@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from backend import prompts
+
+
+def _schema_bytes(schemas) -> bytes:
+    return json.dumps(schemas, ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+
+def test_static_prefix_is_identical_across_times_and_histories():
+    from backend.ai_graph import tools
+
+    first = prompts.build_prompt_messages([], datetime(2026, 1, 1, 9, 0))
+    second = prompts.build_prompt_messages(
+        [
+            HumanMessage(content="下周一小明有课吗"),
+            AIMessage(content="", tool_calls=[{"name": "get_courses_tool", "args": {}, "id": "call-1"}]),
+            ToolMessage(content="[]", tool_call_id="call-1"),
+        ],
+        datetime(2026, 7, 15, 21, 37),
+    )
+
+    assert first[0].content.encode("utf-8") == second[0].content.encode("utf-8")
+    assert "21:37" not in first[0].content
+    assert first[-1].content != second[-1].content
+
+    # Memoized schemas match a fresh conversion byte for byte
+    prompts._tool_schemas_cache.clear()
+    cached = _schema_bytes(prompts.tool_schemas(tools))
+    fresh = _schema_bytes([convert_to_openai_tool(t) for t in tools])
+    assert cached == fresh
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from datetime import date, datetime, time
+
+import pytest
+
+from backend import service
+from backend.models import AvailabilityWindow, TimetablePlan, TimetableStudent
+
+MONDAY = date(2026, 3, 2)
+
+
+class FakeCursor:
+    def execute(self, sql, params=()):
+        self._result = [{"id": sid, "name": f"学生{sid}"} for sid in params]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    """Existing lessons returned by _schedule_window, filtered by the requested domains."""
+    rows = []
+    requested = []
+
+    @contextmanager
+    def fake_cursor():
+        yield FakeCursor()
+
+    def fake_window(cursor, windows, lock=False):
+        requested.append(dict(windows))
+        return [r for r in rows if any(r.get(column) == value for column, value in windows)]
+
+    monkeypatch.setattr(service, "get_db_cursor", fake_cursor)
+    monkeypatch.setattr(service, "_schedule_window", fake_window)
+    return rows, requested
+
+
+def _lesson(student_id, teacher_id, day, start_hour, end_hour):
+    return {"id": f"{student_id}-{day}-{start_hour}", "student_id": student_id, "teacher_id": teacher_id,
+            "start": datetime(2026, 3, day, start_hour), "end": datetime(2026, 3, day, end_hour)}
+
+
+def _plan(*windows, teacher_id=None):
+    return TimetablePlan(
+        students=[TimetableStudent(student_id=1, availability=[
+            AvailabilityWindow(weekday=d, start=s, end=e) for d, s, e in windows
+        ])],
+        working_hours=[AvailabilityWindow(weekday=d, start=time(0), end=time(0)) for d in range(7)],
+        teacher_id=teacher_id,
+        week_start=MONDAY,
+        time_limit_s=1,
+    )
+
+
+def test_lessons_with_other_teachers_block_the_student(schedule):
+    rows, requested = schedule
+    rows.append(_lesson(1, 7, 2, 16, 17))
+
+    result = service.plan_weekly_timetable(_plan((0, time(16), time(17)), (1, time(16), time(17))))
+
+    assert ("student_id", 1) in requested[0]
+    assert [(s.weekday, s.start) for s in result.slots] == [(1, time(16))]
+
+
+def test_own_lessons_with_the_planning_teacher_are_rescheduled(schedule):
+    rows, _ = schedule
+    rows.append(_lesson(1, None, 2, 16, 17))
+
+    result = service.plan_weekly_timetable(_plan((0, time(16), time(17))))
+
+    assert [(s.weekday, s.start) for s in result.slots] == [(0, time(16))]
+
+
+def test_lesson_ending_at_midnight_ends_at_end_of_day(schedule):
+    result = service.plan_weekly_timetable(_plan((0, time(23), time(0))))
+
+    slot = result.slots[0]
+    assert (slot.start, slot.end) == (time(23), time(0))
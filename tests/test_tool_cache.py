@@ -0,0 +1,49 @@
+from langchain_core.messages import ToolMessage
+
+from backend.tool_cache import is_tool_error, tool_error
+
+
+def test_tool_error_results_are_recognized():
+    failure = tool_error("获取课程", ValueError("连接失败"))
+
+    assert is_tool_error(failure)
+    # ToolMessage content is a plain str again
+    assert is_tool_error(ToolMessage(content=str(failure), tool_call_id="call-1"))
+    assert is_tool_error(ToolMessage(content="boom", tool_call_id="call-1", status="error"))
+
+
+def test_results_mentioning_errors_are_not_failures():
+    assert not is_tool_error("📋 学生: 小明\n备注: 作业出错较多")
+    assert not is_tool_error(ToolMessage(content="课程描述：纠正计算出错", tool_call_id="call-1"))
+
+
+def test_cache_entries_expire_after_the_ttl(monkeypatch):
+    from backend import tool_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(tool_cache.time, "monotonic", lambda: now[0])
+    cache = tool_cache.ToolResultCache(maxsize=4, ttl_s=60)
+    cache.put(("tool", 1), "result")
+
+    now[0] += 59
+    assert cache.get(("tool", 1)) == "result"
+    now[0] += 1
+    assert not cache.contains(("tool", 1))
+    assert cache.get(("tool", 1)) is None
+
+
+def test_failures_are_not_cached_but_results_mentioning_errors_are(monkeypatch):
+    from backend import tool_cache
+
+    monkeypatch.setattr(tool_cache, "_cache", tool_cache.ToolResultCache(maxsize=4, ttl_s=60))
+    calls = []
+
+    @tool_cache.cached_tool(now_sensitive=False)
+    def lookup(name: str) -> str:
+        calls.append(name)
+        if name == "bad":
+            return tool_error("查询", RuntimeError("timeout"))
+        return f"{name}: 作业出错较多"
+
+    lookup("ok"), lookup("ok"), lookup("bad"), lookup("bad")
+    assert calls == ["ok", "bad", "bad"]